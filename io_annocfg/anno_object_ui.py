@@ -419,7 +419,7 @@ class PasteFromClipboardOperator(Operator):
             self.report({'ERROR_INVALID_INPUT'}, f"Invalid XML: {err}\n{line}")
             return {"CANCELLED"}
         if anno_object == GameObject:
-            assetsXML = AssetsXML()
+            assetsXML = AssetsXML.get_instance()
             obj = anno_object.xml_to_blender(node, assetsXML)
         else:
             obj = anno_object.xml_to_blender(node)
@@ -662,7 +662,7 @@ def load_animations_for_model(obj):
         for anim_obj in animations_container.children:
             for armature in anim_obj.children:
                 for anim_mesh in armature.children:
-                    for m_idx, material in enumerate(obj.data.materials):
+                    for m_idx, material in enumerate([slot.material for slot in obj.material_slots]):
                         if m_idx >= len(anim_mesh.data.materials):
                             break
                         anim_mesh.data.materials[m_idx] = material 
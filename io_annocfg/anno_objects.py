@@ -20,6 +20,14 @@ from math import radians
 from .prefs import IO_AnnocfgPreferences
 from .utils import *
 from .transform import Transform
+from .xml_cache import ParsedXMLCache
+from .prop_cache import PropMetadata, PropMetadataCache
+from .filedb import FileDBFormatError, read_fc
+from .assets_index import AssetsIndex
+from .conversion_cache import ConversionCache, find_converted_file, get_output_dir, register_converted_file
+from .cfg_cache import CfgLibraryCache, DependencyRecorder
+from .rdm import RdmFormatError, RdmMesh, read_rdm
+from .mesh_cache import load_mesh_cache, save_mesh_cache
 from .material import Material, ClothMaterial
 from .feedback_ui import FeedbackConfigItem, GUIDVariationListItem, FeedbackSequenceListItem
 from . import feedback_enums
@@ -39,57 +47,221 @@ from .shaders.prop_grass_shader import GrassPropShader
 from .shaders.destruct_shader import DestructShader
 from .shaders.water_shader import LiquidShader
 from .shaders.glass_shader import GlassShader
-# import numpy as np
+import numpy as np
 
 def parseStrippedXML(absolute_path):
-    stripped = strip_invalid_brackets(absolute_path)
-    tree = ET.parse(io.StringIO(stripped))
-    return tree
+    return ParsedXMLCache.parse(absolute_path)
 
-def convert_to_glb(fullpath: Path):
+def run_rdm4(rdm4_path: Path, fullpath: Path, output_dir: Path):
+    """Converts the .rdm file to .glb with rdm4. Does not access blender data, so it can run on a worker thread."""
+    subprocess.call(f"\"{rdm4_path}\" --input \"{fullpath}\" -n --outdst \"{output_dir}\"", shell = True)
+
+def convert_to_glb(fullpath: Path) -> Optional[Path]:
     rdm4_path = IO_AnnocfgPreferences.get_path_to_rdm4()
-    if rdm4_path.exists() and fullpath.exists():
-        subprocess.call(f"\"{rdm4_path}\" --input \"{fullpath}\" -n --outdst \"{fullpath.parent}\"", shell = True)
+    if not rdm4_path.exists() or not fullpath.exists():
+        return None
+    output_dir = get_output_dir(fullpath, ".glb")
+    run_rdm4(rdm4_path, fullpath, output_dir)
+    return register_converted_file(fullpath, Path(output_dir, fullpath.stem + ".glb"))
 
-def convert_to_glb_if_required(data_path: Union[str, Path]):
+def convert_to_glb_if_required(data_path: Union[str, Path]) -> Optional[Path]:
     if data_path is None:
         return None
     fullpath = data_path_to_absolute_path(data_path)
-    glb_fullpath = fullpath.with_suffix(".glb")
-    if fullpath.exists() and not glb_fullpath.exists():
-        convert_to_glb(fullpath)
+    glb_fullpath = find_converted_file(fullpath, ".glb")
+    if glb_fullpath is None and fullpath.exists():
+        glb_fullpath = convert_to_glb(fullpath)
+    return glb_fullpath
+
+class SharedMeshes:
+    """In-session registry of the meshes imported from .rdm files.
+    Models that use an already imported file get a new object that links the existing mesh data,
+    instead of importing the .glb again. Keyed by path, size and modification time of the .rdm file,
+    the mirror setting, because the stored mesh is already mirrored, and whether the mesh got placeholder materials
+    or empty slots (geometry_only). The materials of the cfg are linked to the objects, not to the shared mesh,
+    see AnnoObject.apply_materials_to_object.
+    Mesh names are stored instead of the meshes themselves, since references to blender data become invalid after an undo.
+    Blender reuses names (f.e. after File > New), so every registered mesh also stores its key in a custom property
+    that is checked on lookup.
+    """
+    mesh_names_by_model: Dict[Tuple[str, int, int, bool, bool], str] = {}
+    key_property = "anno_shared_mesh_key"
+
+    @classmethod
+    def get_key(cls, fullpath: Path, geometry_only: bool) -> Optional[Tuple[str, int, int, bool, bool]]:
+        try:
+            stat = fullpath.stat()
+        except OSError:
+            return None
+        return (str(fullpath), stat.st_size, stat.st_mtime_ns, IO_AnnocfgPreferences.mirror_models(), geometry_only)
+
+    @classmethod
+    def new_object(cls, fullpath: Path, geometry_only: bool) -> Optional[BlenderObject]:
+        """Creates an object for an already imported model file.
+
+        Args:
+            fullpath (Path): The .rdm file.
+            geometry_only (bool): Whether the mesh must have empty material slots, see import_model_to_scene.
+
+        Returns:
+            Optional[BlenderObject]: The new object or None if the file has not been imported in this session.
+        """
+        key = cls.get_key(fullpath, geometry_only)
+        mesh_name = cls.mesh_names_by_model.get(key)
+        if mesh_name is None:
+            return None
+        mesh = bpy.data.meshes.get(mesh_name)
+        if mesh is None or mesh.get(cls.key_property) != str(key):
+            del cls.mesh_names_by_model[key]
+            return None
+        obj = bpy.data.objects.new(fullpath.stem, mesh)
+        bpy.context.scene.collection.objects.link(obj)
+        return obj
+
+    @classmethod
+    def register(cls, fullpath: Path, obj: BlenderObject, geometry_only: bool):
+        key = cls.get_key(fullpath, geometry_only)
+        if key is None or obj.type != 'MESH':
+            return
+        obj.data[cls.key_property] = str(key)
+        cls.mesh_names_by_model[key] = obj.data.name
+
+def sort_material_slots(obj: BlenderObject):
+    """The glTF import does not keep the order of the materials. If they are named Material_N, the slots are sorted by N,
+    so that slot i belongs to material i of the cfg.
+    """
+    def tryToInt(string):
+        try:
+            return int(string)
+        except ValueError:
+            return -1
 
-def import_model_to_scene(data_path: Union[str, Path, None]) -> BlenderObject:
+    if obj.type != 'MESH':
+        return
+    mesh = obj.data
+    if len(mesh.materials) < 2:
+        return
+    materials = list(mesh.materials)
+    if not all([m is not None and bool(re.match( "Material_[0-9]+.*",m.name)) for m in materials]):
+        return
+    order = sorted(range(len(materials)), key = lambda i: (tryToInt(re.sub(r'[^0-9]', '', materials[i].name)), materials[i].name))
+    if order == list(range(len(materials))):
+        return
+    # new_slot[old slot] = new slot
+    new_slot = np.empty(len(order), dtype = np.int32)
+    new_slot[order] = np.arange(len(order), dtype = np.int32)
+    material_indices = np.empty(len(mesh.polygons), dtype = np.int32)
+    mesh.polygons.foreach_get("material_index", material_indices)
+    valid = material_indices < len(new_slot)
+    material_indices[valid] = new_slot[material_indices[valid]]
+    mesh.polygons.foreach_set("material_index", material_indices)
+    for i, old_slot in enumerate(order):
+        mesh.materials[i] = materials[old_slot]
+    mesh.update()
+
+def clear_material_slots(obj: BlenderObject):
+    """Empties all material slots of the mesh and removes the materials (and their images) the import created for them.
+    The slots and the material indices of the faces stay.
+    """
+    if not obj.data or not hasattr(obj.data, "materials"):
+        return
+    images = set()
+    for i, material in enumerate(obj.data.materials):
+        if material is None:
+            continue
+        obj.data.materials[i] = None
+        if material.users > 0:
+            continue
+        if material.node_tree is not None:
+            images.update(node.image for node in material.node_tree.nodes if node.type == 'TEX_IMAGE' and node.image is not None)
+        bpy.data.materials.remove(material)
+    for image in images:
+        if image.users == 0:
+            bpy.data.images.remove(image)
+
+def has_material_nodes(node: ET.Element) -> bool:
+    """Whether the Materials section of the cfg node contains at least one material."""
+    materials_node = node.find("Materials")
+    return materials_node is not None and len(materials_node) > 0
+
+def import_model_to_scene(data_path: Union[str, Path, None], geometry_only: bool = False) -> BlenderObject:
+    """Imports the .rdm file as mesh object.
+
+    Args:
+        data_path (Union[str, Path, None]): Data path of the model.
+        geometry_only (bool, optional): Leave all material slots empty instead of filling them with placeholder materials.
+            Used when the cfg supplies the materials anyway, to avoid creating materials that are replaced right away.
+
+    Returns:
+        BlenderObject: The object or None if the model does not exist.
+    """
     print(data_path)
     if not data_path:
         print("invalid data path")
         return add_empty_to_scene()
     fullpath = data_path_to_absolute_path(data_path).with_suffix(".rdm")
-    convert_to_glb_if_required(fullpath)
-    if fullpath is None:
-        #self.report({'INFO'}, f"Missing file: Cannot find rmd model {data_path}.")
-        return None
-    fullpath = fullpath.with_suffix(".glb")
-    if not fullpath.exists():
+    DependencyRecorder.record(fullpath)
+    share_meshes = IO_AnnocfgPreferences.share_model_meshes()
+    if share_meshes:
+        obj = SharedMeshes.new_object(fullpath, geometry_only)
+        if obj is not None:
+            return obj
+    if IO_AnnocfgPreferences.native_rdm_import() and fullpath.exists():
+        try:
+            obj = add_rdm_mesh_to_scene(fullpath.stem, read_rdm(fullpath), geometry_only)
+        except RdmFormatError as ex:
+            print(f"Reading {fullpath} directly failed, using rdm4 instead: {ex}")
+        else:
+            if share_meshes:
+                SharedMeshes.register(fullpath, obj, geometry_only)
+            return obj
+    use_mesh_cache = IO_AnnocfgPreferences.mesh_cache_enabled()
+    if use_mesh_cache:
+        obj = load_mesh_cache(fullpath, geometry_only)
+        if obj is not None:
+            Transform.mirror_mesh(obj)
+            if share_meshes:
+                SharedMeshes.register(fullpath, obj, geometry_only)
+            return obj
+    glb_fullpath = convert_to_glb_if_required(fullpath)
+    if glb_fullpath is None:
         #self.report({'INFO'}, f"Missing file: Cannot find glb model {data_path}.")
         print(f"Missing file: Cannot find glb model {data_path}.")
         return None
     # bpy.context.view_layer.objects.active = None
     # for obj in bpy.data.objects:
     #     obj.select_set(False)
-    ret = bpy.ops.import_scene.gltf(filepath=str(fullpath))
+    ret = bpy.ops.import_scene.gltf(filepath=str(glb_fullpath))
     obj = bpy.context.active_object
     print(obj.name, obj.type)
+    sort_material_slots(obj)
+    if use_mesh_cache:
+        save_mesh_cache(fullpath, obj)
+    if geometry_only:
+        clear_material_slots(obj)
     Transform.mirror_mesh(obj)
+    if share_meshes:
+        SharedMeshes.register(fullpath, obj, geometry_only)
     return obj
 
-def convert_animation_to_glb(model_fullpath, animation_fullpath: Path):
+def convert_animation_to_glb(model_fullpath, animation_fullpath: Path, output_dir: Optional[Path] = None):
     #Usage: ./rdm4-bin.exe -i rdm/container_ship_tycoons_lod1.rdm -sam anim/container_ship_tycoons_idle01.rdm
     rdm4_path = IO_AnnocfgPreferences.get_path_to_rdm4()
     if rdm4_path.exists() and animation_fullpath.exists() and model_fullpath.exists():
-        out_filename = animation_fullpath.parent
+        out_filename = animation_fullpath.parent if output_dir is None else output_dir
         subprocess.call(f"\"{rdm4_path}\" -i \"{model_fullpath}\" -sam \"{animation_fullpath}\" --force --outdst \"{out_filename}\"", shell = True)
 
+def convert_animation_to_cache(model_fullpath: Path, animation_fullpath: Path, cache: ConversionCache) -> Optional[Path]:
+    combined_path = cache.lookup(animation_fullpath, ".glb", [model_fullpath])
+    if combined_path is not None:
+        return combined_path
+    output_dir = cache.get_output_dir(animation_fullpath, ".glb", [model_fullpath])
+    out_fullpath = Path(output_dir, "out.glb")
+    convert_animation_to_glb(model_fullpath, animation_fullpath, output_dir)
+    combined_path = Path(output_dir, model_fullpath.stem + "_a_" + animation_fullpath.stem + ".glb")
+    if out_fullpath.exists():
+        out_fullpath.replace(combined_path)
+    return cache.add(animation_fullpath, combined_path, [model_fullpath])
 
 def import_animated_model_to_scene(model_data_path: Union[str, Path, None], animation_data_path) -> BlenderObject:
     print(model_data_path, animation_data_path)
@@ -100,7 +272,16 @@ def import_animated_model_to_scene(model_data_path: Union[str, Path, None], anim
     fullpath = data_path_to_absolute_path(animation_data_path)
     if fullpath is None:
         return None
-    combined_path = Path(model_fullpath.parent, Path(model_fullpath.stem + "_a_"+Path(animation_data_path).stem + ".glb"))
+    DependencyRecorder.record(model_fullpath)
+    DependencyRecorder.record(fullpath)
+    cache = ConversionCache.get_instance()
+    if cache is not None and model_fullpath.exists() and fullpath.exists():
+        combined_path = convert_animation_to_cache(model_fullpath, fullpath, cache)
+        if combined_path is None:
+            print(f"Warning: Conversion of {animation_data_path} for model {model_data_path} failed.")
+            return None
+    else:
+        combined_path = Path(model_fullpath.parent, Path(model_fullpath.stem + "_a_"+Path(animation_data_path).stem + ".glb"))
     if not combined_path.exists():
             
         out_fullpath = Path(fullpath.parent, Path("out.glb"))
@@ -133,8 +314,178 @@ def add_empty_to_scene(empty_type: str = "SINGLE_ARROW") -> BlenderObject:
     Returns:
         BlenderObject: The empty object.
     """
-    bpy.ops.object.empty_add(type=empty_type, align='WORLD', location = (0,0,0), scale = (1,1,1))
-    obj = bpy.context.active_object
+    obj = bpy.data.objects.new("Empty", None)
+    obj.empty_display_type = empty_type
+    obj.empty_display_size = 1
+    bpy.context.scene.collection.objects.link(obj)
+    return obj
+
+# The following functions build their objects directly from bpy.data instead of using the primitive operators,
+# which update the view layer and push an undo step for every single object.
+
+def add_mesh_object_to_scene(name: str, vertices, faces, uvs = None) -> BlenderObject:
+    """Adds a mesh object built from the given vertices and faces to the scene collection.
+
+    Args:
+        name (str): Name of the object and mesh.
+        vertices (List[Tuple[float, float, float]]): Vertex coordinates.
+        faces (List[Tuple[int, ...]]): Vertex indices of each face.
+        uvs (List[Tuple[float, float]], optional): Uv coordinates for each face corner, in face order.
+
+    Returns:
+        BlenderObject: The mesh object.
+    """
+    mesh = bpy.data.meshes.new(name)
+    mesh.from_pydata(vertices, [], faces)
+    if uvs is not None:
+        uv_layer = mesh.uv_layers.new(name = "UVMap")
+        for loop_uv, uv in zip(uv_layer.data, uvs):
+            loop_uv.uv = uv
+    mesh.update()
+    obj = bpy.data.objects.new(name, mesh)
+    bpy.context.scene.collection.objects.link(obj)
+    return obj
+
+def add_grid_mesh_to_scene(name: str, coordinates: np.ndarray, rows: int, columns: int, flip_faces: bool = False) -> BlenderObject:
+    """Adds a mesh with a grid of rows x columns vertices and a quad between each four neighbouring vertices.
+
+    Args:
+        name (str): Name of the object and mesh.
+        coordinates (np.ndarray): Vertex coordinates in row major order, shape (rows * columns, 3).
+        rows (int): Number of rows.
+        columns (int): Number of vertices per row.
+        flip_faces (bool, optional): Reverses the winding order of the quads. Defaults to False.
+
+    Returns:
+        BlenderObject: The mesh object.
+    """
+    mesh = bpy.data.meshes.new(name)
+    mesh.vertices.add(rows * columns)
+    mesh.vertices.foreach_set("co", coordinates.astype(np.float32).ravel())
+    if rows > 1 and columns > 1:
+        r, c = np.meshgrid(np.arange(1, rows), np.arange(1, columns), indexing = "ij")
+        r, c = r.ravel(), c.ravel()
+        quads = np.stack([r * columns + c - 1, r * columns + c, (r - 1) * columns + c, (r - 1) * columns + c - 1], axis = 1)
+        if flip_faces:
+            quads = quads[:, ::-1]
+        mesh.loops.add(quads.size)
+        mesh.loops.foreach_set("vertex_index", quads.astype(np.int32).ravel())
+        mesh.polygons.add(len(quads))
+        mesh.polygons.foreach_set("loop_start", np.arange(0, quads.size, 4, dtype = np.int32))
+    mesh.update(calc_edges = True)
+    obj = bpy.data.objects.new(name, mesh)
+    bpy.context.scene.collection.objects.link(obj)
+    return obj
+
+def add_rdm_mesh_to_scene(name: str, rdm_mesh: RdmMesh, geometry_only: bool = False) -> BlenderObject:
+    """Adds a mesh object built from a .rdm file, like the glTF import of the rdm4 result would (including mirroring).
+    The object gets one material slot per submesh material (Material_0, Material_1, ...) and becomes the active object.
+
+    Args:
+        name (str): Name of the object and mesh.
+        rdm_mesh (RdmMesh): The mesh data.
+        geometry_only (bool, optional): Leave the material slots empty.
+
+    Returns:
+        BlenderObject: The mesh object.
+    """
+    # y up -> z up, like the glTF importer
+    axes = np.array([0, 2, 1])
+    signs = np.array([1.0, -1.0, 1.0], dtype = np.float32)
+    triangles = rdm_mesh.triangles
+    if IO_AnnocfgPreferences.mirror_models():
+        signs[0] = -1.0
+        triangles = triangles[:, ::-1]
+    positions = rdm_mesh.positions[:, axes] * signs
+
+    mesh = bpy.data.meshes.new(name)
+    mesh.vertices.add(len(positions))
+    mesh.vertices.foreach_set("co", positions.astype(np.float32).ravel())
+    mesh.loops.add(triangles.size)
+    mesh.loops.foreach_set("vertex_index", triangles.astype(np.int32).ravel())
+    mesh.polygons.add(len(triangles))
+    mesh.polygons.foreach_set("loop_start", np.arange(0, triangles.size, 3, dtype = np.int32))
+    mesh.polygons.foreach_set("material_index", rdm_mesh.material_indices.astype(np.int32))
+    if rdm_mesh.uvs is not None:
+        uvs = rdm_mesh.uvs.copy()
+        uvs[:, 1] = 1.0 - uvs[:, 1]
+        uv_layer = mesh.uv_layers.new(name = "UVMap")
+        uv_layer.data.foreach_set("uv", uvs[triangles.ravel()].astype(np.float32).ravel())
+    if rdm_mesh.colors is not None:
+        colors = mesh.color_attributes.new("Color", 'BYTE_COLOR', 'POINT')
+        colors.data.foreach_set("color", (rdm_mesh.colors / 255.0).astype(np.float32).ravel())
+    for i in range(rdm_mesh.material_count):
+        mesh.materials.append(None if geometry_only else bpy.data.materials.new(name = f"Material_{i}"))
+    mesh.update(calc_edges = True)
+    if rdm_mesh.normals is not None:
+        mesh.shade_smooth()
+        mesh.normals_split_custom_set_from_vertices(rdm_mesh.normals[:, axes] * signs)
+
+    obj = bpy.data.objects.new(name, mesh)
+    bpy.context.scene.collection.objects.link(obj)
+    bpy.context.view_layer.objects.active = obj
+    return obj
+
+def add_plane_to_scene(size: float = 2.0) -> BlenderObject:
+    """Adds a plane like bpy.ops.mesh.primitive_plane_add(size=size) to the scene.
+
+    Args:
+        size (float, optional): Edge length. Defaults to 2.0.
+
+    Returns:
+        BlenderObject: The plane object.
+    """
+    h = size / 2
+    vertices = [(-h, -h, 0), (h, -h, 0), (-h, h, 0), (h, h, 0)]
+    return add_mesh_object_to_scene("Plane", vertices, [(0, 1, 3, 2)], [(0, 0), (1, 0), (1, 1), (0, 1)])
+
+def add_cube_to_scene(size: float = 2.0) -> BlenderObject:
+    """Adds a cube like bpy.ops.mesh.primitive_cube_add(size=size) to the scene.
+
+    Args:
+        size (float, optional): Edge length. Defaults to 2.0.
+
+    Returns:
+        BlenderObject: The cube object.
+    """
+    h = size / 2
+    vertices = [(x, y, z) for x in (-h, h) for y in (-h, h) for z in (-h, h)]
+    faces = [(0, 1, 3, 2), (4, 6, 7, 5), (0, 4, 5, 1), (2, 3, 7, 6), (0, 2, 6, 4), (1, 5, 7, 3)]
+    return add_mesh_object_to_scene("Cube", vertices, faces)
+
+def add_bezier_curve_to_scene() -> BlenderObject:
+    """Adds a bezier curve with two points like bpy.ops.curve.primitive_bezier_curve_add() to the scene.
+
+    Returns:
+        BlenderObject: The curve object.
+    """
+    curve = bpy.data.curves.new("BezierCurve", type = 'CURVE')
+    curve.dimensions = '3D'
+    spline = curve.splines.new('BEZIER')
+    spline.bezier_points.add(1)
+    points = [
+        ((-1.0, 0.0, 0.0), (-1.5, -0.5, 0.0), (-0.5, 0.5, 0.0)),
+        ((1.0, 0.0, 0.0), (0.0, 0.0, 0.0), (2.0, 0.0, 0.0)),
+    ]
+    for point, (co, handle_left, handle_right) in zip(spline.bezier_points, points):
+        point.co = co
+        point.handle_left = handle_left
+        point.handle_right = handle_right
+    obj = bpy.data.objects.new("BezierCurve", curve)
+    bpy.context.scene.collection.objects.link(obj)
+    return obj
+
+def add_point_light_to_scene(radius: float = 1.0) -> BlenderObject:
+    """Adds a point light like bpy.ops.object.light_add(type='POINT', radius=radius) to the scene.
+
+    Returns:
+        BlenderObject: The light object.
+    """
+    light = bpy.data.lights.new("Point", type = 'POINT')
+    light.energy = 1000.0
+    light.shadow_soft_size = radius
+    obj = bpy.data.objects.new("Point", light)
+    bpy.context.scene.collection.objects.link(obj)
     return obj
     
     
@@ -293,12 +644,14 @@ class AnnoObject(ABC):
         node = cls.node_to_property_node(node, obj)
         obj.dynamic_properties.from_node(node)
 
-        for coll in obj.users_collection:
-            # Unlink the object
-            coll.objects.unlink(obj)
+        # Objects from the add_*_to_scene functions are already linked to the scene collection, only imported ones need to be moved.
+        if list(obj.users_collection) != [bpy.context.scene.collection]:
+            for coll in obj.users_collection:
+                # Unlink the object
+                coll.objects.unlink(obj)
 
-        # Link each object to the target collection
-        bpy.context.scene.collection.objects.link(obj)
+            # Link each object to the target collection
+            bpy.context.scene.collection.objects.link(obj)
         return obj
     
     @classmethod
@@ -349,7 +702,12 @@ class AnnoObject(ABC):
         if cls.has_materials:
             materials_node = find_or_create(node, "Materials")
             if obj.data and obj.data.materials:
-                for blender_material in obj.data.materials:
+                #Slots of objects with a shared mesh link their materials to the object
+                for blender_material in [slot.material for slot in obj.material_slots]:
+                    #Empty slots are left when the cfg has less materials than the model (see import_model_to_scene)
+                    if blender_material is None or blender_material.node_tree is None:
+                        ET.SubElement(materials_node, "Config")
+                        continue
                     output_node = blender_material.node_tree.nodes.get("Material Output")
                     surface_socket = output_node.inputs.get("Surface")
                     connected = [l for l in blender_material.node_tree.links if l.to_socket == surface_socket]
@@ -417,26 +775,12 @@ class AnnoObject(ABC):
             obj (BlenderObject): The object
             materials (List[Material]): The materials.
         """
-        def tryToInt(string):
-            try:
-                return int(string)
-            except ValueError:
-                return -1
-            
         if not obj.data:
             #or not obj.data.materials:
             return
-        if len(materials) > 1 and all([bool(re.match( "Material_[0-9]+.*",m.name)) for m in obj.data.materials]):
-            sorted_materials = sorted([(tryToInt(re.sub(r'[^0-9]', '', mat.name)), mat.name) for i, mat in enumerate(obj.data.materials)])
-            for sortingIndex, mat_name in sorted_materials:
-                index = 0
-                for i, mat in enumerate(obj.data.materials):
-                    index = i
-                    if mat.name == mat_name:
-                        break
-                bpy.context.object.active_material_index = index
-                for _ in range(len(obj.data.materials)):
-                    bpy.ops.object.material_slot_move(direction='DOWN')
+        if obj.data.users > 1 or SharedMeshes.key_property in obj.data:
+            cls.apply_materials_to_shared_mesh_object(obj, materials)
+            return
 
         missing_slots = len(materials) - len(obj.data.materials)
         if missing_slots > 0:
@@ -448,8 +792,36 @@ class AnnoObject(ABC):
             slot = i
             old_material = obj.data.materials[slot]
             obj.data.materials[slot] = material
-            old_material.user_clear()
-            bpy.data.materials.remove(old_material)
+            if old_material is not None:
+                old_material.user_clear()
+                bpy.data.materials.remove(old_material)
+
+    @classmethod
+    def apply_materials_to_shared_mesh_object(cls, obj: BlenderObject, materials):
+        """Apply the materials to an object whose mesh is also used by other objects or registered in SharedMeshes.
+        The materials are linked to the object slots, so that the other objects keep theirs.
+        If the mesh has less slots than materials, the object gets its own copy of the mesh instead.
+
+        Args:
+            obj (BlenderObject): The object
+            materials (List[Material]): The materials.
+        """
+        if len(materials) > len(obj.data.materials):
+            obj.data = obj.data.copy()
+            if SharedMeshes.key_property in obj.data:
+                del obj.data[SharedMeshes.key_property]
+            for i in range(len(materials) - len(obj.data.materials)):
+                obj.data.materials.append(bpy.data.materials.new(name=f"NewSlotMaterial{i}"))
+            for i, material in enumerate(materials):
+                if material:
+                    obj.data.materials[i] = material
+            return
+        for i, material in enumerate(materials):
+            if not material:
+                continue
+            slot = obj.material_slots[i]
+            slot.link = 'OBJECT'
+            slot.material = material
         
 
 
@@ -494,10 +866,9 @@ class Cloth(AnnoObject):
         data_path = get_text(node, "FileName")
         imported_obj = None
         if data_path != "":
-            imported_obj = import_model_to_scene(data_path)
+            imported_obj = import_model_to_scene(data_path, geometry_only = has_material_nodes(node))
         if imported_obj is None:
-            bpy.ops.mesh.primitive_plane_add(size=1, enter_editmode=False, align='WORLD', location=(0,0,0), scale=(1,1,1))
-            imported_obj = bpy.context.active_object
+            imported_obj = add_plane_to_scene(size = 1.0)
         return imported_obj
 
 # Not really worth it to have this as its own object, I think. But maybe I'm wrong, so I'll leave it here.
@@ -653,11 +1024,9 @@ class Model(AnnoObject):
         data_path = get_text(node, "FileName")
         imported_obj = None 
         if data_path != "":
-            imported_obj = import_model_to_scene(data_path)
+            imported_obj = import_model_to_scene(data_path, geometry_only = has_material_nodes(node))
         if imported_obj is None:
-            bpy.ops.mesh.primitive_cube_add(size = 1.0, location=(0,0,0))
-            obj = bpy.context.active_object
-            return obj
+            return add_cube_to_scene(size = 1.0)
         return imported_obj
     
     @classmethod
@@ -697,6 +1066,68 @@ def recursive_add_to_collection(obj, collection):
     for c in obj.children:
         recursive_add_to_collection(c, collection)
 
+def add_collection_instance_to_scene(collection, name: str) -> BlenderObject:
+    instance = bpy.data.objects.new(name, None)
+    instance.instance_type = 'COLLECTION'
+    instance.instance_collection = collection
+    bpy.context.scene.collection.objects.link(instance)
+    return instance
+
+class SubFileTemplates:
+    """In-session registry of imported subfiles.
+    The first import of a subfile is moved into a template collection that is not linked to the scene,
+    every reference to the file (including the first one) becomes an instance of that collection.
+    Keyed by path, size and modification time of the .cfg file.
+    Collection names are stored instead of the collections, since references to blender data become invalid after an undo.
+    Blender reuses names (f.e. after File > New), so every template also stores its key in a custom property
+    that is checked on lookup.
+    """
+    collection_names_by_file: Dict[Tuple[str, int, int], str] = {}
+    key_property = "anno_subfile_template_key"
+
+    @classmethod
+    def get_key(cls, fullpath: Path) -> Tuple[str, int, int]:
+        stat = fullpath.stat()
+        return (str(fullpath), stat.st_size, stat.st_mtime_ns)
+
+    @classmethod
+    def instantiate(cls, fullpath: Path) -> Optional[BlenderObject]:
+        """Returns a new instance of the template of the file or None if it has not been imported in this session."""
+        key = cls.get_key(fullpath)
+        collection_name = cls.collection_names_by_file.get(key)
+        if collection_name is None:
+            return None
+        collection = bpy.data.collections.get(collection_name)
+        if collection is None or collection.get(cls.key_property) != str(key):
+            del cls.collection_names_by_file[key]
+            return None
+        DependencyRecorder.replay(("subfile", key))
+        return add_collection_instance_to_scene(collection, "MAIN_FILE_" + fullpath.name)
+
+    @classmethod
+    def store(cls, fullpath: Path, file_obj: BlenderObject, dependencies: Dict[str, Optional[List[int]]]) -> BlenderObject:
+        """Moves the imported hierarchy of the file into a new template collection.
+
+        Args:
+            fullpath (Path): The .cfg file.
+            file_obj (BlenderObject): The root object of the imported file.
+            dependencies (Dict[str, Optional[List[int]]]): Files read during the import, replayed for every instance.
+
+        Returns:
+            BlenderObject: An instance of the template.
+        """
+        collection = bpy.data.collections.new("TEMPLATE_" + fullpath.name)
+        recursive_add_to_collection(file_obj, collection)
+        for obj in collection.all_objects:
+            for coll in obj.users_collection:
+                if coll != collection:
+                    coll.objects.unlink(obj)
+        key = cls.get_key(fullpath)
+        collection[cls.key_property] = str(key)
+        cls.collection_names_by_file[key] = collection.name
+        DependencyRecorder.remember(("subfile", key), dependencies)
+        return add_collection_instance_to_scene(collection, file_obj.name)
+
 class SubFile(AnnoObject):
     has_transform = True
     transform_paths = {
@@ -727,32 +1158,39 @@ class SubFile(AnnoObject):
         return node
     
     @classmethod 
-    def try_loading_from_library(cls, data_path, last_modified):
+    def try_loading_from_library(cls, data_path, last_modified, cfg_cache: Optional[CfgLibraryCache] = None):
         from datetime import datetime
         libpath = IO_AnnocfgPreferences.get_cfg_cache_path()
         p = Path(libpath, Path(data_path + ".blend"))
         if p.exists():
+            up_to_date = cfg_cache.is_up_to_date(data_path) if cfg_cache is not None else None
+            if up_to_date is False:
+                print(f"Cache Invalidation for {p}, {data_path} or one of its dependencies changed")
             cache_last_modified = p.stat().st_mtime
-            if cache_last_modified < last_modified:
+            if up_to_date is None and cache_last_modified < last_modified:
+                #cached without dependency information, only the .cfg itself can be checked
                 print(f"Cache Invalidation for {p}, modified {data_path} at {datetime.fromtimestamp(last_modified)}, last cache update at {datetime.fromtimestamp(cache_last_modified)}")
+                up_to_date = False
+            if up_to_date is False:
                 p.unlink()
+                if cfg_cache is not None:
+                    cfg_cache.remove(data_path)
                 return None
             
             with bpy.data.libraries.load(str(p)) as (data_from, data_to):
                 data_to.collections = data_from.collections
             for new_coll in data_to.collections:
                 if Path(data_path).name in new_coll.name:
-                    instance = bpy.data.objects.new(new_coll.name, None)
-                    instance.instance_type = 'COLLECTION'
-                    instance.instance_collection = new_coll
-                    bpy.context.scene.collection.objects.link(instance)
+                    instance = add_collection_instance_to_scene(new_coll, new_coll.name)
+                    if cfg_cache is not None:
+                        DependencyRecorder.record_all(cfg_cache.get_dependencies(data_path))
                     print(f"Loaded {Path(data_path).name} from lib")
                     return instance
             print(f"Warning: Failed to load {Path(data_path).name} from existing cache file {p}")
         return None
     
     @classmethod 
-    def cache_to_library(cls, file_obj, data_path):
+    def cache_to_library(cls, file_obj, data_path, dependencies: Dict[str, Optional[List[int]]]):
         print(f"Caching {data_path} in library")
         libpath = IO_AnnocfgPreferences.get_cfg_cache_path()
         if not libpath.exists():
@@ -782,6 +1220,9 @@ class SubFile(AnnoObject):
         bpy.data.libraries.write(str(filepath), set(objects), fake_user=True)
         bpy.context.scene.collection.children.unlink(collection)
         bpy.data.collections.remove(collection)
+        cfg_cache = CfgLibraryCache.get_instance()
+        if cfg_cache is not None:
+            cfg_cache.add(data_path, dependencies)
         
     @classmethod 
     def load_subfile(cls, data_path):
@@ -793,24 +1234,43 @@ class SubFile(AnnoObject):
         
         last_modified = fullpath.stat().st_mtime
         
-        if IO_AnnocfgPreferences.cfg_cache_loading_enabled():
-            file_obj = cls.try_loading_from_library(data_path, last_modified)
+        cfg_cache = CfgLibraryCache.get_instance()
+        if cfg_cache is not None:
+            cfg_cache.record_use(data_path)
+        
+        use_templates = IO_AnnocfgPreferences.instance_repeated_subfiles()
+        if use_templates:
+            file_obj = SubFileTemplates.instantiate(fullpath)
             if file_obj is not None:
                 return file_obj
-        try:
-            tree = parseStrippedXML(fullpath)
-        except:
-            print(f"Failed to parse subfile {data_path}")
-            return None
-        root = tree.getroot()
-        if root is None:
-            return None
         
-        file_obj = MainFile.xml_to_blender(root)
-        file_obj.name = "MAIN_FILE_" + fullpath.name
+        if IO_AnnocfgPreferences.cfg_cache_loading_enabled():
+            file_obj = cls.try_loading_from_library(data_path, last_modified, cfg_cache)
+            if cfg_cache is not None:
+                if file_obj is not None:
+                    cfg_cache.record_hit()
+                else:
+                    cfg_cache.record_miss()
+            if file_obj is not None:
+                return file_obj
+        with DependencyRecorder() as recorder:
+            DependencyRecorder.record(fullpath)
+            try:
+                tree = parseStrippedXML(fullpath)
+            except:
+                print(f"Failed to parse subfile {data_path}")
+                return None
+            root = tree.getroot()
+            if root is None:
+                return None
+            
+            file_obj = MainFile.xml_to_blender(root)
+            file_obj.name = "MAIN_FILE_" + fullpath.name
         
-        if random.random() < IO_AnnocfgPreferences.cfg_cache_probability():
-            cls.cache_to_library(file_obj, data_path)
+        if cfg_cache is not None and cfg_cache.should_cache(data_path):
+            cls.cache_to_library(file_obj, data_path, recorder.dependencies)
+        if use_templates:
+            file_obj = SubFileTemplates.store(fullpath, file_obj, recorder.dependencies)
         return file_obj
     
     
@@ -842,9 +1302,7 @@ class Decal(AnnoObject):
 
     @classmethod
     def add_blender_object_to_scene(cls, node) -> BlenderObject:
-        bpy.ops.mesh.primitive_plane_add(size=2, enter_editmode=False, align='WORLD', location=(0,0,0), scale=(1,1,1))
-
-        obj = bpy.context.active_object
+        obj = add_plane_to_scene(size = 2.0)
         for v in obj.data.vertices:
             v.co.y *= -1.0
             v.co.x *= -1.0
@@ -925,6 +1383,57 @@ class Prop(AnnoObject):
     
     prop_obj_blueprints: Dict[str, BlenderObject] = {} #used to copy mesh prop data 
     
+    @classmethod
+    def convert_prp_to_xml(cls, prop_file: Path, filedb_reader_path: Optional[Path] = None) -> Path:
+        """Decodes the .prp file with FileDBReader, unless the .xml next to it is already up to date.
+        Does not access blender data when filedb_reader_path is given, so it can run on a worker thread.
+
+        Args:
+            prop_file (Path): Absolute path of the .prp file.
+            filedb_reader_path (Path, optional): Path to FileDBReader. Defaults to the path from the preferences.
+
+        Returns:
+            Path: The decoded .xml file.
+        """
+        xml_path = prop_file.with_suffix(".xml")
+        if xml_path.exists() and xml_path.stat().st_mtime >= prop_file.stat().st_mtime:
+            return xml_path
+        if filedb_reader_path is None:
+            filedb_reader_path = IO_AnnocfgPreferences.get_path_to_filedb_reader()
+        proc_args = f"\"{filedb_reader_path}\" fctohex -d -y -f \"{prop_file}\""
+        subprocess.call(proc_args)
+        return xml_path
+
+    @classmethod
+    def read_prop_metadata(cls, prop_file: Path) -> Optional[PropMetadata]:
+        """Returns type, mesh and materials of the .prp file from the PropMetadataCache.
+        Only decodes the .prp with FileDBReader if it is not in the cache yet or changed since.
+
+        Args:
+            prop_file (Path): Absolute path of the .prp file.
+
+        Returns:
+            Optional[PropMetadata]: The metadata or None if the file has no Prop node.
+        """
+        cache = PropMetadataCache.get_instance()
+        metadata = cache.lookup(prop_file)
+        if metadata is not None:
+            return metadata
+        prop_node = None
+        if IO_AnnocfgPreferences.native_filedb_import():
+            try:
+                prop_node = read_fc(prop_file).find(".//Prop")
+            except (FileDBFormatError, OSError) as ex:
+                print(f"Reading {prop_file} directly failed, using FileDBReader instead: {ex}")
+        if prop_node is None:
+            xml_path = cls.convert_prp_to_xml(prop_file)
+            prop_node = parseStrippedXML(xml_path).getroot().find("Prop")
+        if prop_node is None:
+            return None
+        metadata = PropMetadata.from_prop_node(prop_node)
+        cache.store(prop_file, metadata)
+        return metadata
+
     @classmethod
     def get_prop_data(cls, prop_filename: str) -> Tuple[Optional[str], Optional[Material]]:
         """Caches results in prop_data_by_filename
@@ -937,39 +1446,38 @@ class Prop(AnnoObject):
         """
 
         if prop_filename in cls.prop_data_by_filename:
+            DependencyRecorder.replay(("prop", prop_filename))
             return cls.prop_data_by_filename[prop_filename]
 
+        with DependencyRecorder() as recorder:
+            prop_data = cls.load_prop_data(prop_filename)
+        DependencyRecorder.remember(("prop", prop_filename), recorder.dependencies)
+        return prop_data
+
+    @classmethod
+    def load_prop_data(cls, prop_filename: str) -> Tuple[Optional[str], Optional[Material]]:
         prop_file = data_path_to_absolute_path(prop_filename)
+        DependencyRecorder.record(prop_file)
         if not prop_file.exists() or prop_file.suffix != ".prp":
             return (None, None)
 
         print(prop_file)
 
-        proc_args = f"\"{IO_AnnocfgPreferences.get_path_to_filedb_reader()}\" fctohex -d -y -f \"{prop_file}\""
-        subprocess.call(proc_args)
-
-        xml_path = prop_file.with_suffix(".xml")
-        tree = parseStrippedXML(xml_path)
-        root = tree.getroot()
-
-        # get prop node
-        prop_node = root.find("Prop")
-        if not prop_node: 
+        metadata = cls.read_prop_metadata(prop_file)
+        if metadata is None: 
             print("Could not load Prop: " + prop_filename)
             return (None, None)
 
         # todo: determine type of material based on PropType 
-        type = prop_node.find("Type").text
         mat = cls.default_shader
-        if type in cls.shader_classes:
-            mat = cls.shader_classes[type]
+        if metadata.prop_type in cls.shader_classes:
+            mat = cls.shader_classes[metadata.prop_type]
 
-        # get mesh_file_name
-        mesh_file_name = prop_node.find("MeshFileName").text
+        mesh_file_name = metadata.mesh_file_name
         print(mesh_file_name)
 
         # get materials
-        materials = prop_node.find("Materials")
+        materials = metadata.get_materials_node()
 
         mat_list = []
 
@@ -990,11 +1498,15 @@ class Prop(AnnoObject):
                 prop_obj = cls.prop_obj_blueprints[prop_filename].copy() #Can fail.
                 bpy.context.scene.collection.objects.link(prop_obj)
                 prop_obj.dynamic_properties.reset() #Fix doubled properties
+                DependencyRecorder.replay(("prop", prop_filename))
                 return prop_obj
             except:
                 pass
-        model_filename, materials = cls.get_prop_data(prop_filename)
-        imported_obj = import_model_to_scene(model_filename)
+        #Remember the mesh together with the .prp and its textures, the blueprint path above does not read any of them again.
+        with DependencyRecorder() as recorder:
+            model_filename, materials = cls.get_prop_data(prop_filename)
+            imported_obj = import_model_to_scene(model_filename, geometry_only = bool(materials))
+        DependencyRecorder.remember(("prop", prop_filename), recorder.dependencies)
         if imported_obj is None:
             return add_empty_to_scene()
         #materials
@@ -1075,9 +1587,7 @@ class Light(AnnoObject):
         return property_node 
     @classmethod
     def add_blender_object_to_scene(cls, node) -> BlenderObject:
-        bpy.ops.object.light_add(type='POINT', radius=1)
-        obj = bpy.context.active_object
-        return obj
+        return add_point_light_to_scene(radius = 1.0)
   
     
 class Particle(AnnoObject):
@@ -1168,8 +1678,7 @@ class IfoCube(AnnoObject):
     
     @classmethod
     def add_blender_object_to_scene(cls, node) -> BlenderObject:
-        bpy.ops.mesh.primitive_cube_add(location=(0,0,0))
-        obj = bpy.context.active_object
+        obj = add_cube_to_scene(size = 2.0)
         obj.display_type = 'WIRE'
         return obj
 
@@ -1240,35 +1749,22 @@ class IfoMeshHeightmap(AnnoObject):
         stepy = float(get_text(node, "StepSize/y"))
         width = int(get_text(node, "Heightmap/Width"))
         height = int(get_text(node, "Heightmap/Height"))
-        heightdata = [float(s.text) for s in node.findall("Heightmap/Map/i/Height")]
+        heightdata = np.array([s.text for s in node.findall("Heightmap/Map/i/Height")], dtype = np.float64)
         #TODO Missing new element transform/pivot/{xf,yf,zf} probably fine without that?
         node.find("Heightmap").remove(node.find("Heightmap/Map"))
         print(f"Heightmap w={width} x h={height} => {len(heightdata)}")
         
-        mesh = bpy.data.meshes.new("MeshHeightmap")  # add the new mesh
-        obj = bpy.data.objects.new(mesh.name, mesh)
-        col = bpy.data.collections.get("Collection")
-        col.objects.link(obj)
-        bpy.context.view_layer.objects.active = obj
-        verts = []
-        i = 0
-        for a in range(height):
-            for b in range(width):
-                verts.append((startx + b * stepx, starty + a * stepy, heightdata[i]))
-                i += 1
-
-        mesh.from_pydata(verts, [], [])
-        for i, vert in enumerate(obj.data.vertices):
-            vert.co.y *= -1
-            vert.co.x *= -1
-        return obj
+        a, b = np.meshgrid(np.arange(height), np.arange(width), indexing = "ij")
+        coordinates = np.stack([-(startx + b.ravel() * stepx), -(starty + a.ravel() * stepy), heightdata], axis = 1)
+        return add_grid_mesh_to_scene("MeshHeightmap", coordinates, height, width, flip_faces = True)
 
     @classmethod 
     def blender_to_xml(cls, obj, parent_node, child_map):
         node = super().blender_to_xml(obj, parent_node, child_map)
         map_node = ET.SubElement(node.find("Heightmap"), "Map")
-        for vert in obj.data.vertices:
-            z = vert.co.z
+        coordinates = np.zeros(len(obj.data.vertices) * 3, dtype = np.float32)
+        obj.data.vertices.foreach_get("co", coordinates)
+        for z in coordinates[2::3]:
             i_node = ET.SubElement(map_node, "i")
             ET.SubElement(i_node, "Height").text = format_float(z)
         return node
@@ -1647,9 +2143,7 @@ class Spline(AnnoObject):
     
     @classmethod
     def add_blender_object_to_scene(cls, node) -> BlenderObject:
-        bpy.ops.curve.primitive_bezier_curve_add()
-
-        obj = bpy.context.active_object
+        obj = add_bezier_curve_to_scene()
         spline = obj.data.splines[0]
         control_points = node.find("ControlPoints")
         if control_points is None:
@@ -1839,16 +2333,65 @@ class PropGridInstance:
         rotation = [rotation[3], rotation[0], rotation[1], rotation[2]] #xzyw -> wxzy
         #rotation = [rotation[1], rotation[2], rotation[3], rotation[0]] #xzyw -> wxzy or something else
         scale    = [float(s) for s in get_text_and_delete(node, "Scale", "1,0 1,0 1,0").replace(",", ".").split(" ")]
+        transform = Transform(location, rotation, scale, anno_coords = True)
         
+        cls.convert_adapt_terrain_height(node)
+        transform.apply_to(obj)
+
+        obj.dynamic_properties.from_node(node)
+        return obj
+    
+    @classmethod
+    def convert_adapt_terrain_height(cls, node: ET.Element):
         if node.find("AdaptTerrainHeight") is not None:
             node.find("AdaptTerrainHeight").text = str(int(cls.str_to_bool(node.find("AdaptTerrainHeight").text)))
         else:
             ET.SubElement(node, "AdaptTerrainHeight").text = "0"
-        transform = Transform(location, rotation, scale, anno_coords = True)
-        transform.apply_to(obj)
+    
+    @classmethod
+    def xml_to_blender_all(cls, nodes: List[ET.Element], arrays: Dict[str, np.ndarray], prop_objects) -> List[BlenderObject]:
+        """Imports all instance nodes of a prop grid as objects, like xml_to_blender.
+        The transforms are taken from the arrays of PropGridInstances.parse_instances and set on all objects at once with foreach_set.
 
-        obj.dynamic_properties.from_node(node)
-        return obj
+        Args:
+            nodes (List[ET.Element]): The instance nodes, without their transform (see PropGridInstances.parse_instances).
+            arrays (Dict[str, np.ndarray]): The parsed instances.
+            prop_objects (List[BlenderObject]): The blueprint prop of each index.
+
+        Returns:
+            List[BlenderObject]: The new objects.
+        """
+        scene_objects = bpy.context.scene.collection.objects
+        first = len(scene_objects)
+        objects = []
+        rows = []
+        progress_step = max(1, len(nodes) // 100)
+        for i, node in enumerate(nodes):
+            if i % progress_step == 0: 
+                print(str(float(i) / len(nodes) * 100.0) + "%")
+            obj = cls.add_blender_object_to_scene(node, prop_objects)
+            if obj is None:
+                continue
+            set_anno_object_class(obj, cls)
+            obj.rotation_mode = "QUATERNION"
+            cls.convert_adapt_terrain_height(node)
+            obj.dynamic_properties.from_node(node)
+            objects.append(obj)
+            rows.append(i)
+        
+        components = [("location", arrays["location"][rows]), ("rotation_quaternion", arrays["rotation"][rows]), ("scale", arrays["scale"][rows])]
+        if scene_objects[first:] != objects:
+            #the scene collection did not append the objects in order, assign them one by one
+            for name, values in components:
+                for obj, value in zip(objects, values.tolist()):
+                    setattr(obj, name, value)
+            return objects
+        for name, values in components:
+            all_values = np.empty(len(scene_objects) * values.shape[1], dtype = np.float32)
+            scene_objects.foreach_get(name, all_values)
+            all_values.reshape(-1, values.shape[1])[first:] = values
+            scene_objects.foreach_set(name, all_values)
+        return objects
     
     @classmethod
     def blender_to_xml(cls, obj, parent = None, child_map = None):
@@ -1878,6 +2421,201 @@ class PropGridInstance:
         return node
 
 
+class PropGridInstances:
+    """All instances of an island prop grid as points of a single mesh, instanced with geometry nodes.
+    
+    Each point stores the attributes prop_index (into the FileNames of the prop grid, -1 if invalid), rotation,
+    scale, color and adapt_terrain_height. The blueprint props live in a collection that is not linked to the scene.
+    Their names start with the zero padded prop index, because the Collection Info node outputs the children sorted by name.
+    """
+    node_group_name = "AnnoPropGridInstances"
+
+    @classmethod
+    def create_blueprints(cls, filenames: List[str]) -> bpy.types.Collection:
+        collection = bpy.data.collections.new("ISLAND_PROP_BLUEPRINTS")
+        digits = len(str(max(len(filenames) - 1, 0)))
+        for i, data_path in enumerate(filenames):
+            prop_xml_node = ET.fromstring(f"""
+                        <Config>
+                            <ConfigType>PROP</ConfigType>
+                            <FileName>{data_path}</FileName>
+                            <Name>{i:0{digits}d}_{Path(data_path).stem}</Name>
+                            <Flags>1</Flags>
+                        </Config>                  
+                    """)
+            prop_obj = Prop.xml_to_blender(prop_xml_node)
+            for coll in prop_obj.users_collection:
+                coll.objects.unlink(prop_obj)
+            collection.objects.link(prop_obj)
+        return collection
+
+    @staticmethod
+    def get_enabled_socket(sockets, name: str):
+        return next(socket for socket in sockets if socket.name == name and socket.enabled)
+
+    @classmethod
+    def get_node_group(cls) -> bpy.types.NodeTree:
+        """Returns the geometry node group that instances the blueprint collection on the points. Creates it if required."""
+        if cls.node_group_name in bpy.data.node_groups:
+            return bpy.data.node_groups[cls.node_group_name]
+        tree = bpy.data.node_groups.new(cls.node_group_name, 'GeometryNodeTree')
+        tree.interface.new_socket(name = "Geometry", in_out = 'INPUT', socket_type = 'NodeSocketGeometry')
+        tree.interface.new_socket(name = "Props", in_out = 'INPUT', socket_type = 'NodeSocketCollection')
+        tree.interface.new_socket(name = "Geometry", in_out = 'OUTPUT', socket_type = 'NodeSocketGeometry')
+        nodes = tree.nodes
+        links = tree.links
+        
+        group_input = nodes.new('NodeGroupInput')
+        group_output = nodes.new('NodeGroupOutput')
+        collection_info = nodes.new('GeometryNodeCollectionInfo')
+        collection_info.transform_space = 'ORIGINAL'
+        collection_info.inputs["Separate Children"].default_value = True
+        collection_info.inputs["Reset Children"].default_value = True
+        instance_on_points = nodes.new('GeometryNodeInstanceOnPoints')
+        instance_on_points.inputs["Pick Instance"].default_value = True
+
+        attributes = {}
+        for name, data_type in [("prop_index", 'INT'), ("rotation", 'QUATERNION'), ("scale", 'FLOAT_VECTOR')]:
+            attribute_node = nodes.new('GeometryNodeInputNamedAttribute')
+            attribute_node.data_type = data_type
+            attribute_node.inputs["Name"].default_value = name
+            attributes[name] = cls.get_enabled_socket(attribute_node.outputs, "Attribute")
+        
+        #Points with an invalid prop index are not instanced
+        valid_index = nodes.new('FunctionNodeCompare')
+        valid_index.data_type = 'INT'
+        valid_index.operation = 'GREATER_EQUAL'
+        cls.get_enabled_socket(valid_index.inputs, "B").default_value = 0
+
+        links.new(group_input.outputs["Geometry"], instance_on_points.inputs["Points"])
+        links.new(group_input.outputs["Props"], collection_info.inputs["Collection"])
+        links.new(collection_info.outputs["Instances"], instance_on_points.inputs["Instance"])
+        links.new(attributes["prop_index"], cls.get_enabled_socket(valid_index.inputs, "A"))
+        links.new(valid_index.outputs["Result"], instance_on_points.inputs["Selection"])
+        links.new(attributes["prop_index"], instance_on_points.inputs["Instance Index"])
+        links.new(attributes["rotation"], instance_on_points.inputs["Rotation"])
+        links.new(attributes["scale"], instance_on_points.inputs["Scale"])
+        links.new(instance_on_points.outputs["Instances"], group_output.inputs["Geometry"])
+        return tree
+
+    @classmethod
+    def parse_instances(cls, instance_nodes: List[ET.Element]) -> Dict[str, np.ndarray]:
+        """Reads all PropGrid instance nodes in one sweep and converts their transforms to blender coordinates with array operations.
+        Position, Rotation and Scale are removed from the nodes, like PropGridInstance.xml_to_blender does.
+
+        Args:
+            instance_nodes (List[ET.Element]): The children of PropGrid/Instances.
+
+        Returns:
+            Dict[str, np.ndarray]: Arrays "index" (n), "location" (n, 3), "rotation" (n, 4, wxyz), "scale" (n, 3), "color" (n, 4) and "adapt_terrain_height" (n).
+        """
+        index_texts, position_texts, rotation_texts, scale_texts, color_texts, adapt_texts = [], [], [], [], [], []
+        for instance_node in instance_nodes:
+            index_texts.append(instance_node.findtext("Index") or "-1")
+            position_texts.append(get_text_and_delete(instance_node, "Position", "0,0 0,0 0,0"))
+            rotation_texts.append(get_text_and_delete(instance_node, "Rotation", "1,0 0,0 0,0 0,0"))
+            scale_texts.append(get_text_and_delete(instance_node, "Scale", "1,0 1,0 1,0"))
+            color_texts.append(instance_node.findtext("Color") or "1 1 1 1")
+            adapt_texts.append(instance_node.findtext("AdaptTerrainHeight") or "False")
+        
+        locations = parse_float_texts(position_texts, 3)
+        rotations = parse_float_texts(rotation_texts, 4)[:, [3, 0, 1, 2]] #xzyw -> wxzy
+        scales = parse_float_texts(scale_texts, 3)
+        locations, rotations, scales = Transform.anno_to_blender_coords_arrays(locations, rotations, scales)
+        return {
+            "index": np.array(index_texts, dtype = np.int64),
+            "location": locations,
+            "rotation": rotations,
+            "scale": scales,
+            "color": parse_float_texts(color_texts, 4),
+            "adapt_terrain_height": np.array([PropGridInstance.str_to_bool(t) for t in adapt_texts], dtype = bool),
+        }
+
+    @classmethod
+    def xml_to_blender(cls, prop_grid_node: ET.Element, parent_obj = None) -> BlenderObject:
+        """Imports the PropGrid of an island file as a point cloud.
+
+        Args:
+            prop_grid_node (ET.Element): The PropGrid node.
+            parent_obj (BlenderObject, optional): The island object.
+
+        Returns:
+            BlenderObject: The point cloud object.
+        """
+        filenames = []
+        if prop_grid_node.find("FileNames") is not None:
+            filenames = [file_node.text for file_node in list(prop_grid_node.find("FileNames"))]
+        instance_nodes = []
+        if prop_grid_node.find("Instances") is not None:
+            instance_nodes = list(prop_grid_node.find("Instances"))
+        print(len(instance_nodes), " Objects.")
+
+        arrays = cls.parse_instances(instance_nodes)
+        indices = arrays["index"]
+        indices[(indices < 0) | (indices >= len(filenames))] = -1
+
+        mesh = bpy.data.meshes.new("PROP_GRID_INSTANCES")
+        mesh.vertices.add(len(instance_nodes))
+        mesh.vertices.foreach_set("co", arrays["location"].astype(np.float32).ravel())
+        mesh.attributes.new("prop_index", 'INT', 'POINT').data.foreach_set("value", indices.astype(np.int32))
+        mesh.attributes.new("rotation", 'QUATERNION', 'POINT').data.foreach_set("value", arrays["rotation"].astype(np.float32).ravel())
+        mesh.attributes.new("scale", 'FLOAT_VECTOR', 'POINT').data.foreach_set("vector", arrays["scale"].astype(np.float32).ravel())
+        mesh.attributes.new("color", 'FLOAT_COLOR', 'POINT').data.foreach_set("color", arrays["color"].astype(np.float32).ravel())
+        mesh.attributes.new("adapt_terrain_height", 'BOOLEAN', 'POINT').data.foreach_set("value", arrays["adapt_terrain_height"])
+        mesh.update()
+
+        obj = bpy.data.objects.new("PROP_GRID_INSTANCES", mesh)
+        bpy.context.scene.collection.objects.link(obj)
+        set_anno_object_class(obj, cls)
+        if parent_obj is not None:
+            obj.parent = parent_obj
+        obj["prop_filenames"] = filenames
+
+        tree = cls.get_node_group()
+        modifier = obj.modifiers.new("PropGridInstances", 'NODES')
+        modifier.node_group = tree
+        modifier[tree.interface.items_tree["Props"].identifier] = cls.create_blueprints(filenames)
+        return obj
+
+    @classmethod
+    def blender_to_xml_nodes(cls, obj) -> List[ET.Element]:
+        """Exports the points as PropGrid instance nodes with FileName instead of Index, like PropGridInstance.blender_to_xml."""
+        mesh = obj.data
+        count = len(mesh.vertices)
+        filenames = list(obj.get("prop_filenames", []))
+        
+        def read_attribute(name, key, width, default, dtype):
+            values = np.full(count * width, default, dtype = dtype)
+            attribute = mesh.attributes.get(name)
+            if attribute is not None:
+                attribute.data.foreach_get(key, values)
+            return values.reshape(count, width) if width > 1 else values
+        locations = np.zeros(count * 3, dtype = np.float32)
+        mesh.vertices.foreach_get("co", locations)
+        indices = read_attribute("prop_index", "value", 1, -1, np.int32)
+        rotations = read_attribute("rotation", "value", 4, 0.0, np.float32)
+        scales = read_attribute("scale", "vector", 3, 1.0, np.float32)
+        colors = read_attribute("color", "color", 4, 1.0, np.float32)
+        adapt_terrain_height = read_attribute("adapt_terrain_height", "value", 1, False, bool)
+
+        locations, rotations, scales = Transform.blender_to_anno_coords_arrays(locations.reshape(count, 3), rotations, scales)
+        rotations = rotations[:, [1, 2, 3, 0]] #wxzy -> xzyw
+
+        nodes = []
+        for i in np.flatnonzero((indices >= 0) & (indices < len(filenames))):
+            node = ET.Element("None")
+            ET.SubElement(node, "FileName").text = filenames[indices[i]]
+            ET.SubElement(node, "Color").text = ' '.join(f"{c:g}" for c in colors[i]).replace(".", ",")
+            ET.SubElement(node, "AdaptTerrainHeight").text = str(bool(adapt_terrain_height[i]))
+            ET.SubElement(node, "Position").text = ' '.join(format_float(f) for f in locations[i]).replace(".", ",")
+            ET.SubElement(node, "Rotation").text = ' '.join(format_float(f) for f in rotations[i]).replace(".", ",")
+            ET.SubElement(node, "Scale").text = ' '.join(format_float(f) for f in scales[i]).replace(".", ",")
+            nodes.append(node)
+        if len(nodes) < count:
+            print(f"Skipped {count - len(nodes)} prop grid instances with an invalid prop index.")
+        return nodes
+
+
 class IslandFile:
     @classmethod
     def add_blender_object_to_scene(cls, node) -> BlenderObject:
@@ -1897,17 +2635,23 @@ class IslandFile:
         index = 0
         
         for obj in bpy.data.objects:
-            if get_anno_object_class(obj) not in [PropGridInstance, Prop]:
-                continue
-            if obj.parent is not None: #when .cfgs are imported there will be props with parents, so don't use them.
+            if get_anno_object_class(obj) == PropGridInstances:
+                prop_nodes = PropGridInstances.blender_to_xml_nodes(obj)
+            elif get_anno_object_class(obj) in [PropGridInstance, Prop]:
+                if obj.parent is not None: #when .cfgs are imported there will be props with parents, so don't use them.
+                    continue
+                if not obj.users_scene: #blueprints of instanced prop grids
+                    continue
+                prop_nodes = [PropGridInstance.blender_to_xml(obj)]
+            else:
                 continue
-            prop_node = PropGridInstance.blender_to_xml(obj)
-            file_name = get_text_and_delete(prop_node, "FileName")
-            if file_name not in index_by_filename:
-                index_by_filename[file_name] = index
-                index += 1
-            ET.SubElement(prop_node, "Index").text = str(index_by_filename[file_name])
-            instances_node.append(prop_node)
+            for prop_node in prop_nodes:
+                file_name = get_text_and_delete(prop_node, "FileName")
+                if file_name not in index_by_filename:
+                    index_by_filename[file_name] = index
+                    index += 1
+                ET.SubElement(prop_node, "Index").text = str(index_by_filename[file_name])
+                instances_node.append(prop_node)
             
         if prop_grid_node.find("FileNames"): #delete existing
             prop_grid_node.remove(prop_grid_node.find("FileNames"))
@@ -1931,91 +2675,38 @@ class IslandFile:
         if terrain_node is not None:
             heightmap_node = terrain_node.find("CoarseHeightMap")
             width = int(get_text(heightmap_node, "width"))
-            height = int(get_text(heightmap_node, "width"))
-            data = [int(s) for s in get_text(heightmap_node, "map").split(" ")]
+            height = int(get_text(heightmap_node, "height", get_text(heightmap_node, "width")))
+            data = np.array(get_text(heightmap_node, "map").split(), dtype = np.float64)
             print(f"Heightmap w={width} x h={height} => {len(data)}")
+            if len(data) != width * height:
+                print(f"Warning: Heightmap has {len(data)} values instead of {width * height}.")
+                data = np.concatenate([data, np.zeros(max(0, width * height - len(data)))])[:width * height]
             grid_width = float(get_text(terrain_node,"GridWidth", "8192"))
             grid_height = float(get_text(terrain_node,"GridHeight", "8192"))
             unit_scale = float(get_text(terrain_node,"UnitScale", "0,03125").replace(",", "."))
-            bpy.ops.mesh.landscape_add(subdivision_x=width, subdivision_y=height, mesh_size_x=grid_width*unit_scale, mesh_size_y=grid_width*unit_scale,
-                                       height=0, refresh=True)
-            terrain_obj = bpy.context.active_object
+            mesh_size = grid_width*unit_scale
             max_height = 8192
             min_height = float(get_text(terrain_node,"MinMeshLevel", "0"))
             #0,03125
-            for i, vert in enumerate(terrain_obj.data.vertices):
-                vert.co.z = data[i] / max_height * 32
-                vert.co.x *= -1
-            terrain_obj.location.x -= grid_width*unit_scale/2
-            terrain_obj.location.y -= grid_width*unit_scale/2
+            # Same vertex and face layout as the A.N.T. Landscape grid (vertex i * height + j, x from i, y from j), which was used before.
+            i, j = np.meshgrid(np.arange(width), np.arange(height), indexing = "ij")
+            x = mesh_size * (i / max(width - 1, 1) - 0.5)
+            y = mesh_size * (j / max(height - 1, 1) - 0.5)
+            coordinates = np.stack([-x.ravel(), y.ravel(), data / max_height * 32], axis = 1)
+            terrain_obj = add_grid_mesh_to_scene("Landscape", coordinates, width, height)
+            terrain_obj.data.polygons.foreach_set("use_smooth", np.ones(len(terrain_obj.data.polygons), dtype = bool))
+            terrain_obj.location.x -= mesh_size/2
+            terrain_obj.location.y -= mesh_size/2
             terrain_obj.rotation_euler[2] = radians(90.0)
             
-            if False:
-                #Make a terrain texture
-                print("Making heightmap")
-                image = bpy.data.images.new("TerrainHeightmap", width=width, height=height)
-                pixels = [None] * width * height
-                maxh = 0.0
-                np_array = np.zeros((width,height,4), dtype = np.float16)
-                for x, row in enumerate(np_array):
-                    for y, pix in enumerate(row):
-                        index = (x * np_array.shape[0]) + y
-                        
-                        h = ((data[index]+max_height)/(2*max_height))
-                        pix[0] = h
-                        pix[1] = h
-                        pix[2] = h
-                        pix[3] = 1.0
-                        # For some reason, the height value does not convert correctly. Super weird...
-                        # In theory, after subtracting 0.5 and multiplying with 64, we should get the exact same heightmap...
-                # return obj
-                # for x in range(width):
-                #     for y in range(height):
-                #         index = (y * width) + x
-                #         h = (data[index]/8192.0*0.5)+0.5
-                        
-                #         maxh = max(maxh, data[index])
-                #         r = h
-                #         g = h
-                #         b = h
-                #         a = 1.0
-                #         np_array[index] = [r,g,b,a]
-                #         pixels[index] = [r, g, b, a]
-                # print("Maximum height value", maxh)
-                # flatten list
-                # pixels = [chan for px in pixels for chan in px]
-                image.pixels = np_array.ravel()
-                image.filepath_raw = "C:/Users/test.png"
-                image.file_format = 'PNG'
-                # image.save()
-                # bpy.context.scene.render.image_settings.color_depth = '16'
-
-                #Save as 16bit BW
-                scene = bpy.context.scene
-                settings = scene.render.image_settings
-                old_color_depth, old_format, old_color_mode = (settings.color_depth, settings.file_format, settings.color_mode)
-                settings.color_depth = '16'
-                settings.file_format = 'PNG'
-                settings.color_mode = 'BW'
-                # Save with scene
-                image.save_render('C:/Users/test_smart.png', scene = scene)
-                #Reset settings
-                settings.color_depth = old_color_depth
-                settings.file_format = old_format
-                settings.color_mode = old_color_mode
-                print("Exported image")
-                
-                bpy.ops.mesh.landscape_add(subdivision_x=width, subdivision_y=height, mesh_size_x=grid_width*unit_scale, mesh_size_y=grid_width*unit_scale,
-                                            height=0, refresh=True)
-                terrain_obj = bpy.context.active_object
-                heightTex = bpy.data.textures.new('HeightMap', type = 'IMAGE')
-                heightTex.image = image
-
-                terrain_obj.location.x -= grid_width*unit_scale/2
-                terrain_obj.location.y -= grid_width*unit_scale/2
-            
         if prop_import_mode == "None":
             return obj
+        if prop_import_mode == "Instanced":
+            if node.find("PropGrid") is None:
+                print("Island missing PropGrid")
+                return obj
+            PropGridInstances.xml_to_blender(node.find("PropGrid"), obj)
+            return obj
         filenames_node = node.find("PropGrid/FileNames")
         prop_objects = []
         if filenames_node is not None:
@@ -2039,10 +2730,8 @@ class IslandFile:
         if instances_node is not None:
             instance_nodes = list(instances_node)
             print(len(instance_nodes), " Objects.")
-            for i, instance_node in enumerate(instance_nodes):
-                if i % int(len(instance_nodes)/100) == 0: 
-                    print(str(float(i) / len(instance_nodes) * 100.0) + "%")
-                PropGridInstance.xml_to_blender(instance_node, prop_objects)
+            arrays = PropGridInstances.parse_instances(instance_nodes)
+            PropGridInstance.xml_to_blender_all(instance_nodes, arrays, prop_objects)
         else:
             print("Island missing PropGrid")
             print(node.find("PropGrid"))
@@ -2174,55 +2863,41 @@ class AssetsXML():
         if not self.path.exists():
             raise Exception(f"Assets.xml required for this island file. Expected it at '{self.path}'")
         
-        print("Loading assets.xml")
-        self.tree = parseStrippedXML(self.path)
-        self.root = self.tree.getroot()
-        print("Assets.xml loaded.")
-        
+        self.index = AssetsIndex(self.path)
         self.cfg_cache = {}
-        self.assets_by_guid = {}
-        self.extract_assets(self.root)
-        print("Asset Dict completed")
-        
-    def extract_assets(self, node):
-        if node.tag != "Asset":
-            for c in list(node):
-                self.extract_assets(c)
-            return
-        guid_node = node.find("Values/Standard/GUID")
-        if guid_node is None:
-            return
-        self.assets_by_guid[guid_node.text] = node
 
     @classmethod
     def get_instance(cls):
-        if not cls.instance:
+        if not cls.instance or not cls.instance.is_up_to_date():
             cls.instance = cls()
         return cls.instance
+
+    def is_up_to_date(self):
+        expected_path = Path(IO_AnnocfgPreferences.get_path_to_rda_folder(), Path("data/config/export/main/asset/assets.xml"))
+        if expected_path != self.path or not self.path.exists():
+            return False
+        stat = self.path.stat()
+        return self.index.source_stamp == f"{self.path}|{stat.st_size}|{stat.st_mtime_ns}"
         
     def get_asset(self, guid):
-        return self.assets_by_guid.get(str(guid), None)
-        asset_node = self.root.find(f".//Asset/Values/Standard[GUID='{guid}']/../..")
-        return asset_node
+        return self.index.get_asset(guid)
     
     def get_variation_cfg_and_name(self, guid, index):
         if (guid, index) in self.cfg_cache:
             return self.cfg_cache[guid, index]
-        asset_node = self.get_asset(guid)
-        if asset_node is None:
-            print("Cannot find asset with guid {guid}")
+        asset = self.index.get_name_and_variation_count(guid)
+        if asset is None:
+            print(f"Cannot find asset with guid {guid}")
             self.cfg_cache[(guid, index)] = None, None
             return None, None
-        if asset_node.find("Values/Object/Variations") is None:
+        name, variation_count = asset
+        if variation_count < 0:
             return None, None
-        variations = list(asset_node.find("Values/Object/Variations"))
-        name = asset_node.find("Values/Standard/Name").text
-        if index >= len(variations):
-            print("Missing variation {index} for guid {guid} ({name})")
+        if index >= variation_count:
+            print(f"Missing variation {index} for guid {guid} ({name})")
             self.cfg_cache[(guid, index)] = None, None
             return None, None
-        item = variations[index]
-        cfg_filename = item.find("Filename").text
+        cfg_filename = self.index.get_variation_filename(guid, index)
         
         self.cfg_cache[(guid, index)] = (cfg_filename, name)
         return (cfg_filename, name)
@@ -2423,78 +3098,80 @@ class IslandGamedataFile:
         file_obj = add_empty_to_scene()  
         return file_obj
     @classmethod
-    def create_maps(cls, node: ET.Element):
+    def create_maps(cls, node: ET.Element, output_dir: Optional[Path] = None) -> List[bpy.types.Image]:
+        """Extracts the water, river, environment and area id grids of the gamedata as images.
+        Bit grids become grayscale images. For value grids, red holds the upper and green the lower byte of each 16 bit value.
+
+        Args:
+            node (ET.Element): Root node of the gamedata file.
+            output_dir (Optional[Path], optional): Folder to save the images to as .png. If None, the images are packed into the .blend file.
+
+        Returns:
+            List[bpy.types.Image]: The images.
+        """
         bit_map_nodes = [
             node.find("./GameSessionManager/WorldManager/Water"),
             node.find("./GameSessionManager/WorldManager/RiverGrid"),
         ]
-        for map_node in bit_map_nodes:
-            if map_node is None:
-                continue
-            width = int(get_text(map_node, "x", "0"))
-            height = int(get_text(map_node, "y", "0"))
-            byte_data = [int(i) for i in get_text(map_node, "bits").split(" ")]
-            data = [0] * (width*height)
-            for i, byte in enumerate(byte_data):
-                bytestring = "{0:08b}".format(byte)[::-1]
-                for j, bit in enumerate(bytestring):
-                    data[i*8 + j] = int(bit)
-            image = bpy.data.images.new(map_node.tag, width=width, height=height)
-            pixels = [None] * width * height
-            np_array = np.zeros((width,height,4), dtype = np.float16)
-            for x, row in enumerate(np_array):
-                for y, pix in enumerate(row):
-                    index = ((x * np_array.shape[0]) + y)
-                    h = data[index]
-                    pix[0] = h
-                    pix[1] = h
-                    pix[2] = h
-                    pix[3] = 1.0
-            image.pixels = np_array.ravel()
-            image.filepath_raw = f"C:/Users/{map_node.tag}.png"
-            image.file_format = 'PNG'
-            image.save()
         val_map_nodes = [
             node.find("./GameSessionManager/WorldManager/EnvironmentGrid/EnvironmentGRid"),
-            node.find("./GameSessionManager/AreaIDs"), #int16, but still looks somewhat wrong.
+            node.find("./GameSessionManager/AreaIDs"), #int16
         ]
+        maps = []
+        for map_node in bit_map_nodes:
+            if map_node is None:
+                continue
+            byte_data = np.array(get_text(map_node, "bits").split(), dtype = np.uint8)
+            bits = np.unpackbits(byte_data, bitorder = "little")
+            bits = bits.astype(np.float32)
+            maps.append((map_node, [bits, bits, bits]))
         for map_node in val_map_nodes:
             if map_node is None:
                 continue
+            data = np.array(get_text(map_node, "val").split(), dtype = np.int64) & 0xFFFF
+            maps.append((map_node, [((data >> 8) & 0xFF) / 255.0, (data & 0xFF) / 255.0]))
+
+        if output_dir is not None:
+            output_dir.mkdir(parents = True, exist_ok = True)
+        images = []
+        for map_node, channels in maps:
             width = int(get_text(map_node, "x", "0"))
             height = int(get_text(map_node, "y", "0"))
-            data = [int(i) for i in get_text(map_node, "val").split(" ")]
-            print(width*height, len(data), len(data)/width/height)
+            if width * height == 0:
+                continue
+            #bit grids are padded to full bytes
+            if len(channels[0]) < width * height:
+                print(f"{map_node.tag}: Expected {width * height} values, got {len(channels[0])}.")
+            pixels = np.zeros((width * height, 4), dtype = np.float32)
+            count = min(len(channels[0]), width * height)
+            for c, channel in enumerate(channels):
+                pixels[:count, c] = channel[:count]
+            pixels[:, 3] = 1.0
+
             image = bpy.data.images.new(map_node.tag, width=width, height=height)
-            pixels = [None] * width * height
-            np_array = np.zeros((width,height,4), dtype = np.float16)
-            for x, row in enumerate(np_array):
-                for y, pix in enumerate(row):
-                    index = (x * np_array.shape[0]) + y
-                    upper_byte = data[index] & (1<<16)-(1<<8)
-                    lower_byte = data[index] & (1<<8)
-                    pix[0] = upper_byte / 255.0
-                    pix[1] = lower_byte / 255.0
-                    pix[2] = 0.0
-                    pix[3] = 1.0
-            image.pixels = np_array.ravel()
-            image.filepath_raw = f"C:/Users/{map_node.tag}.png"
+            image.pixels.foreach_set(pixels.ravel())
             image.file_format = 'PNG'
-            image.save()
-            
+            if output_dir is not None:
+                image.filepath_raw = str(Path(output_dir, f"{map_node.tag}.png"))
+                image.save()
+            else:
+                image.pack()
+            images.append(image)
+        return images
+    
     @classmethod
     def xml_to_blender(cls, node: ET.Element, assetsXML) -> BlenderObject:
         obj = cls.add_blender_object_to_scene(node)
         obj["islandgamedataxml"] = ET.tostring(node)
         obj.name = "ISLAND_GAMEDATA_FILE"
         set_anno_object_class(obj, cls)
-        #create_maps(node)
         
         objects_nodes = node.findall("./GameSessionManager/AreaManagerData/None/Data/Content/AreaObjectManager/GameObject/objects")
         for c, objects_node in enumerate(objects_nodes):
             for i, obj_node in enumerate(objects_node):
                 print(f"Container {c+1} / {len(objects_nodes)}; Object {i+1} / {len(objects_node)},")
                 GameObject.xml_to_blender(obj_node, assetsXML)
+        return obj
     
     @classmethod
     def blender_to_xml(cls, obj, randomize_ids = False):
@@ -2528,7 +3205,7 @@ class IslandGamedataFile:
 anno_object_classes = [
     NoAnnoObject, MainFile, Model, Cf7File,
     SubFile, Decal, Propcontainer, Prop, Particle, IfoCube, IfoPlane, Sequence, DummyGroup,
-    Dummy, Cf7DummyGroup, Cf7Dummy, FeedbackConfig,SimpleAnnoFeedbackEncodingObject, ArbitraryXMLAnnoObject, Light, Cloth, Material, IfoFile, Spline, IslandFile, PropGridInstance,
+    Dummy, Cf7DummyGroup, Cf7Dummy, FeedbackConfig,SimpleAnnoFeedbackEncodingObject, ArbitraryXMLAnnoObject, Light, Cloth, Material, IfoFile, Spline, IslandFile, PropGridInstance, PropGridInstances,
     IslandGamedataFile, GameObject, AnimationsNode, Animation, AnimationSequences, AnimationSequence, Track, TrackElement, IfoMeshHeightmap,BezierCurve,
 ]
 
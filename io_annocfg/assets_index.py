@@ -0,0 +1,151 @@
+from __future__ import annotations
+import mmap
+import os
+import re
+import sqlite3
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .utils import sanitize_xml_text
+from .conversion_cache import ConversionCache
+
+
+class AssetsIndex:
+    """Persistent index of the assets in assets.xml, so that the file does not have to be loaded into a DOM every session.
+
+    The index is a small sqlite database that maps each GUID to the asset name, the cfg filenames of its variations
+    and the byte range of its <Asset> node in assets.xml. It is stored in the conversion cache folder, or next to
+    assets.xml if no cache folder is set, and rebuilt whenever path, size or modification time of assets.xml change.
+    Full asset nodes are only parsed on demand, from their byte range.
+    """
+    index_name = "assets_index.sqlite"
+    asset_tag_pattern = re.compile(rb'<(/?)Asset>')
+
+    def __init__(self, assets_path: Path):
+        self.assets_path = assets_path
+        stat = assets_path.stat()
+        self.source_stamp = f"{assets_path}|{stat.st_size}|{stat.st_mtime_ns}"
+        self.index_path = self.get_index_path(assets_path)
+        self.connection = self.open()
+
+    @classmethod
+    def get_index_path(cls, assets_path: Path) -> Path:
+        cache = ConversionCache.get_instance()
+        if cache is not None:
+            return Path(cache.root, cls.index_name)
+        return assets_path.with_name(assets_path.name + ".index.sqlite")
+
+    def open(self) -> sqlite3.Connection:
+        if self.index_path.exists():
+            try:
+                connection = sqlite3.connect(str(self.index_path))
+                row = connection.execute("SELECT value FROM meta WHERE key = 'source'").fetchone()
+                if row is not None and row[0] == self.source_stamp:
+                    return connection
+                connection.close()
+            except sqlite3.Error as ex:
+                print(f"Warning: Discarding assets index {self.index_path}: {ex}")
+        tmp_path = self.index_path.with_suffix(".tmp")
+        try:
+            tmp_path.unlink(missing_ok = True)
+            self.build(str(tmp_path)).close()
+            os.replace(tmp_path, self.index_path)
+            return sqlite3.connect(str(self.index_path))
+        except (OSError, sqlite3.Error) as ex:
+            print(f"Warning: Could not write assets index {self.index_path}, keeping it in memory: {ex}")
+            return self.build(":memory:")
+
+    def build(self, database: str) -> sqlite3.Connection:
+        """Scans assets.xml and writes the index into the given database.
+
+        Args:
+            database (str): Path of the database file or ":memory:".
+
+        Returns:
+            sqlite3.Connection: Connection to the filled database.
+        """
+        print("Indexing assets.xml")
+        assets: Dict[str, Tuple[Optional[str], int, int, int]] = {}
+        variations: Dict[str, List[Optional[str]]] = {}
+        for offset, length, node in self.iter_asset_nodes():
+            guid_node = node.find("Values/Standard/GUID")
+            if guid_node is None:
+                continue
+            guid = guid_node.text
+            name_node = node.find("Values/Standard/Name")
+            name = name_node.text if name_node is not None else None
+            variations_node = node.find("Values/Object/Variations")
+            if variations_node is None:
+                assets[guid] = (name, offset, length, -1)
+                variations.pop(guid, None)
+                continue
+            filenames = [item.findtext("Filename") for item in list(variations_node)]
+            assets[guid] = (name, offset, length, len(filenames))
+            variations[guid] = filenames
+
+        connection = sqlite3.connect(database)
+        connection.executescript("""
+            CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE assets (guid TEXT PRIMARY KEY, name TEXT, offset INTEGER, length INTEGER, variation_count INTEGER);
+            CREATE TABLE variations (guid TEXT, variation INTEGER, filename TEXT, PRIMARY KEY (guid, variation));
+        """)
+        connection.executemany("INSERT INTO assets VALUES (?, ?, ?, ?, ?)",
+            ((guid, *values) for guid, values in assets.items()))
+        connection.executemany("INSERT INTO variations VALUES (?, ?, ?)",
+            ((guid, i, filename) for guid, filenames in variations.items() for i, filename in enumerate(filenames)))
+        connection.execute("INSERT INTO meta VALUES ('source', ?)", (self.source_stamp,))
+        connection.commit()
+        print(f"Indexed {len(assets)} assets.")
+        return connection
+
+    def iter_asset_nodes(self) -> Iterator[Tuple[int, int, ET.Element]]:
+        """Yields byte offset, byte length and parsed node of every outermost <Asset> in assets.xml."""
+        with open(self.assets_path, "rb") as f, mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) as data:
+            depth = 0
+            start = 0
+            for match in self.asset_tag_pattern.finditer(data):
+                if not match.group(1):
+                    if depth == 0:
+                        start = match.start()
+                    depth += 1
+                    continue
+                if depth == 0:
+                    continue
+                depth -= 1
+                if depth > 0:
+                    continue
+                node = self.parse_snippet(data[start:match.end()], start)
+                if node is not None:
+                    yield start, match.end() - start, node
+
+    def parse_snippet(self, raw: bytes, offset: int) -> Optional[ET.Element]:
+        try:
+            return ET.fromstring(sanitize_xml_text(raw.decode("utf-8")))
+        except (ET.ParseError, UnicodeDecodeError) as ex:
+            print(f"Warning: Skipping invalid asset at byte {offset} of {self.assets_path}: {ex}")
+            return None
+
+    def get_asset(self, guid) -> Optional[ET.Element]:
+        """Parses the <Asset> node with the given GUID from assets.xml.
+
+        Returns:
+            Optional[ET.Element]: The asset node or None if there is no such asset.
+        """
+        row = self.connection.execute("SELECT offset, length FROM assets WHERE guid = ?", (str(guid),)).fetchone()
+        if row is None:
+            return None
+        offset, length = row
+        with open(self.assets_path, "rb") as f:
+            f.seek(offset)
+            return self.parse_snippet(f.read(length), offset)
+
+    def get_name_and_variation_count(self, guid) -> Optional[Tuple[Optional[str], int]]:
+        """Returns the name of the asset and its number of variations (-1 if it has no Variations node), or None if there is no such asset."""
+        return self.connection.execute("SELECT name, variation_count FROM assets WHERE guid = ?", (str(guid),)).fetchone()
+
+    def get_variation_filename(self, guid, index: int) -> Optional[str]:
+        row = self.connection.execute("SELECT filename FROM variations WHERE guid = ? AND variation = ?", (str(guid), index)).fetchone()
+        if row is None:
+            return None
+        return row[0]
@@ -0,0 +1,337 @@
+from __future__ import annotations
+import atexit
+import time
+from pathlib import Path
+from typing import Dict, Hashable, List, Optional, Set
+
+from .prefs import IO_AnnocfgPreferences
+from .utils import file_lock, read_json, write_json
+
+
+def file_stamp(fullpath: Path) -> Optional[List[int]]:
+    """Returns [size, modification time] of the file or None if it does not exist."""
+    try:
+        stat = fullpath.stat()
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class DependencyRecorder:
+    """Records the files (.cfg, .rdm, .prp, .dds, ...) that are read while a .cfg is imported.
+
+    Recorders are used as context managers and can be nested, every recorded file is added to all active recorders,
+    so the recorder of a .cfg also receives the files of its subfiles. Session caches that skip reading files
+    (subfile templates, materials, props) remember the dependencies of their entries and replay them on a hit.
+    """
+    active: List[DependencyRecorder] = []
+    dependencies_by_key: Dict[Hashable, Dict[str, Optional[List[int]]]] = {}
+
+    def __init__(self):
+        self.dependencies: Dict[str, Optional[List[int]]] = {}
+
+    def __enter__(self) -> DependencyRecorder:
+        DependencyRecorder.active.append(self)
+        return self
+
+    def __exit__(self, *args):
+        DependencyRecorder.active.remove(self)
+
+    @classmethod
+    def record(cls, fullpath: Path):
+        if not cls.active:
+            return
+        stamp = file_stamp(fullpath)
+        for recorder in cls.active:
+            recorder.dependencies[str(fullpath)] = stamp
+
+    @classmethod
+    def record_all(cls, dependencies: Dict[str, Optional[List[int]]]):
+        for recorder in cls.active:
+            recorder.dependencies.update(dependencies)
+
+    @classmethod
+    def remember(cls, key: Hashable, dependencies: Dict[str, Optional[List[int]]]):
+        cls.dependencies_by_key[key] = dependencies
+
+    @classmethod
+    def replay(cls, key: Hashable):
+        """Records the remembered dependencies of a session cache entry again."""
+        cls.record_all(cls.dependencies_by_key.get(key, {}))
+
+
+class CfgLibraryCache:
+    """Bookkeeping for the cfg cache, the library folder with one .blend file per cached .cfg.
+
+    A manifest (cfg_cache_manifest.json) in the cfg cache folder counts how often each .cfg was requested and when
+    it was last used. A .cfg is written to the library once it was requested cfg_cache_min_uses times, and the least
+    recently used .blend files (the less used ones first on ties) are deleted when the library exceeds its size budget.
+    Every cached entry stores the files it was built from with their sizes and modification times (see DependencyRecorder),
+    so outdated entries are found without opening any .blend file, see is_up_to_date() and validate().
+    The manifest also keeps hit and miss counts of library lookups, see report().
+
+    Other processes may use the same folder at the same time. Each one only counts its own changes and merges them
+    into the manifest on disk when it saves, see save_manifest().
+    """
+    manifest_name = "cfg_cache_manifest.json"
+    save_interval = 32 #manifest changes before the manifest is written again
+
+    instance: Optional[CfgLibraryCache] = None
+    invalid_roots: Set[Path] = set() #already reported
+
+    def __init__(self, root: Path, budget_bytes: int):
+        self.root = root
+        self.budget_bytes = budget_bytes
+        self.entries: Dict[str, Dict] = {}
+        self.hits = 0
+        self.misses = 0
+        self.unsaved_changes = 0
+        #changes since the last save, merged into the manifest on disk
+        self.new_uses: Dict[str, int] = {}
+        self.new_hits = 0
+        self.new_misses = 0
+        self.changed_files: Set[str] = set()
+        self.load_manifest()
+
+    @classmethod
+    def get_instance(cls) -> Optional[CfgLibraryCache]:
+        """Returns the cache for the cfg cache folder from the preferences. The folder is created if caching is enabled.
+
+        Returns:
+            Optional[CfgLibraryCache]: The cache or None if the folder does not exist and cannot be created.
+        """
+        root = IO_AnnocfgPreferences.get_cfg_cache_path()
+        if not root.is_dir():
+            if IO_AnnocfgPreferences.get_cfg_cache_min_uses() <= 0:
+                #nothing is written to the library, so there is nothing to load either
+                return None
+            try:
+                root.mkdir(parents = True, exist_ok = True)
+            except OSError as ex:
+                if root not in cls.invalid_roots:
+                    cls.invalid_roots.add(root)
+                    print(f"Warning, invalid cfg cache path {root}: {ex}")
+                return None
+        budget_bytes = IO_AnnocfgPreferences.get_cfg_cache_budget_mb() * 1024 * 1024
+        if cls.instance is None or cls.instance.root != root:
+            if cls.instance is not None:
+                cls.instance.save_manifest()
+            cls.instance = CfgLibraryCache(root, budget_bytes)
+        cls.instance.budget_bytes = budget_bytes
+        return cls.instance
+
+    @classmethod
+    def flush(cls):
+        """Writes pending manifest changes of the active cache."""
+        if cls.instance is not None:
+            cls.instance.save_manifest()
+
+    def load_manifest(self):
+        """Reads the manifest on disk and applies the unsaved changes of this process to it."""
+        manifest = read_json(Path(self.root, self.manifest_name))
+        entries = manifest.get("entries", {})
+        for data_path in self.new_uses.keys() | self.changed_files:
+            own = self.entries[data_path]
+            entry = entries.setdefault(data_path, {"uses": 0, "last_used": 0.0, "bytes": 0})
+            entry["uses"] += self.new_uses.get(data_path, 0)
+            entry["last_used"] = max(entry["last_used"], own["last_used"])
+            if data_path in self.changed_files:
+                entry["bytes"] = own["bytes"]
+                entry.pop("dependencies", None)
+                if "dependencies" in own:
+                    entry["dependencies"] = own["dependencies"]
+        self.entries = entries
+        self.hits = manifest.get("hits", 0) + self.new_hits
+        self.misses = manifest.get("misses", 0) + self.new_misses
+
+    def save_manifest(self, keep: Optional[str] = None):
+        """Merges the changes of this process into the manifest on disk, evicts down to the budget and writes it.
+
+        Args:
+            keep (str, optional): Entry that must not be evicted, f.e. the one that was just added.
+        """
+        if self.unsaved_changes == 0 and self.total_bytes() <= self.budget_bytes:
+            return
+        manifest_path = Path(self.root, self.manifest_name)
+        try:
+            with file_lock(manifest_path):
+                self.load_manifest()
+                #evict on the merged entries, so that the last use by any process counts
+                self.evict(keep)
+                write_json(manifest_path, {"entries": self.entries, "hits": self.hits, "misses": self.misses})
+            self.unsaved_changes = 0
+            self.new_uses = {}
+            self.new_hits = 0
+            self.new_misses = 0
+            self.changed_files = set()
+        except OSError as ex:
+            print(f"Warning: Could not write cfg cache manifest {manifest_path}: {ex}")
+
+    def mark_changed(self):
+        self.unsaved_changes += 1
+        if self.unsaved_changes >= self.save_interval:
+            self.save_manifest()
+
+    def get_library_file(self, data_path: str) -> Path:
+        return Path(self.root, data_path + ".blend")
+
+    def get_entry(self, data_path: str) -> Dict:
+        entry = self.entries.get(data_path)
+        if entry is None:
+            entry = {"uses": 0, "last_used": 0.0, "bytes": 0}
+            self.entries[data_path] = entry
+        return entry
+
+    def record_use(self, data_path: str):
+        """Counts a request of the .cfg, no matter where it is loaded from."""
+        entry = self.get_entry(data_path)
+        entry["uses"] += 1
+        entry["last_used"] = time.time()
+        self.new_uses[data_path] = self.new_uses.get(data_path, 0) + 1
+        self.mark_changed()
+
+    def should_cache(self, data_path: str) -> bool:
+        """Returns whether the .cfg was used often enough to be written to the library.
+
+        Returns:
+            bool: False if caching is disabled (cfg_cache_min_uses is 0) or the .cfg is already cached.
+        """
+        min_uses = IO_AnnocfgPreferences.get_cfg_cache_min_uses()
+        if min_uses <= 0:
+            return False
+        entry = self.entries.get(data_path)
+        if entry is None or entry["bytes"] > 0:
+            return False
+        return entry["uses"] >= min_uses
+
+    def record_hit(self):
+        self.hits += 1
+        self.new_hits += 1
+        self.mark_changed()
+
+    def record_miss(self):
+        self.misses += 1
+        self.new_misses += 1
+        self.mark_changed()
+
+    def add(self, data_path: str, dependencies: Dict[str, Optional[List[int]]]):
+        """Registers the .blend file that was written for data_path and evicts other entries if the budget is exceeded.
+
+        Args:
+            data_path (str): The .cfg file.
+            dependencies (Dict[str, Optional[List[int]]]): All files the .blend file was built from, with their file_stamp.
+        """
+        library_file = self.get_library_file(data_path)
+        if not library_file.exists():
+            return
+        entry = self.get_entry(data_path)
+        entry["bytes"] = library_file.stat().st_size
+        entry["dependencies"] = dependencies
+        entry["last_used"] = time.time()
+        self.changed_files.add(data_path)
+        self.mark_changed()
+        if self.total_bytes() > self.budget_bytes:
+            self.save_manifest(keep = data_path)
+
+    def remove(self, data_path: str):
+        """Deletes the .blend file of data_path. The use count is kept, so that it gets cached again when it is used."""
+        entry = self.entries.get(data_path)
+        if entry is None:
+            return
+        self.get_library_file(data_path).unlink(missing_ok = True)
+        entry["bytes"] = 0
+        entry.pop("dependencies", None)
+        self.changed_files.add(data_path)
+        #no save here, remove() also runs during save_manifest()
+        self.unsaved_changes += 1
+
+    def get_dependencies(self, data_path: str) -> Dict[str, Optional[List[int]]]:
+        entry = self.entries.get(data_path)
+        if entry is None:
+            return {}
+        return entry.get("dependencies", {})
+
+    def is_up_to_date(self, data_path: str) -> Optional[bool]:
+        """Checks whether any file the cached .blend of data_path was built from changed, without opening the .blend file.
+
+        Returns:
+            Optional[bool]: None if the entry has no dependency information (f.e. because it was cached by an older version).
+        """
+        entry = self.entries.get(data_path)
+        if entry is None or "dependencies" not in entry:
+            return None
+        for path, stamp in entry["dependencies"].items():
+            if file_stamp(Path(path)) != stamp:
+                return False
+        return True
+
+    def validate(self) -> int:
+        """Removes all cached entries with changed dependencies.
+
+        Returns:
+            int: Number of removed .blend files.
+        """
+        outdated = [data_path for data_path in self.cached_entries() if self.is_up_to_date(data_path) is False]
+        for data_path in outdated:
+            print(f"Cache Invalidation for {data_path}, the file or one of its dependencies changed")
+            self.remove(data_path)
+        return len(outdated)
+
+    def total_bytes(self) -> int:
+        return sum(entry["bytes"] for entry in self.entries.values())
+
+    def cached_entries(self):
+        return [data_path for data_path, entry in self.entries.items() if entry["bytes"] > 0]
+
+    def evict(self, keep: Optional[str] = None):
+        """Removes the least recently used .blend files (the least used ones first on ties) until the library fits into its budget.
+
+        Args:
+            keep (str, optional): Entry that must not be removed, f.e. the one that was just added.
+        """
+        total = self.total_bytes()
+        if total <= self.budget_bytes:
+            return
+        order = lambda data_path: (self.entries[data_path]["last_used"], self.entries[data_path]["uses"])
+        for data_path in sorted(self.cached_entries(), key = order):
+            if total <= self.budget_bytes:
+                break
+            if data_path == keep:
+                continue
+            total -= self.entries[data_path]["bytes"]
+            self.remove(data_path)
+
+    def prune(self) -> int:
+        """Forgets library files that were deleted by hand, registers ones that were not in the manifest,
+        removes outdated entries and evicts down to the budget.
+
+        Returns:
+            int: Number of removed .blend files.
+        """
+        for data_path in self.cached_entries():
+            if not self.get_library_file(data_path).exists():
+                self.entries[data_path]["bytes"] = 0
+                self.entries[data_path].pop("dependencies", None)
+                self.changed_files.add(data_path)
+                self.mark_changed()
+        for library_file in self.root.rglob("*.blend"):
+            data_path = library_file.relative_to(self.root).as_posix()[:-len(".blend")]
+            entry = self.get_entry(data_path)
+            if entry["bytes"] == 0:
+                entry["bytes"] = library_file.stat().st_size
+                entry["last_used"] = max(entry["last_used"], library_file.stat().st_mtime)
+                self.changed_files.add(data_path)
+                self.mark_changed()
+        count = len(self.cached_entries())
+        self.validate()
+        self.save_manifest()
+        return count - len(self.cached_entries())
+
+    def report(self) -> str:
+        lookups = self.hits + self.misses
+        hit_rate = 100.0 * self.hits / lookups if lookups > 0 else 0.0
+        return (f"Cfg cache: {len(self.cached_entries())} files, {self.total_bytes() / (1024 * 1024):.1f} of {self.budget_bytes / (1024 * 1024):.0f} MB, "
+            f"{self.hits} hits, {self.misses} misses ({hit_rate:.1f}% hit rate)")
+
+
+atexit.register(CfgLibraryCache.flush)
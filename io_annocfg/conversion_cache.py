@@ -0,0 +1,287 @@
+from __future__ import annotations
+import atexit
+import hashlib
+import shutil
+import time
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Set
+
+from .prefs import IO_AnnocfgPreferences
+from .utils import file_lock, read_json, write_json
+
+
+class ConversionCache:
+    """Stores converted files (.glb, .png, ...) in a dedicated folder instead of next to their sources in the rda folder.
+
+    Each conversion result lives in its own folder named after a key that is built from the source path,
+    its size and its modification time (and those of additional sources, f.e. the model of an animation).
+    Changing a source therefore produces a new key, and the outdated result is dropped when the new one is added.
+    The tools write directly into that folder, so the converted files keep their usual names.
+
+    A manifest (manifest.json) lists all entries with their size and last use, so that lookups do not need
+    to touch the cache folder and the least recently used entries can be evicted once the size budget is exceeded.
+    Lookups only update the last use in memory, it is written with the next change or when blender exits.
+    Other processes may use the same folder at the same time, f.e. the workers of an asset library build.
+    Each one merges its added and removed entries into the manifest on disk when it saves, see save_manifest().
+    """
+    manifest_name = "manifest.json"
+    save_interval = 64 #manifest changes before the manifest is written again
+
+    instance: Optional[ConversionCache] = None
+
+    def __init__(self, root: Path, budget_bytes: int):
+        self.root = root
+        self.budget_bytes = budget_bytes
+        self.entries: Dict[str, Dict] = {}
+        self.key_by_target: Dict[str, str] = {}
+        self.unsaved_changes = 0
+        #changes since the last save, merged into the manifest on disk
+        self.changed_keys: Set[str] = set()
+        self.removed_keys: Set[str] = set()
+        #entries whose file was seen in this session
+        self.verified_keys: Set[str] = set()
+        self.load_manifest()
+
+    @classmethod
+    def get_instance(cls) -> Optional[ConversionCache]:
+        """Returns the cache configured in the preferences or None if no cache folder is set.
+
+        Returns:
+            Optional[ConversionCache]: The cache.
+        """
+        if not IO_AnnocfgPreferences.conversion_cache_enabled():
+            return None
+        root = IO_AnnocfgPreferences.get_conversion_cache_path()
+        budget_bytes = IO_AnnocfgPreferences.get_conversion_cache_budget_mb() * 1024 * 1024
+        if cls.instance is None or cls.instance.root != root:
+            if cls.instance is not None:
+                cls.instance.save_manifest()
+            root.mkdir(parents=True, exist_ok=True)
+            cls.instance = ConversionCache(root, budget_bytes)
+        cls.instance.budget_bytes = budget_bytes
+        return cls.instance
+
+    @classmethod
+    def flush(cls):
+        """Writes pending manifest changes of the active cache."""
+        if cls.instance is not None:
+            cls.instance.save_manifest()
+
+    def load_manifest(self):
+        """Reads the manifest on disk and applies the unsaved changes of this process to it."""
+        entries = read_json(Path(self.root, self.manifest_name)).get("entries", {})
+        for key in self.removed_keys:
+            entries.pop(key, None)
+        for key in self.changed_keys:
+            entry = self.entries.get(key)
+            if entry is None or (key not in entries and not Path(self.root, entry["file"]).exists()):
+                #evicted by another process
+                continue
+            if key in entries:
+                entry["last_used"] = max(entry["last_used"], entries[key]["last_used"])
+            entries[key] = entry
+        self.entries = entries
+        self.key_by_target = {}
+        for key, entry in sorted(self.entries.items(), key = lambda item: item[1]["last_used"]):
+            self.key_by_target[entry["target"]] = key
+
+    def save_manifest(self, keep: Optional[str] = None):
+        """Merges the changes of this process into the manifest on disk, evicts down to the budget and writes it.
+
+        Args:
+            keep (str, optional): Key of an entry that must not be evicted, f.e. the one that was just added.
+        """
+        if not self.changed_keys and not self.removed_keys and self.total_bytes() <= self.budget_bytes:
+            return
+        manifest_path = Path(self.root, self.manifest_name)
+        try:
+            with file_lock(manifest_path):
+                self.load_manifest()
+                #evict on the merged entries, so that the last use by any process counts
+                self.evict(keep)
+                write_json(manifest_path, {"entries": self.entries})
+            self.unsaved_changes = 0
+            self.changed_keys = set()
+            self.removed_keys = set()
+        except OSError as ex:
+            print(f"Warning: Could not write conversion cache manifest {manifest_path}: {ex}")
+
+    def mark_changed(self, key: str):
+        self.changed_keys.add(key)
+        self.unsaved_changes += 1
+        if self.unsaved_changes >= self.save_interval:
+            self.save_manifest()
+
+    @staticmethod
+    def target_name(source: Path, suffix: str, extra_sources: Sequence[Path] = ()) -> str:
+        return "|".join([str(source), suffix] + [str(p) for p in extra_sources])
+
+    @staticmethod
+    def make_key(source: Path, suffix: str, extra_sources: Sequence[Path] = ()) -> str:
+        parts = [suffix]
+        for path in [source, *extra_sources]:
+            stat = path.stat()
+            parts.append(f"{path}|{stat.st_size}|{stat.st_mtime_ns}")
+        return hashlib.sha1("\n".join(parts).encode("utf-8")).hexdigest()
+
+    def get_entry_dir(self, key: str) -> Path:
+        return Path(self.root, key[:2], key)
+
+    def lookup(self, source: Path, suffix: str, extra_sources: Sequence[Path] = ()) -> Optional[Path]:
+        """Returns the cached conversion result of source or None if there is no up to date one.
+
+        Args:
+            source (Path): The source file, f.e. the .rdm file.
+            suffix (str): Suffix of the converted file, f.e. ".glb".
+            extra_sources (Sequence[Path], optional): Other files the conversion depends on.
+
+        Returns:
+            Optional[Path]: The converted file.
+        """
+        try:
+            key = self.make_key(source, suffix, extra_sources)
+        except OSError:
+            return None
+        entry = self.entries.get(key)
+        if entry is None and self.get_entry_dir(key).exists():
+            #possibly converted by another process since the manifest was read
+            self.load_manifest()
+            entry = self.entries.get(key)
+        if entry is None:
+            return None
+        converted = Path(self.root, entry["file"])
+        if key not in self.verified_keys:
+            if not converted.exists():
+                #deleted outside of the cache, convert again
+                self.remove(key)
+                return None
+            self.verified_keys.add(key)
+        entry["last_used"] = time.time()
+        #no mark_changed, the new last use is written with the next save
+        self.changed_keys.add(key)
+        return converted
+
+    def get_output_dir(self, source: Path, suffix: str, extra_sources: Sequence[Path] = ()) -> Path:
+        """Returns (and creates) the folder a converter should write the result for source to.
+
+        Returns:
+            Path: Output folder.
+        """
+        output_dir = self.get_entry_dir(self.make_key(source, suffix, extra_sources))
+        output_dir.mkdir(parents=True, exist_ok=True)
+        return output_dir
+
+    def add(self, source: Path, produced_file: Path, extra_sources: Sequence[Path] = ()) -> Optional[Path]:
+        """Registers a file that a converter wrote into get_output_dir(...).
+
+        Args:
+            source (Path): The source file.
+            produced_file (Path): The converted file.
+            extra_sources (Sequence[Path], optional): Other files the conversion depends on.
+
+        Returns:
+            Optional[Path]: The converted file or None if the conversion failed.
+        """
+        suffix = produced_file.suffix
+        key = self.make_key(source, suffix, extra_sources)
+        if not produced_file.exists():
+            shutil.rmtree(self.get_entry_dir(key), ignore_errors = True)
+            return None
+        target = self.target_name(source, suffix, extra_sources)
+        outdated_key = self.key_by_target.get(target)
+        if outdated_key is not None and outdated_key != key:
+            self.remove(outdated_key)
+        self.entries[key] = {
+            "target": target,
+            "file": produced_file.relative_to(self.root).as_posix(),
+            "bytes": produced_file.stat().st_size,
+            "last_used": time.time(),
+        }
+        self.key_by_target[target] = key
+        self.verified_keys.add(key)
+        self.mark_changed(key)
+        if self.total_bytes() > self.budget_bytes:
+            self.save_manifest(keep = key)
+        return produced_file
+
+    def remove(self, key: str):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        if self.key_by_target.get(entry["target"]) == key:
+            del self.key_by_target[entry["target"]]
+        shutil.rmtree(self.get_entry_dir(key), ignore_errors = True)
+        self.changed_keys.discard(key)
+        self.verified_keys.discard(key)
+        self.removed_keys.add(key)
+        #no save here, remove() also runs during save_manifest()
+        self.unsaved_changes += 1
+
+    def total_bytes(self) -> int:
+        return sum(entry["bytes"] for entry in self.entries.values())
+
+    def evict(self, keep: Optional[str] = None):
+        """Removes the least recently used entries until the cache fits into its budget.
+
+        Args:
+            keep (str, optional): Key of an entry that must not be removed, f.e. the one that was just added.
+        """
+        total = self.total_bytes()
+        if total <= self.budget_bytes:
+            return
+        for key in sorted(self.entries.keys(), key = lambda k: self.entries[k]["last_used"]):
+            if total <= self.budget_bytes:
+                break
+            if key == keep:
+                continue
+            total -= self.entries[key]["bytes"]
+            self.remove(key)
+
+
+def get_output_dir(source: Path, suffix: str, extra_sources: Sequence[Path] = ()) -> Path:
+    """Returns the folder a converter should write the conversion result of source to.
+    This is a conversion cache folder or, if the cache is disabled, the folder of source.
+    """
+    cache = ConversionCache.get_instance()
+    if cache is None:
+        return source.parent
+    return cache.get_output_dir(source, suffix, extra_sources)
+
+def register_converted_file(source: Path, produced_file: Path, extra_sources: Sequence[Path] = ()) -> Optional[Path]:
+    """Adds a file written to get_output_dir(...) to the conversion cache.
+
+    Returns:
+        Optional[Path]: The converted file or None if it does not exist.
+    """
+    cache = ConversionCache.get_instance()
+    if cache is not None and produced_file.is_relative_to(cache.root):
+        return cache.add(source, produced_file, extra_sources)
+    if produced_file.exists():
+        return produced_file
+    return None
+
+def is_in_conversion_cache(path: Path) -> bool:
+    cache = ConversionCache.get_instance()
+    return cache is not None and Path(path).is_relative_to(cache.root)
+
+def find_converted_file(source: Path, suffix: str, extra_sources: Sequence[Path] = ()) -> Optional[Path]:
+    """Finds the up to date conversion result of source, either in the conversion cache or, if the cache is disabled, next to source.
+
+    Args:
+        source (Path): The source file.
+        suffix (str): Suffix of the converted file, f.e. ".glb".
+        extra_sources (Sequence[Path], optional): Other files the conversion depends on.
+
+    Returns:
+        Optional[Path]: The converted file.
+    """
+    cache = ConversionCache.get_instance()
+    if cache is not None and source.exists() and all(p.exists() for p in extra_sources):
+        return cache.lookup(source, suffix, extra_sources)
+    converted = source.with_suffix(suffix)
+    if converted.exists():
+        return converted
+    return None
+
+
+atexit.register(ConversionCache.flush)
@@ -0,0 +1,463 @@
+from __future__ import annotations
+import struct
+import zlib
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+
+class DdsFormatError(Exception):
+    """Raised when a .dds file uses a pixel format the decoder does not support. Use texconv instead."""
+
+
+dds_magic = b"DDS "
+dds_header_size = 128 #magic and DDS_HEADER
+dx10_header_size = 20
+
+DDPF_ALPHAPIXELS = 0x1
+DDPF_FOURCC = 0x4
+DDPF_RGB = 0x40
+DDPF_LUMINANCE = 0x20000
+
+# (format name, block size in bytes, signed) for block compressed formats
+fourcc_formats: Dict[bytes, Tuple[str, int, bool]] = {
+    b"DXT1": ("BC1", 8, False),
+    b"DXT2": ("BC2", 16, False),
+    b"DXT3": ("BC2", 16, False),
+    b"DXT4": ("BC3", 16, False),
+    b"DXT5": ("BC3", 16, False),
+    b"ATI1": ("BC4", 8, False),
+    b"BC4U": ("BC4", 8, False),
+    b"BC4S": ("BC4", 8, True),
+    b"ATI2": ("BC5", 16, False),
+    b"BC5U": ("BC5", 16, False),
+    b"BC5S": ("BC5", 16, True),
+}
+dxgi_formats: Dict[int, Tuple[str, int, bool]] = {
+    71: ("BC1", 8, False), 72: ("BC1", 8, False),
+    74: ("BC2", 16, False), 75: ("BC2", 16, False),
+    77: ("BC3", 16, False), 78: ("BC3", 16, False),
+    80: ("BC4", 8, False), 81: ("BC4", 8, True),
+    83: ("BC5", 16, False), 84: ("BC5", 16, True),
+    98: ("BC7", 16, False), 99: ("BC7", 16, False),
+}
+# uncompressed DXGI formats: (channel order, bytes per pixel)
+dxgi_uncompressed_formats: Dict[int, Tuple[str, int]] = {
+    28: ("RGBA", 4), 29: ("RGBA", 4),
+    87: ("BGRA", 4), 91: ("BGRA", 4),
+    88: ("BGRX", 4), 93: ("BGRX", 4),
+    61: ("R", 1),
+    49: ("RG", 2),
+}
+
+
+def expand_bits(values: np.ndarray, bits: int) -> np.ndarray:
+    """Scales bits wide unsigned values to 8 bit by replicating their highest bits."""
+    values = values.astype(np.int32) << (8 - bits)
+    return values | (values >> bits)
+
+def unpack_565(colors: np.ndarray) -> np.ndarray:
+    """Returns the rgb values (shape (..., 3)) of 16 bit 5:6:5 colors."""
+    colors = colors.astype(np.int32)
+    return np.stack([expand_bits(colors >> 11, 5), expand_bits((colors >> 5) & 0x3f, 6), expand_bits(colors & 0x1f, 5)], axis = -1)
+
+def blocks_to_pixels(block_pixels: np.ndarray, width: int, height: int) -> np.ndarray:
+    """Arranges decoded blocks of shape (n, 16, channels) into an image of shape (height, width, channels)."""
+    blocks_x = max(1, (width + 3) // 4)
+    blocks_y = max(1, (height + 3) // 4)
+    channels = block_pixels.shape[-1]
+    image = block_pixels.reshape(blocks_y, blocks_x, 4, 4, channels).transpose(0, 2, 1, 3, 4)
+    return image.reshape(blocks_y * 4, blocks_x * 4, channels)[:height, :width]
+
+
+def decode_bc1_colors(blocks: np.ndarray, four_color_mode: bool = False) -> np.ndarray:
+    """Decodes the 8 byte color part of BC1/BC2/BC3 blocks into rgba values of shape (n, 16, 4).
+
+    Args:
+        blocks (np.ndarray): Shape (n, 8), bytes.
+        four_color_mode (bool): BC2 and BC3 always interpolate four colors, BC1 only if color0 > color1.
+    """
+    c0 = blocks[:, 0].astype(np.int32) | (blocks[:, 1].astype(np.int32) << 8)
+    c1 = blocks[:, 2].astype(np.int32) | (blocks[:, 3].astype(np.int32) << 8)
+    rgb0 = unpack_565(c0)
+    rgb1 = unpack_565(c1)
+    palette = np.empty((len(blocks), 4, 4), dtype = np.int32)
+    palette[:, :, 3] = 255
+    palette[:, 0, :3] = rgb0
+    palette[:, 1, :3] = rgb1
+    interpolate_four = (c0 > c1)[:, None] | four_color_mode
+    palette[:, 2, :3] = np.where(interpolate_four, (2 * rgb0 + rgb1 + 1) // 3, (rgb0 + rgb1) // 2)
+    palette[:, 3, :3] = np.where(interpolate_four, (rgb0 + 2 * rgb1 + 1) // 3, 0)
+    palette[:, 3, 3] = np.where(interpolate_four[:, 0], 255, 0)
+    indices = blocks[:, 4:8].astype(np.uint32)
+    indices = indices[:, 0] | (indices[:, 1] << 8) | (indices[:, 2] << 16) | (indices[:, 3] << 24)
+    pixel_indices = (indices[:, None] >> (2 * np.arange(16, dtype = np.uint32))) & 3
+    return np.take_along_axis(palette, pixel_indices[:, :, None].astype(np.intp), axis = 1)
+
+def decode_bc4_channel(blocks: np.ndarray, signed: bool = False) -> np.ndarray:
+    """Decodes 8 byte BC4 blocks (also the alpha of BC3 and the channels of BC5) into values of shape (n, 16)."""
+    if signed:
+        e0 = blocks[:, 0].view(np.int8).astype(np.int32)
+        e1 = blocks[:, 1].view(np.int8).astype(np.int32)
+        low, high = -127, 127
+    else:
+        e0 = blocks[:, 0].astype(np.int32)
+        e1 = blocks[:, 1].astype(np.int32)
+        low, high = 0, 255
+    e0 = e0[:, None]
+    e1 = e1[:, None]
+    steps = np.arange(1, 7, dtype = np.int32)[None, :]
+    eight_values = ((7 - steps) * e0 + steps * e1 + 3) // 7
+    six_values = ((5 - steps[:, :4]) * e0 + steps[:, :4] * e1 + 2) // 5
+    interpolate_eight = e0 > e1
+    palette = np.empty((len(blocks), 8), dtype = np.int32)
+    palette[:, 0] = e0[:, 0]
+    palette[:, 1] = e1[:, 0]
+    palette[:, 2:6] = np.where(interpolate_eight, eight_values[:, :4], six_values)
+    palette[:, 6] = np.where(interpolate_eight[:, 0], eight_values[:, 4], low)
+    palette[:, 7] = np.where(interpolate_eight[:, 0], eight_values[:, 5], high)
+    indices = np.zeros(len(blocks), dtype = np.uint64)
+    for i in range(6):
+        indices |= blocks[:, 2 + i].astype(np.uint64) << np.uint64(8 * i)
+    pixel_indices = (indices[:, None] >> (3 * np.arange(16, dtype = np.uint64))) & np.uint64(7)
+    values = np.take_along_axis(palette, pixel_indices.astype(np.intp), axis = 1)
+    if signed:
+        values = ((values + 127) * 255 + 127) // 254
+    return values
+
+def decode_bc1(blocks: np.ndarray, signed: bool) -> np.ndarray:
+    return decode_bc1_colors(blocks)
+
+def decode_bc2(blocks: np.ndarray, signed: bool) -> np.ndarray:
+    pixels = decode_bc1_colors(blocks[:, 8:], four_color_mode = True)
+    alpha = np.stack([blocks[:, :8] & 0x0f, blocks[:, :8] >> 4], axis = -1).reshape(-1, 16)
+    pixels[:, :, 3] = alpha.astype(np.int32) * 17
+    return pixels
+
+def decode_bc3(blocks: np.ndarray, signed: bool) -> np.ndarray:
+    pixels = decode_bc1_colors(blocks[:, 8:], four_color_mode = True)
+    pixels[:, :, 3] = decode_bc4_channel(blocks[:, :8])
+    return pixels
+
+def decode_bc4(blocks: np.ndarray, signed: bool) -> np.ndarray:
+    # single channel textures are written as grey scale by texconv
+    values = decode_bc4_channel(blocks, signed)
+    return np.stack([values, values, values, np.full_like(values, 255)], axis = -1)
+
+def decode_bc5(blocks: np.ndarray, signed: bool) -> np.ndarray:
+    red = decode_bc4_channel(blocks[:, :8], signed)
+    green = decode_bc4_channel(blocks[:, 8:], signed)
+    return np.stack([red, green, np.zeros_like(red), np.full_like(red, 255)], axis = -1)
+
+
+# BC7: (subsets, partition bits, rotation bits, index selection bits, color bits, alpha bits,
+# endpoint p-bits, shared p-bits, index bits, secondary index bits) per mode
+bc7_modes = [
+    (3, 4, 0, 0, 4, 0, 1, 0, 3, 0),
+    (2, 6, 0, 0, 6, 0, 0, 1, 3, 0),
+    (3, 6, 0, 0, 5, 0, 0, 0, 2, 0),
+    (2, 6, 0, 0, 7, 0, 1, 0, 2, 0),
+    (1, 0, 2, 1, 5, 6, 0, 0, 2, 3),
+    (1, 0, 2, 0, 7, 8, 0, 0, 2, 2),
+    (1, 0, 0, 0, 7, 7, 1, 0, 4, 0),
+    (2, 6, 0, 0, 5, 5, 1, 0, 2, 0),
+]
+bc7_weights = {
+    2: np.array([0, 21, 43, 64], dtype = np.int32),
+    3: np.array([0, 9, 18, 27, 37, 46, 55, 64], dtype = np.int32),
+    4: np.array([0, 4, 9, 13, 17, 21, 26, 30, 34, 38, 43, 47, 51, 55, 60, 64], dtype = np.int32),
+}
+# bit i is the subset of pixel i
+bc7_partitions2 = np.array([
+    0xcccc, 0x8888, 0xeeee, 0xecc8, 0xc880, 0xfeec, 0xfec8, 0xec80, 0xc800, 0xffec, 0xfe80, 0xe800, 0xffe8, 0xff00, 0xfff0, 0xf000,
+    0xf710, 0x008e, 0x7100, 0x08ce, 0x008c, 0x7310, 0x3100, 0x8cce, 0x088c, 0x3110, 0x6666, 0x366c, 0x17e8, 0x0ff0, 0x718e, 0x399c,
+    0xaaaa, 0xf0f0, 0x5a5a, 0x33cc, 0x3c3c, 0x55aa, 0x9696, 0xa55a, 0x73ce, 0x13c8, 0x324c, 0x3bdc, 0x6996, 0xc33c, 0x9966, 0x0660,
+    0x0272, 0x04e4, 0x4e40, 0x2720, 0xc936, 0x936c, 0x39c6, 0x639c, 0x9336, 0x9cc6, 0x817e, 0xe718, 0xccf0, 0x0fcc, 0x7744, 0xee22,
+], dtype = np.int32)
+bc7_partitions3 = np.array([
+    "0011001102212222", "0001001122112221", "0000200122112211", "0222002200110111",
+    "0000000011221122", "0011001100220022", "0022002211111111", "0011001122112211",
+    "0000000011112222", "0000111111112222", "0000111122222222", "0012001200120012",
+    "0112011201120112", "0122012201220122", "0011011211221222", "0011200122002220",
+    "0001001101121122", "0111001120012200", "0000112211221122", "0022002200221111",
+    "0111011102220222", "0001000122212221", "0000001101220122", "0000110022102210",
+    "0122012200110000", "0012001211222222", "0110122112210110", "0000011012211221",
+    "0022110211020022", "0110011020022222", "0011012201220011", "0000200022112221",
+    "0000000211221222", "0222002200120011", "0011001200220222", "0120012001200120",
+    "0000111122220000", "0120120120120120", "0120201212010120", "0011220011220011",
+    "0011112222000011", "0101010122222222", "0000000021212121", "0022112200221122",
+    "0022001100220011", "0220122102201221", "0101222222220101", "0000212121212121",
+    "0101010101012222", "0222011102220111", "0002111200021112", "0000211221122112",
+    "0222011101110222", "0002111211120002", "0110011001102222", "0000000021122112",
+    "0110011022222222", "0022001100110022", "0022112211220022", "0000000000002112",
+    "0002000100020001", "0222122202221222", "0101222222222222", "0111201122012220",
+], dtype = "S16").view("S1").reshape(64, 16).astype(np.int32)
+bc7_anchors2 = np.array([
+    15, 15, 15, 15, 15, 15, 15, 15, 15, 15, 15, 15, 15, 15, 15, 15,
+    15, 2, 8, 2, 2, 8, 8, 15, 2, 8, 2, 2, 8, 8, 2, 2,
+    15, 15, 6, 8, 2, 8, 15, 15, 2, 8, 2, 2, 2, 15, 15, 6,
+    6, 2, 6, 8, 15, 15, 2, 2, 15, 15, 15, 15, 15, 2, 2, 15,
+], dtype = np.int32)
+bc7_anchors3_second = np.array([
+    3, 3, 15, 15, 8, 3, 15, 15, 8, 8, 6, 6, 6, 5, 3, 3,
+    3, 3, 8, 15, 3, 3, 6, 10, 5, 8, 8, 6, 8, 5, 15, 15,
+    8, 15, 3, 5, 6, 10, 8, 15, 15, 3, 15, 5, 15, 15, 15, 15,
+    3, 15, 5, 5, 5, 8, 5, 10, 5, 10, 8, 13, 15, 12, 3, 3,
+], dtype = np.int32)
+bc7_anchors3_third = np.array([
+    15, 8, 8, 3, 15, 15, 3, 8, 15, 15, 15, 15, 15, 15, 15, 8,
+    15, 8, 15, 3, 15, 8, 15, 8, 3, 15, 6, 10, 15, 15, 10, 8,
+    15, 3, 15, 10, 10, 8, 9, 10, 6, 15, 8, 15, 3, 6, 6, 8,
+    15, 3, 15, 15, 15, 15, 15, 15, 15, 15, 15, 15, 3, 15, 15, 8,
+], dtype = np.int32)
+
+def read_bits(bits: np.ndarray, position: int, count: int) -> np.ndarray:
+    """Reads count bits starting at position (lsb first) from every row of the (n, 128) bit array."""
+    if count == 0:
+        return np.zeros(len(bits), dtype = np.int32)
+    return bits[:, position:position + count].astype(np.int32) @ (1 << np.arange(count, dtype = np.int32))
+
+def read_indices(bits: np.ndarray, position: int, widths: np.ndarray) -> np.ndarray:
+    """Reads 16 indices per block with per pixel bit widths (shape (n, 16)) that follow each other from position."""
+    offsets = position + np.cumsum(widths, axis = 1) - widths
+    max_width = int(widths.max())
+    bit_positions = np.minimum(offsets[:, :, None] + np.arange(max_width), 127)
+    values = np.take_along_axis(bits, bit_positions.reshape(len(bits), -1), axis = 1).reshape(len(bits), 16, max_width)
+    values = values.astype(np.int32) * (np.arange(max_width) < widths[:, :, None])
+    return values @ (1 << np.arange(max_width, dtype = np.int32))
+
+def decode_bc7_mode(bits: np.ndarray, mode: int) -> np.ndarray:
+    subsets, partition_bits, rotation_bits, selection_bits, color_bits, alpha_bits, endpoint_pbits, shared_pbits, index_bits, index_bits2 = bc7_modes[mode]
+    n = len(bits)
+    position = mode + 1
+    partition = read_bits(bits, position, partition_bits)
+    position += partition_bits
+    rotation = read_bits(bits, position, rotation_bits)
+    position += rotation_bits
+    selection = read_bits(bits, position, selection_bits)
+    position += selection_bits
+
+    endpoints = np.zeros((n, subsets, 2, 4), dtype = np.int32)
+    for channel in range(4 if alpha_bits > 0 else 3):
+        width = color_bits if channel < 3 else alpha_bits
+        for s in range(subsets):
+            for e in range(2):
+                endpoints[:, s, e, channel] = read_bits(bits, position, width)
+                position += width
+    precision = np.array([color_bits] * 3 + [alpha_bits], dtype = np.int32)
+    if endpoint_pbits or shared_pbits:
+        pbits = np.zeros((n, subsets, 2), dtype = np.int32)
+        for s in range(subsets):
+            if shared_pbits:
+                pbits[:, s, :] = read_bits(bits, position, 1)[:, None]
+                position += 1
+            else:
+                for e in range(2):
+                    pbits[:, s, e] = read_bits(bits, position, 1)
+                    position += 1
+        endpoints = (endpoints << 1) | pbits[:, :, :, None]
+        precision = precision + 1
+    for channel in range(4):
+        if channel == 3 and alpha_bits == 0:
+            endpoints[:, :, :, 3] = 255
+        else:
+            endpoints[:, :, :, channel] = expand_bits(endpoints[:, :, :, channel], int(precision[channel]))
+
+    if subsets == 1:
+        pixel_subsets = np.zeros((n, 16), dtype = np.int32)
+        anchors = np.zeros((n, 16), dtype = bool)
+        anchors[:, 0] = True
+    elif subsets == 2:
+        pixel_subsets = (bc7_partitions2[partition][:, None] >> np.arange(16)) & 1
+        anchors = np.zeros((n, 16), dtype = bool)
+        anchors[:, 0] = True
+        anchors[np.arange(n), bc7_anchors2[partition]] = True
+    else:
+        pixel_subsets = bc7_partitions3[partition]
+        anchors = np.zeros((n, 16), dtype = bool)
+        anchors[:, 0] = True
+        anchors[np.arange(n), bc7_anchors3_second[partition]] = True
+        anchors[np.arange(n), bc7_anchors3_third[partition]] = True
+    indices = read_indices(bits, position, index_bits - anchors.astype(np.int32))
+    position += 16 * index_bits - subsets
+    color_weights = bc7_weights[index_bits][indices]
+    alpha_weights = color_weights
+    if index_bits2 > 0:
+        secondary_anchors = np.zeros((n, 16), dtype = np.int32)
+        secondary_anchors[:, 0] = 1
+        indices2 = read_indices(bits, position, index_bits2 - secondary_anchors)
+        secondary_weights = bc7_weights[index_bits2][indices2]
+        # the index selection bit (mode 4) swaps which index is used for the color
+        swap = (selection == 1)[:, None]
+        color_weights, alpha_weights = np.where(swap, secondary_weights, color_weights), np.where(swap, color_weights, secondary_weights)
+
+    pixel_endpoints = np.take_along_axis(endpoints, pixel_subsets[:, :, None, None], axis = 1)
+    e0 = pixel_endpoints[:, :, 0]
+    e1 = pixel_endpoints[:, :, 1]
+    weights = np.concatenate([np.repeat(color_weights[:, :, None], 3, axis = 2), alpha_weights[:, :, None]], axis = 2)
+    pixels = ((64 - weights) * e0 + weights * e1 + 32) >> 6
+    for r in range(1, 4):
+        rotated = rotation == r
+        if rotated.any():
+            pixels[rotated] = pixels[rotated][:, :, [3 if c == r - 1 else (r - 1 if c == 3 else c) for c in range(4)]]
+    return pixels
+
+def decode_bc7(blocks: np.ndarray, signed: bool) -> np.ndarray:
+    bits = np.unpackbits(blocks, axis = 1, bitorder = "little")
+    # the mode is the number of zero bits before the first set bit
+    modes = np.argmax(bits[:, :8], axis = 1)
+    modes[bits[:, :8].max(axis = 1) == 0] = 8
+    pixels = np.zeros((len(blocks), 16, 4), dtype = np.int32)
+    for mode in range(8):
+        selected = modes == mode
+        if selected.any():
+            pixels[selected] = decode_bc7_mode(bits[selected], mode)
+    return pixels
+
+block_decoders: Dict[str, Callable[[np.ndarray, bool], np.ndarray]] = {
+    "BC1": decode_bc1,
+    "BC2": decode_bc2,
+    "BC3": decode_bc3,
+    "BC4": decode_bc4,
+    "BC5": decode_bc5,
+    "BC7": decode_bc7,
+}
+
+
+def decode_masked(data: np.ndarray, width: int, height: int, bytes_per_pixel: int, masks: Tuple[int, int, int, int], luminance: bool) -> np.ndarray:
+    """Decodes uncompressed pixels described by bit masks (legacy DDS_PIXELFORMAT)."""
+    raw = data[:width * height * bytes_per_pixel].reshape(-1, bytes_per_pixel).astype(np.uint32)
+    values = np.zeros(len(raw), dtype = np.uint32)
+    for i in range(bytes_per_pixel):
+        values |= raw[:, i] << np.uint32(8 * i)
+    pixels = np.full((len(raw), 4), 255, dtype = np.int32)
+    for channel, mask in enumerate(masks):
+        if mask == 0:
+            continue
+        shift = (mask & -mask).bit_length() - 1
+        maximum = mask >> shift
+        pixels[:, channel] = ((values >> np.uint32(shift)) & np.uint32(maximum)).astype(np.int64) * 255 // maximum
+    if luminance:
+        pixels[:, 1] = pixels[:, 0]
+        pixels[:, 2] = pixels[:, 0]
+    return pixels.reshape(height, width, 4)
+
+def decode_uncompressed(data: np.ndarray, width: int, height: int, channel_order: str, bytes_per_pixel: int) -> np.ndarray:
+    raw = data[:width * height * bytes_per_pixel].reshape(height, width, bytes_per_pixel).astype(np.int32)
+    pixels = np.zeros((height, width, 4), dtype = np.int32)
+    pixels[:, :, 3] = 255
+    if channel_order == "R":
+        pixels[:, :, :3] = raw[:, :, :1]
+        return pixels
+    for i, channel in enumerate(channel_order):
+        if channel in "RGBA":
+            pixels[:, :, "RGBA".index(channel)] = raw[:, :, i]
+    return pixels
+
+
+class DdsFile:
+    """Header information of a .dds file, see decode_dds()."""
+    def __init__(self, data: np.ndarray, fullpath: Path):
+        if len(data) < dds_header_size or data[:4].tobytes() != dds_magic:
+            raise DdsFormatError(f"{fullpath} is not a .dds file")
+        header = data[:dds_header_size].tobytes()
+        self.height, self.width = struct.unpack_from("<2I", header, 12)
+        self.mip_count = max(1, struct.unpack_from("<I", header, 28)[0])
+        pixel_flags, fourcc, bit_count, r_mask, g_mask, b_mask, a_mask = struct.unpack_from("<I4s5I", header, 80)
+        self.data_offset = dds_header_size
+        self.block_format: Optional[Tuple[str, int, bool]] = None
+        self.uncompressed_format: Optional[Tuple[str, int]] = None
+        self.masks: Optional[Tuple[int, int, int, int]] = None
+        self.luminance = bool(pixel_flags & DDPF_LUMINANCE)
+        self.bytes_per_pixel = bit_count // 8
+        if pixel_flags & DDPF_FOURCC and fourcc == b"DX10":
+            dxgi_format = struct.unpack_from("<I", data[dds_header_size:dds_header_size + dx10_header_size].tobytes())[0]
+            self.data_offset += dx10_header_size
+            self.block_format = dxgi_formats.get(dxgi_format)
+            self.uncompressed_format = dxgi_uncompressed_formats.get(dxgi_format)
+            if self.block_format is None and self.uncompressed_format is None:
+                raise DdsFormatError(f"{fullpath}: unsupported DXGI format {dxgi_format}")
+        elif pixel_flags & DDPF_FOURCC:
+            self.block_format = fourcc_formats.get(fourcc)
+            if self.block_format is None:
+                raise DdsFormatError(f"{fullpath}: unsupported format {fourcc}")
+        elif pixel_flags & (DDPF_RGB | DDPF_LUMINANCE | DDPF_ALPHAPIXELS) and self.bytes_per_pixel in (1, 2, 3, 4):
+            self.masks = (r_mask, g_mask, b_mask, a_mask if pixel_flags & DDPF_ALPHAPIXELS else 0)
+        else:
+            raise DdsFormatError(f"{fullpath}: unsupported pixel format (flags {pixel_flags:#x})")
+
+    def mip_size(self, level: int) -> Tuple[int, int]:
+        return max(1, self.width >> level), max(1, self.height >> level)
+
+    def mip_bytes(self, level: int) -> int:
+        width, height = self.mip_size(level)
+        if self.block_format is not None:
+            return max(1, (width + 3) // 4) * max(1, (height + 3) // 4) * self.block_format[1]
+        if self.uncompressed_format is not None:
+            return width * height * self.uncompressed_format[1]
+        return width * height * self.bytes_per_pixel
+
+    def mip_offset(self, level: int) -> int:
+        return self.data_offset + sum(self.mip_bytes(i) for i in range(level))
+
+
+def decode_dds(fullpath: Path, mip_level: int = 0) -> np.ndarray:
+    """Decodes one mip level of a .dds file (the first array slice or cube face).
+
+    Args:
+        fullpath (Path): The .dds file.
+        mip_level (int, optional): Mip level, clamped to the available levels. Defaults to 0.
+
+    Returns:
+        np.ndarray: rgba bytes of shape (height, width, 4), the first row is the top of the image.
+    """
+    data = np.fromfile(fullpath, dtype = np.uint8)
+    dds = DdsFile(data, fullpath)
+    mip_level = min(max(0, mip_level), dds.mip_count - 1)
+    width, height = dds.mip_size(mip_level)
+    offset = dds.mip_offset(mip_level)
+    mip_data = data[offset:offset + dds.mip_bytes(mip_level)]
+    if len(mip_data) < dds.mip_bytes(mip_level):
+        raise DdsFormatError(f"{fullpath} is truncated")
+    if dds.block_format is not None:
+        name, block_size, signed = dds.block_format
+        blocks = mip_data.reshape(-1, block_size)
+        pixels = blocks_to_pixels(block_decoders[name](blocks, signed), width, height)
+    elif dds.uncompressed_format is not None:
+        pixels = decode_uncompressed(mip_data, width, height, *dds.uncompressed_format)
+    else:
+        pixels = decode_masked(mip_data, width, height, dds.bytes_per_pixel, dds.masks, dds.luminance)
+    return np.clip(pixels, 0, 255).astype(np.uint8)
+
+
+def write_png(fullpath: Path, pixels: np.ndarray):
+    """Writes rgba bytes of shape (height, width, 4) (first row at the top) as 8 bit RGBA .png file."""
+    height, width = pixels.shape[:2]
+    # filter type 0 (None) in front of every row
+    raw = np.zeros((height, width * 4 + 1), dtype = np.uint8)
+    raw[:, 1:] = pixels.reshape(height, width * 4)
+    def chunk(tag: bytes, payload: bytes) -> bytes:
+        return struct.pack(">I", len(payload)) + tag + payload + struct.pack(">I", zlib.crc32(tag + payload) & 0xffffffff)
+    png = b"\x89PNG\r\n\x1a\n"
+    png += chunk(b"IHDR", struct.pack(">2I5B", width, height, 8, 6, 0, 0, 0))
+    png += chunk(b"IDAT", zlib.compress(raw.tobytes(), 6))
+    png += chunk(b"IEND", b"")
+    tmp_path = fullpath.with_suffix(".tmp")
+    tmp_path.write_bytes(png)
+    tmp_path.replace(fullpath)
+
+def convert_dds_to_png_directly(fullpath: Path, output_dir: Path) -> bool:
+    """Decodes the .dds file and writes it as .png to output_dir, like texconv would. Does not access blender data,
+    so it can run on a worker thread.
+
+    Returns:
+        bool: False if the format is not supported.
+    """
+    try:
+        pixels = decode_dds(fullpath)
+    except (DdsFormatError, OSError, ValueError) as ex:
+        print(f"Decoding {fullpath} failed: {ex}")
+        return False
+    write_png(Path(output_dir, fullpath.stem + ".png"), pixels)
+    return True
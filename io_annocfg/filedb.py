@@ -0,0 +1,264 @@
+from __future__ import annotations
+import mmap
+import re
+import struct
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .utils import sanitize_xml_text
+
+
+class FileDBFormatError(Exception):
+    """Raised when a file cannot be decoded by the built-in reader. Use FileDBReader instead."""
+
+
+# FileDB documents end with the offsets of the tag and attribute name dictionaries, followed by these magic bytes.
+filedb_magic = {
+    b"\x08\x00\x00\x00\xfe\xff\xff\xff": 2,
+    b"\x08\x00\x00\x00\xfd\xff\xff\xff": 3,
+}
+min_attribute_id = 0x8000
+attribute_block_size = 8
+
+
+def to_text(value_type: str, content: bytes) -> str:
+    """Converts attribute content to text like the FileDBReader interpreter does. Lists are space separated."""
+    if value_type == "String":
+        return content.rstrip(b"\x00").decode("utf-8", errors = "replace")
+    if value_type == "UnicodeString":
+        return content.decode("utf-16-le", errors = "replace").rstrip("\x00")
+    if value_type == "Bool":
+        return " ".join("True" if b else "False" for b in content)
+    dtype = {"Int32": "<i4", "UInt32": "<u4", "Int16": "<i2", "UInt16": "<u2", "Int64": "<i8", "Byte": "u1", "Float32": "<f4", "Float64": "<f8"}[value_type]
+    values = np.frombuffer(content[:len(content) - len(content) % np.dtype(dtype).itemsize], dtype = dtype)
+    if values.dtype.kind == "f":
+        #numpy prints the shortest text that reads back as the same float32
+        return " ".join(str(v) for v in values)
+    return " ".join(str(v) for v in values.tolist())
+
+
+class FileDBInterpreter:
+    """Maps element paths of a FileDB document to value types, everything else stays hex (like FileDBReader without interpreter).
+
+    Paths are relative to the document root and use "None" for list entries, f.e. "PropGrid/Instances/None/Position".
+    """
+    def __init__(self, types: Dict[str, str]):
+        self.types = types
+
+    def convert(self, path: str, content: bytes) -> str:
+        value_type = self.types.get(path)
+        if value_type is not None:
+            try:
+                return to_text(value_type, content)
+            except (ValueError, UnicodeDecodeError):
+                pass
+        return content.hex().upper()
+
+
+# The fields of island files (rd3d.data) that IslandFile reads.
+island_interpreter = FileDBInterpreter({
+    "PropGrid/FileNames/None": "String",
+    "PropGrid/Instances/None/Index": "Int32",
+    "PropGrid/Instances/None/Position": "Float32",
+    "PropGrid/Instances/None/Rotation": "Float32",
+    "PropGrid/Instances/None/Scale": "Float32",
+    "PropGrid/Instances/None/Color": "Float32",
+    "PropGrid/Instances/None/AdaptTerrainHeight": "Bool",
+    "Terrain/GridWidth": "Int32",
+    "Terrain/GridHeight": "Int32",
+    "Terrain/UnitScale": "Float32",
+    "Terrain/MinMeshLevel": "Int32",
+    "Terrain/CoarseHeightMap/width": "Int32",
+    "Terrain/CoarseHeightMap/height": "Int32",
+    "Terrain/CoarseHeightMap/map": "UInt16",
+})
+
+
+def read_name_dictionary(data, offset: int, end: int) -> Dict[int, str]:
+    """Reads a tag or attribute name dictionary: count, the ids (uint16) and then the null terminated names."""
+    if offset < 0 or offset + 4 > end:
+        raise FileDBFormatError("Invalid dictionary offset")
+    count = struct.unpack_from("<i", data, offset)[0]
+    position = offset + 4
+    if count < 0 or position + 2 * count > end:
+        raise FileDBFormatError("Invalid dictionary size")
+    ids = struct.unpack_from(f"<{count}H", data, position)
+    position += 2 * count
+    names = {}
+    for element_id in ids:
+        terminator = data.find(b"\x00", position, end)
+        if terminator == -1:
+            raise FileDBFormatError("Unterminated name in dictionary")
+        name = bytes(data[position:terminator]).decode("utf-8")
+        if not re.fullmatch(r"[A-Za-z_][\w.\-]*", name):
+            raise FileDBFormatError(f"Invalid element name {name!r}")
+        names[element_id] = name
+        position = terminator + 1
+    return names
+
+def read_filedb_data(data, interpreter: Optional[FileDBInterpreter] = None) -> ET.Element:
+    """Decodes a FileDB (version 2 or 3) document into an element tree with a <Content> root.
+
+    Args:
+        data: Bytes, or a memory map of the file.
+        interpreter (FileDBInterpreter, optional): Converts attribute values to text, unknown ones are written as hex.
+
+    Returns:
+        ET.Element: The root.
+    """
+    size = len(data)
+    if size < 16 or bytes(data[size - 8:]) not in filedb_magic:
+        raise FileDBFormatError("Not a FileDB document (version 2 or 3)")
+    tags_offset, attributes_offset = struct.unpack_from("<2i", data, size - 16)
+    tag_names = read_name_dictionary(data, tags_offset, size - 16)
+    attribute_names = read_name_dictionary(data, attributes_offset, size - 16)
+    data_end = min(tags_offset, attributes_offset)
+
+    root = ET.Element("Content")
+    stack: List[Tuple[ET.Element, str]] = [(root, "")]
+    position = 0
+    while position + 8 <= data_end:
+        content_size, element_id = struct.unpack_from("<2i", data, position)
+        position += 8
+        if element_id <= 0:
+            if len(stack) == 1:
+                break
+            stack.pop()
+            continue
+        parent, parent_path = stack[-1]
+        if element_id < min_attribute_id:
+            name = tag_names.get(element_id)
+            if name is None:
+                raise FileDBFormatError(f"Unknown tag id {element_id} at {position - 8}")
+            element = ET.SubElement(parent, name)
+            stack.append((element, f"{parent_path}/{name}" if parent_path else name))
+            continue
+        name = attribute_names.get(element_id)
+        if name is None:
+            raise FileDBFormatError(f"Unknown attribute id {element_id} at {position - 8}")
+        if content_size < 0 or position + content_size > data_end:
+            raise FileDBFormatError(f"Invalid size of attribute {name} at {position - 8}")
+        content = bytes(data[position:position + content_size])
+        position += -(-content_size // attribute_block_size) * attribute_block_size
+        path = f"{parent_path}/{name}" if parent_path else name
+        ET.SubElement(parent, name).text = interpreter.convert(path, content) if interpreter is not None else content.hex().upper()
+    if len(stack) > 1:
+        raise FileDBFormatError("Unexpected end of the document")
+    return root
+
+def read_filedb(fullpath: Path, interpreter: Optional[FileDBInterpreter] = None) -> ET.Element:
+    """Decodes a FileDB file (f.e. the rd3d.data of an island) without writing an .xml file.
+    The file is memory mapped, so large islands are not copied into memory as a whole.
+    """
+    with open(fullpath, "rb") as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+        except ValueError:
+            raise FileDBFormatError(f"{fullpath} is empty")
+        with data:
+            return read_filedb_data(data, interpreter)
+
+
+cdata_marker = b"CDATA["
+
+def cdata_to_hex(content: bytes) -> str:
+    return content.hex().upper()
+
+def cdata_to_cf7(content: bytes) -> str:
+    """Writes a binary value like AnnoFCConverter does in .cf7 files: the size in bytes followed by the int32 values, f.e. "12 -1 -1 -1"."""
+    if len(content) % 4 != 0:
+        raise FileDBFormatError(f"CDATA value of {len(content)} bytes is not a list of int32 values")
+    return " ".join(str(v) for v in [len(content)] + np.frombuffer(content, dtype = "<i4").tolist())
+
+def decode_fc_text(data: bytes, cdata_format: Callable[[bytes], str] = cdata_to_hex) -> str:
+    """Turns a file of the feedback container format (xml text with binary CDATA[<int32 size><bytes>] values, used by .fc and .prp files)
+    into plain xml text, with the binary values written as CDATA[<cdata_format(bytes)>] (hex by default).
+    """
+    parts = []
+    position = 0
+    while True:
+        start = data.find(cdata_marker, position)
+        if start == -1:
+            parts.append(data[position:].decode("utf-8"))
+            break
+        parts.append(data[position:start].decode("utf-8"))
+        content_start = start + len(cdata_marker) + 4
+        if content_start > len(data):
+            raise FileDBFormatError("Truncated CDATA value")
+        content_size = struct.unpack_from("<i", data, start + len(cdata_marker))[0]
+        content_end = content_start + content_size
+        if content_size < 0 or content_end >= len(data) or data[content_end:content_end + 1] != b"]":
+            raise FileDBFormatError(f"Invalid CDATA value at {start}")
+        parts.append("CDATA[" + cdata_format(data[content_start:content_end]) + "]")
+        position = content_end + 1
+    return "".join(parts)
+
+cf7_cdata_pattern = re.compile(r"CDATA\[([^\]]*)\]")
+
+def cf7_value_to_cdata(match: re.Match) -> bytes:
+    """Packs a CDATA[<size> <values>] value of a .cf7 file. Values with a decimal point are written as float32, all others as int32."""
+    tokens = match.group(1).split()
+    try:
+        size = int(tokens[0])
+        content = b"".join(struct.pack("<f", float(v)) if "." in v or "e" in v.lower() else struct.pack("<i", int(v)) for v in tokens[1:])
+    except (IndexError, ValueError, struct.error):
+        raise FileDBFormatError(f"Invalid CDATA value {match.group(0)!r}")
+    if size != len(content):
+        raise FileDBFormatError(f"CDATA value {match.group(0)!r} announces {size} bytes but has {len(content)}")
+    return cdata_marker + struct.pack("<i", size) + content + b"]"
+
+def encode_cf7_text(text: str) -> bytes:
+    """The inverse of decode_fc_text with cdata_to_cf7: Turns the text of a .cf7 file into the content of an .fc file."""
+    parts = []
+    position = 0
+    for match in cf7_cdata_pattern.finditer(text):
+        parts.append(text[position:match.start()].encode("utf-8"))
+        parts.append(cf7_value_to_cdata(match))
+        position = match.end()
+    parts.append(text[position:].encode("utf-8"))
+    return b"".join(parts)
+
+def cf7_to_text(cf7root: ET.Element) -> str:
+    """Writes a cf7_imaginary_root element as .cf7 text, without the imaginary root."""
+    cf7tree = ET.ElementTree(cf7root)
+    ET.indent(cf7tree, space="\t", level=0)
+    cf7tree_string = ET.tostring(cf7root, encoding='unicode', method='xml')
+    return cf7tree_string.replace("</cf7_imaginary_root>", "").replace("<cf7_imaginary_root>","").rstrip("\n")
+
+def read_fc_as_cf7(fullpath: Path) -> ET.Element:
+    """Decodes an .fc file into the element tree of its .cf7 representation, without AnnoFCConverter.
+
+    Returns:
+        ET.Element: The cf7_imaginary_root element that wraps the top level nodes of the file.
+    """
+    data = fullpath.read_bytes()
+    if not data.lstrip().startswith(b"<"):
+        raise FileDBFormatError(f"{fullpath} is not a feedback container file")
+    try:
+        return ET.fromstring("<cf7_imaginary_root>" + decode_fc_text(data, cdata_to_cf7) + "</cf7_imaginary_root>")
+    except (UnicodeDecodeError, ET.ParseError) as ex:
+        raise FileDBFormatError(f"{fullpath}: {ex}")
+
+def write_fc_from_cf7(cf7root: ET.Element, fullpath: Path):
+    """Writes a cf7_imaginary_root element as .fc file, without AnnoFCConverter. Nothing is written if a value cannot be encoded."""
+    data = encode_cf7_text(cf7_to_text(cf7root).lstrip())
+    with open(fullpath, "wb") as f:
+        f.write(data)
+
+def read_fc(fullpath: Path) -> ET.Element:
+    """Decodes a .prp (or .fc) file like FileDBReader fctohex, without writing an .xml file.
+
+    Returns:
+        ET.Element: The root of the decoded file.
+    """
+    data = fullpath.read_bytes()
+    if not data.lstrip().startswith(b"<"):
+        raise FileDBFormatError(f"{fullpath} is not a feedback container file")
+    try:
+        text = decode_fc_text(data)
+        return ET.fromstring("<Content>" + sanitize_xml_text(text) + "</Content>")
+    except (UnicodeDecodeError, ET.ParseError) as ex:
+        raise FileDBFormatError(f"{fullpath}: {ex}")
@@ -0,0 +1,354 @@
+from __future__ import annotations
+import bpy
+from bpy.types import Object as BlenderObject
+import json
+import subprocess
+import time
+import xml.etree.ElementTree as ET
+from pathlib import Path, PurePath
+from typing import Dict, List, Optional, Set, TextIO, Tuple, Union
+
+from .anno_objects import Prop, SubFile
+from .utils import to_data_path
+
+
+def add_asset_tags(asset: Union[BlenderObject, bpy.types.Collection], data_path: str):
+    for directory in PurePath(data_path).parts[:-1]:
+        if directory not in ["graphics", "data"]:
+            asset.asset_data.tags.new(directory)
+
+def add_to_collection_recursively(obj: BlenderObject, collection: bpy.types.Collection):
+    collection.objects.link(obj)
+    for child in obj.children:
+        add_to_collection_recursively(child, collection)
+
+def import_prop_asset(prop_file: Path) -> Optional[BlenderObject]:
+    """Imports the .prp file as an asset marked object.
+
+    Args:
+        prop_file (Path): Absolute path of the .prp file.
+
+    Returns:
+        Optional[BlenderObject]: The asset or None if the prop cannot be loaded as a 3d object.
+    """
+    data_path = to_data_path(prop_file).as_posix()
+    node = ET.fromstring(f"""
+        <Config>
+            <ConfigType>PROP</ConfigType>
+            <FileName>{data_path}</FileName>
+            <Name>PROP_{prop_file.stem}</Name>
+            <Flags>1</Flags>
+        </Config>
+    """)
+    try:
+        blender_obj = Prop.xml_to_blender(node)
+    except Exception as ex:
+        print(f"Failed to import {data_path}: {ex}")
+        return None
+    if blender_obj is None:
+        return None
+    if blender_obj.type == "EMPTY":
+        bpy.data.objects.remove(blender_obj)
+        return None
+    blender_obj.name = prop_file.name
+    blender_obj.asset_mark()
+    blender_obj.asset_data.description = data_path
+    add_asset_tags(blender_obj, data_path)
+    return blender_obj
+
+def import_cfg_asset(cfg_file: Path, parent_collection: bpy.types.Collection) -> Optional[bpy.types.Collection]:
+    """Imports the .cfg file into a new asset marked collection.
+
+    Args:
+        cfg_file (Path): Absolute path of the .cfg file.
+        parent_collection (bpy.types.Collection): The new collection is linked to this one.
+
+    Returns:
+        Optional[bpy.types.Collection]: The asset or None if the import failed.
+    """
+    data_path = to_data_path(cfg_file).as_posix()
+    node = ET.fromstring(f"""
+        <Config>
+            <ConfigType>FILE</ConfigType>
+            <FileName>{data_path}</FileName>
+            <AdaptTerrainHeight>1</AdaptTerrainHeight>
+        </Config>
+    """)
+    try:
+        blender_obj = SubFile.xml_to_blender(node)
+    except Exception as ex:
+        print(f"Failed to import {data_path}: {ex}")
+        return None
+    collection = bpy.data.collections.new(name=cfg_file.name)
+    parent_collection.children.link(collection)
+    add_to_collection_recursively(blender_obj, collection)
+
+    collection.asset_mark()
+    collection.asset_data.tags.new("cfg")
+    collection.asset_data.description = data_path
+    add_asset_tags(collection, data_path)
+    return collection
+
+def collect_asset_files(asset_type: str, source_dir: Path) -> List[Path]:
+    """Returns all .cfg (asset_type "CFG") or .prp (asset_type "PROP") files in source_dir and its subfolders."""
+    files = []
+    for p in sorted(source_dir.rglob("*.cfg" if asset_type == "CFG" else "*.prp")):
+        # decal_details cannot be loaded as a 3d object anyway
+        if asset_type == "PROP" and "decal_detail" in p.name:
+            continue
+        files.append(p)
+    return files
+
+
+class AssetLibraryBuild:
+    """Imports all .cfg or .prp files of a folder as assets, split between several headless blender processes.
+
+    The build folder contains
+    - jobs/: One json file per worker, with the files it has to import and the addon settings.
+    - parts/: The workers write their assets to a new .blend file after every batch_size files.
+    - progress/: One .jsonl file per worker, with a line for every finished file (asset name or null and the part file).
+      A line is only written after its part file, so a rerun after a crash or cancel skips exactly the saved files.
+    - logs/: Console output of the workers.
+    - index.json: Written by the merge step, maps the data path of every asset to its name and part file.
+    The merge step appends all assets from the parts that are not in the current file yet and generates their previews.
+    """
+    batch_size = 25
+    worker_script = Path(__file__).with_name("library_build_worker.py")
+
+    def __init__(self, asset_type: str, source_dir: Path, build_dir: Path):
+        self.asset_type = asset_type
+        self.source_dir = source_dir
+        self.build_dir = build_dir
+        self.processes: List[Tuple[subprocess.Popen, TextIO]] = []
+        self.total = 0
+
+    def load_progress(self) -> Dict[str, Dict]:
+        """Reads all progress files.
+
+        Returns:
+            Dict[str, Dict]: Progress records by data path.
+        """
+        records = {}
+        for progress_file in sorted(Path(self.build_dir, "progress").glob("*.jsonl")):
+            with open(progress_file, "r", encoding = "utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        #last line of a crashed worker
+                        continue
+                    records[record["file"]] = record
+        return records
+
+    def get_settings(self) -> Dict:
+        prefs = bpy.context.preferences.addons[__package__].preferences
+        settings = {}
+        for prop in prefs.bl_rna.properties:
+            if prop.identifier in ("rna_type", "bl_idname") or prop.is_readonly:
+                continue
+            value = getattr(prefs, prop.identifier)
+            if prop.type == 'STRING' and prop.subtype in ('FILE_PATH', 'DIR_PATH'):
+                #the workers have no .blend file that relative paths could refer to
+                value = bpy.path.abspath(value)
+            settings[prop.identifier] = value
+        return settings
+
+    def write_jobs(self, files: List[Path], worker_count: int) -> List[Path]:
+        run_id = time.strftime("%Y%m%d_%H%M%S")
+        job_dir = Path(self.build_dir, "jobs")
+        job_dir.mkdir(parents = True, exist_ok = True)
+        for folder in ["parts", "progress", "logs"]:
+            Path(self.build_dir, folder).mkdir(exist_ok = True)
+        settings = self.get_settings()
+        job_paths = []
+        for shard in range(min(worker_count, len(files))):
+            name = f"{run_id}_{shard:02d}"
+            job = {
+                "package": __package__,
+                "name": name,
+                "asset_type": self.asset_type,
+                # every n-th file, so that all workers get a similar mix of small and large folders
+                "files": [str(p) for p in files[shard::worker_count]],
+                "build_dir": str(self.build_dir),
+                "batch_size": self.batch_size,
+                "settings": settings,
+                "anno_mod_folder": bpy.context.scene.anno_mod_folder,
+            }
+            job_path = Path(job_dir, name + ".json")
+            with open(job_path, "w", encoding = "utf-8") as f:
+                json.dump(job, f)
+            job_paths.append(job_path)
+        return job_paths
+
+    def start_workers(self, job_paths: List[Path]):
+        """Starts one background blender process per job, see poll_workers()."""
+        for job_path in job_paths:
+            log = open(Path(self.build_dir, "logs", job_path.stem + ".log"), "w", encoding = "utf-8")
+            args = [bpy.app.binary_path, "-b", "--python", str(self.worker_script), "--", str(job_path)]
+            self.processes.append((subprocess.Popen(args, stdout = log, stderr = subprocess.STDOUT), log))
+
+    def poll_workers(self) -> bool:
+        """Prints the progress of the workers.
+
+        Returns:
+            bool: True while any worker is still running.
+        """
+        print(f"Asset library build: {len(self.load_progress())}/{self.total} files done")
+        return any(process.poll() is None for process, _ in self.processes)
+
+    def finish_workers(self) -> int:
+        """Closes the logs of the finished workers.
+
+        Returns:
+            int: Number of workers that did not finish successfully.
+        """
+        failed = 0
+        for process, log in self.processes:
+            log.close()
+            if process.wait() != 0:
+                failed += 1
+        self.processes = []
+        return failed
+
+    def terminate_workers(self):
+        """Stops all running workers. Their finished batches are kept, see load_progress()."""
+        for process, _ in self.processes:
+            if process.poll() is None:
+                process.terminate()
+        for process, _ in self.processes:
+            try:
+                process.wait(timeout = 10.0)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        self.finish_workers()
+
+    def merge(self) -> int:
+        """Appends all assets from the part files that are not in the current file yet.
+
+        Returns:
+            int: Number of appended assets.
+        """
+        records = self.load_progress()
+        if self.asset_type == "CFG":
+            existing_ids = bpy.data.collections
+        else:
+            existing_ids = bpy.data.objects
+        existing = {asset.asset_data.description for asset in existing_ids if asset.asset_data is not None}
+        names_by_part: Dict[str, Set[str]] = {}
+        for data_path, record in records.items():
+            if record["asset"] is not None and data_path not in existing:
+                names_by_part.setdefault(record["part"], set()).add(record["asset"])
+
+        scene_collection = bpy.context.scene.collection
+        y_loc = len([obj for obj in bpy.data.objects if obj.asset_data is not None])
+        count = 0
+        for part, names in sorted(names_by_part.items()):
+            part_path = Path(self.build_dir, "parts", part)
+            if not part_path.exists():
+                print(f"Warning: Missing part file {part_path}")
+                continue
+            with bpy.data.libraries.load(str(part_path)) as (data_from, data_to):
+                if self.asset_type == "CFG":
+                    data_to.collections = [name for name in data_from.collections if name in names]
+                else:
+                    data_to.objects = [name for name in data_from.objects if name in names]
+            if self.asset_type == "CFG":
+                for collection in data_to.collections:
+                    scene_collection.children.link(collection)
+                    collection.asset_generate_preview()
+                    count += 1
+            else:
+                for obj in data_to.objects:
+                    scene_collection.objects.link(obj)
+                    obj.location.y = y_loc
+                    y_loc += 1
+                    obj.asset_generate_preview()
+                    count += 1
+        self.write_index(records)
+        return count
+
+    def write_index(self, records: Dict[str, Dict]):
+        index = {data_path: {"asset": record["asset"], "part": record["part"]} for data_path, record in records.items()}
+        with open(Path(self.build_dir, "index.json"), "w", encoding = "utf-8") as f:
+            json.dump(index, f, indent = 1)
+
+    def start(self, worker_count: int) -> bool:
+        """Starts the workers for all files that are not in the build folder yet.
+        Poll them with poll_workers() and call finish() once they are done.
+
+        Returns:
+            bool: False if there is nothing left to import.
+        """
+        files = collect_asset_files(self.asset_type, self.source_dir)
+        finished = self.load_progress()
+        pending = [p for p in files if to_data_path(p).as_posix() not in finished]
+        print(f"Asset library build: {len(files) - len(pending)} of {len(files)} files already done")
+        self.total = len(files)
+        if not pending:
+            return False
+        self.start_workers(self.write_jobs(pending, worker_count))
+        return True
+
+    def finish(self) -> Optional[int]:
+        """Merges the assets into the current file once all workers are done.
+
+        Returns:
+            Optional[int]: Number of appended assets or None if a worker failed.
+        """
+        if self.finish_workers() > 0:
+            return None
+        return self.merge()
+
+
+def apply_job_settings(job: Dict):
+    prefs = bpy.context.preferences.addons[job["package"]].preferences
+    for key, value in job["settings"].items():
+        try:
+            setattr(prefs, key, value)
+        except (AttributeError, TypeError, ValueError) as ex:
+            print(f"Warning: Cannot apply setting {key}: {ex}")
+    bpy.context.scene.anno_mod_folder = job["anno_mod_folder"]
+
+def run_worker(job_path: Path):
+    """Imports the files of one job of an AssetLibraryBuild. Runs in a background blender process, see library_build_worker.py."""
+    with open(job_path, "r", encoding = "utf-8") as f:
+        job = json.load(f)
+    apply_job_settings(job)
+    build_dir = Path(job["build_dir"])
+    progress_path = Path(build_dir, "progress", job["name"] + ".jsonl")
+    scene_collection = bpy.context.scene.collection
+
+    batch_index = 0
+    batch: List[Dict] = []
+    batch_ids: Set[bpy.types.ID] = set()
+
+    def write_batch():
+        nonlocal batch_index, batch, batch_ids
+        part = f"{job['name']}_{batch_index:04d}.blend"
+        if batch_ids:
+            bpy.data.libraries.write(str(Path(build_dir, "parts", part)), batch_ids, fake_user=True)
+        with open(progress_path, "a", encoding = "utf-8") as f:
+            for record in batch:
+                record["part"] = part
+                f.write(json.dumps(record) + "\n")
+        batch_index += 1
+        batch = []
+        batch_ids = set()
+
+    for i, file in enumerate(job["files"]):
+        p = Path(file)
+        print(i, p)
+        if job["asset_type"] == "CFG":
+            asset = import_cfg_asset(p, scene_collection)
+            if asset is not None:
+                batch_ids.add(asset)
+                batch_ids.update(asset.all_objects)
+        else:
+            asset = import_prop_asset(p)
+            if asset is not None:
+                batch_ids.add(asset)
+        batch.append({"file": to_data_path(p).as_posix(), "asset": asset.name if asset is not None else None})
+        if len(batch) >= job["batch_size"]:
+            write_batch()
+    if batch:
+        write_batch()
@@ -0,0 +1,23 @@
+"""Entry point of the background blender processes of an asset library build (see library_build.AssetLibraryBuild).
+
+Usage: blender -b --python library_build_worker.py -- <job.json>
+Runs as a plain script, therefore it imports the addon by the package name stored in the job.
+"""
+import importlib
+import json
+import sys
+from pathlib import Path
+
+import addon_utils
+import bpy
+
+job_path = Path(sys.argv[sys.argv.index("--") + 1])
+with open(job_path, "r", encoding = "utf-8") as f:
+    package = json.load(f)["package"]
+if package not in bpy.context.preferences.addons:
+    addon_utils.enable(package, default_set = True)
+try:
+    importlib.import_module(package + ".library_build").run_worker(job_path)
+except Exception as ex:
+    print(f"Asset library worker failed: {ex}")
+    sys.exit(1)
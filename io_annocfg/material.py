@@ -11,8 +11,10 @@ import subprocess
 from collections import defaultdict
 from .prefs import IO_AnnocfgPreferences
 from .utils import *
+from .cfg_cache import DependencyRecorder
 
 from .shaders import default_shader as SHADER
+from .shaders.shader_components import convert_dds_to_png, load_texture, image_to_data_path, request_textures, texture_dds_path
 
 
 class Material:
@@ -118,8 +120,7 @@ class Material:
                 instance.textures[texture_name] = ""
                 instance.texture_enabled[texture_name] = shader_node.anno_properties.enabled
                 continue
-            filepath_full = os.path.realpath(bpy.path.abspath(shader_node.image.filepath, library=shader_node.image.library))
-            texture_path = to_data_path(filepath_full)
+            texture_path = image_to_data_path(shader_node.image)
             #Rename "data/.../some_diff_0.png" to "data/.../some_diff.psd"
             extension = shader_node.anno_properties.original_file_extension
             texture_path = Path(texture_path.as_posix().replace(instance.texture_quality_suffix()+".", ".")).with_suffix(extension)
@@ -178,15 +179,7 @@ class Material:
         Returns:
             bool: Successful
         """
-        if not IO_AnnocfgPreferences.get_path_to_texconv().exists():
-            return False
-        if not fullpath.exists():
-            return False
-        try:
-            subprocess.call(f"\"{IO_AnnocfgPreferences.get_path_to_texconv()}\" -ft PNG -sepalpha -y -o \"{fullpath.parent}\" \"{fullpath}\"")
-        except:
-            return False
-        return fullpath.with_suffix(".png").exists()
+        return convert_dds_to_png(fullpath) is not None
     
     def get_texture(self, texture_path: Path):
         """Tries to find the texture texture_path with ending "_0.png" (quality setting can be changed) in the list of loaded textures.
@@ -198,25 +191,7 @@ class Material:
         Returns:
             [type]: The texture or None.
         """
-        if texture_path == Path(""):
-            return None
-        texture_path = Path(texture_path)
-        texture_path = Path(texture_path.parent, texture_path.stem + self.texture_quality_suffix()+".dds")
-        png_file = texture_path.with_suffix(".png")
-        fullpath = data_path_to_absolute_path(texture_path)
-        png_fullpath = data_path_to_absolute_path(png_file)
-        image = bpy.data.images.get(str(png_file.name), None)
-        if image is not None:
-            image_path_full = os.path.normpath(bpy.path.abspath(image.filepath, library=image.library))
-            if str(image_path_full) == str(png_fullpath):
-                return image
-        if not png_fullpath.exists():
-            success = self.convert_to_png(fullpath)
-            if not success:
-                print("Failed to convert texture", fullpath)
-                return None
-        image = bpy.data.images.load(str(png_fullpath))
-        return image
+        return load_texture(texture_path)
 
     
 
@@ -236,8 +211,16 @@ class Material:
     def as_blender_material(self):
 
         if self.get_material_cache_key() in Material.materialCache:
+            DependencyRecorder.replay(("material", self.get_material_cache_key()))
             return Material.materialCache[self.get_material_cache_key()]
         
+        with DependencyRecorder() as recorder:
+            material = self.create_blender_material()
+        DependencyRecorder.remember(("material", self.get_material_cache_key()), recorder.dependencies)
+        Material.materialCache[self.get_material_cache_key()] = material
+        return material
+
+    def create_blender_material(self):
         material = bpy.data.materials.new(name=self.name)
         
         material.dynamic_properties.from_node(self.node)
@@ -246,7 +229,7 @@ class Material:
         positioning_unit = (300, 300)
         positioning_offset = (0, 3 * positioning_unit[1])
         
-        
+        request_textures([texture_dds_path(path) for path in self.textures.values() if path != ""])
         for i, texture_name in enumerate(self.texture_definitions.keys()):
             texture_node = material.node_tree.nodes.new('ShaderNodeTexImage')
             texture_path = Path(self.textures[texture_name])
@@ -321,8 +304,6 @@ class Material:
         for prop, value in self.custom_properties.items():
             material[prop] = value
 
-
-        Material.materialCache[self.get_material_cache_key()] = material
         return material
     
     def add_shader_node_to_material(self, material, node_type, **kwargs):
@@ -0,0 +1,131 @@
+from __future__ import annotations
+import bpy
+from bpy.types import Object as BlenderObject
+import zipfile
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+
+from .cfg_cache import file_stamp
+from .conversion_cache import find_converted_file, get_output_dir, register_converted_file
+
+
+mesh_cache_suffix = ".npz"
+mesh_cache_version = 2
+
+
+def is_cacheable(obj: BlenderObject) -> bool:
+    """Only plain meshes are cached. Skinned or parented results of the glTF import keep using the importer."""
+    return obj is not None and obj.type == 'MESH' and obj.parent is None and not obj.children \
+        and not obj.modifiers and not obj.vertex_groups and obj.data.shape_keys is None
+
+def get_array(collection, attribute: str, dtype, width: int = 1) -> np.ndarray:
+    values = np.empty(len(collection) * width, dtype = dtype)
+    collection.foreach_get(attribute, values)
+    return values.reshape(-1, width) if width > 1 else values
+
+def mesh_to_arrays(obj: BlenderObject) -> Dict[str, np.ndarray]:
+    """Reads everything the import needs from a mesh object with foreach_get."""
+    mesh = obj.data
+    arrays = {
+        "version": np.array(mesh_cache_version),
+        "object_name": np.array(obj.name),
+        "matrix": np.array(obj.matrix_basis, dtype = np.float32),
+        "positions": get_array(mesh.vertices, "co", np.float32, 3),
+        "loop_vertices": get_array(mesh.loops, "vertex_index", np.int32),
+        "loop_starts": get_array(mesh.polygons, "loop_start", np.int32),
+        "material_indices": get_array(mesh.polygons, "material_index", np.int32),
+        "smooth": get_array(mesh.polygons, "use_smooth", bool),
+        "material_names": np.array([m.name if m is not None else "" for m in mesh.materials], dtype = str),
+        "uv_names": np.array([layer.name for layer in mesh.uv_layers], dtype = str),
+        "color_names": np.array([c.name for c in mesh.color_attributes], dtype = str),
+        "color_types": np.array([f"{c.data_type}:{c.domain}" for c in mesh.color_attributes], dtype = str),
+    }
+    if mesh.has_custom_normals:
+        arrays["corner_normals"] = get_array(mesh.corner_normals, "vector", np.float32, 3)
+    for i, layer in enumerate(mesh.uv_layers):
+        arrays[f"uv_{i}"] = get_array(layer.data, "uv", np.float32, 2)
+    for i, colors in enumerate(mesh.color_attributes):
+        arrays[f"color_{i}"] = get_array(colors.data, "color", np.float32, 4)
+    return arrays
+
+def arrays_to_object(arrays: Dict[str, np.ndarray], geometry_only: bool = False) -> BlenderObject:
+    """Builds the mesh object again with foreach_set and links it to the scene like the glTF import does.
+    With geometry_only, the material slots stay empty instead of getting placeholder materials.
+    """
+    name = str(arrays["object_name"])
+    loop_vertices = arrays["loop_vertices"]
+    loop_starts = arrays["loop_starts"]
+
+    mesh = bpy.data.meshes.new(name)
+    mesh.vertices.add(len(arrays["positions"]))
+    mesh.vertices.foreach_set("co", arrays["positions"].ravel())
+    mesh.loops.add(len(loop_vertices))
+    mesh.loops.foreach_set("vertex_index", loop_vertices)
+    mesh.polygons.add(len(loop_starts))
+    mesh.polygons.foreach_set("loop_start", loop_starts)
+    mesh.polygons.foreach_set("material_index", arrays["material_indices"])
+    mesh.polygons.foreach_set("use_smooth", arrays["smooth"])
+    for i, uv_name in enumerate(arrays["uv_names"]):
+        mesh.uv_layers.new(name = str(uv_name)).data.foreach_set("uv", arrays[f"uv_{i}"].ravel())
+    for i, (color_name, color_type) in enumerate(zip(arrays["color_names"], arrays["color_types"])):
+        data_type, domain = str(color_type).split(":")
+        mesh.color_attributes.new(str(color_name), data_type, domain).data.foreach_set("color", arrays[f"color_{i}"].ravel())
+    for material_name in arrays["material_names"]:
+        mesh.materials.append(bpy.data.materials.new(name = str(material_name)) if material_name and not geometry_only else None)
+    mesh.update(calc_edges = True)
+    if "corner_normals" in arrays:
+        mesh.normals_split_custom_set(arrays["corner_normals"])
+
+    obj = bpy.data.objects.new(name, mesh)
+    obj.matrix_basis = arrays["matrix"].tolist()
+    bpy.context.scene.collection.objects.link(obj)
+    for selected in bpy.context.selected_objects:
+        selected.select_set(False)
+    obj.select_set(True)
+    bpy.context.view_layer.objects.active = obj
+    return obj
+
+
+def save_mesh_cache(fullpath: Path, obj: BlenderObject) -> Optional[Path]:
+    """Stores the mesh imported from the .rdm file (before mirroring) as .npz file next to its .glb.
+
+    Args:
+        fullpath (Path): The .rdm file.
+        obj (BlenderObject): The object the glTF import created.
+
+    Returns:
+        Optional[Path]: The .npz file or None if the object cannot be cached.
+    """
+    stamp = file_stamp(fullpath)
+    if stamp is None or not is_cacheable(obj):
+        return None
+    arrays = mesh_to_arrays(obj)
+    arrays["source_stamp"] = np.array(stamp, dtype = np.int64)
+    cache_file = Path(get_output_dir(fullpath, mesh_cache_suffix), fullpath.stem + mesh_cache_suffix)
+    try:
+        np.savez(cache_file, **arrays)
+    except OSError as ex:
+        print(f"Warning: Could not write mesh cache {cache_file}: {ex}")
+        return None
+    return register_converted_file(fullpath, cache_file)
+
+def load_mesh_cache(fullpath: Path, geometry_only: bool = False) -> Optional[BlenderObject]:
+    """Adds the cached mesh of the .rdm file to the scene, like import_model_to_scene before mirroring.
+
+    Returns:
+        Optional[BlenderObject]: The new object or None if there is no up to date cache file.
+    """
+    cache_file = find_converted_file(fullpath, mesh_cache_suffix)
+    if cache_file is None:
+        return None
+    try:
+        with np.load(cache_file, allow_pickle = False) as npz:
+            arrays = dict(npz)
+    except (OSError, ValueError, zipfile.BadZipFile) as ex:
+        print(f"Warning: Could not read mesh cache {cache_file}: {ex}")
+        return None
+    if int(arrays.get("version", -1)) != mesh_cache_version or arrays["source_stamp"].tolist() != file_stamp(fullpath):
+        return None
+    return arrays_to_object(arrays, geometry_only)
@@ -13,6 +13,8 @@ import io
 import math
 import subprocess
 import mathutils
+import time
+import numpy as np
 from datetime import datetime
 from pathlib import Path, PurePath
 from typing import Tuple, List, NewType, Any, Union, Dict, Optional, TypeVar, Type
@@ -23,13 +25,27 @@ from .prefs import IO_AnnocfgPreferences
 from .anno_objects import get_anno_object_class, anno_object_classes, Transform, AnnoObject, MainFile, Model, SimpleAnnoFeedbackEncodingObject, \
     SubFile, Decal, Propcontainer, Prop, Particle, IfoCube, IfoPlane, Sequence, DummyGroup, ArbitraryXMLAnnoObject, Material, \
     Dummy, Cf7DummyGroup, Cf7Dummy, FeedbackConfig, Light, IfoFile, Cf7File, IslandFile, PropGridInstance, IslandGamedataFile, AssetsXML,\
-    Animation, Cloth, BezierCurve, GameObject, AnimationsNode, AnimationSequences, AnimationSequence, Track, TrackElement, IfoMeshHeightmap,BezierCurve,Spline
+    Animation, Cloth, BezierCurve, GameObject, AnimationsNode, AnimationSequences, AnimationSequence, Track, TrackElement, IfoMeshHeightmap,BezierCurve,Spline, parseStrippedXML
 from .utils import data_path_to_absolute_path, strip_invalid_brackets, to_data_path
+from .prefetch import ConversionPrefetcher
+from .cfg_cache import CfgLibraryCache
+from .library_build import AssetLibraryBuild, collect_asset_files, import_cfg_asset, import_prop_asset
+from .filedb import FileDBFormatError, island_interpreter, read_filedb, read_fc_as_cf7, write_fc_from_cf7, cf7_to_text
+from .rdm import RdmFormatError, merge_corners, pack_vertices, write_rdm
+
+
+def use_native_fc_converter() -> bool:
+    return IO_AnnocfgPreferences.native_fc_conversion() or not IO_AnnocfgPreferences.get_path_to_fc_converter().exists()
+
+def write_fc_file(cf7root: ET.Element, fc_filepath: Path) -> bool:
+    """Writes the .fc file without AnnoFCConverter. Returns False if that is not possible, the caller then writes a .cf7 file instead."""
+    try:
+        write_fc_from_cf7(cf7root, fc_filepath)
+        return True
+    except (FileDBFormatError, OSError) as ex:
+        print(f"Cannot write {fc_filepath} directly, using AnnoFCConverter: {ex}")
+        return False
 
-def parseStrippedXML(absolute_path):
-    stripped = strip_invalid_brackets(absolute_path)
-    tree = ET.parse(io.StringIO(stripped))
-    return tree
 
 class ExportAnnoFc(Operator, ExportHelper):
     """Parses Anno (1800) .cfg files and automatically imports and positions all models, props, particles and decals in the scene. Can also import .prp files into your scene, but you must select a parent object"""
@@ -66,12 +82,10 @@ class ExportAnnoFc(Operator, ExportHelper):
 
     def export_cf7_file(self, cf7_object, cf7_filepath): 
         cf7root = Cf7File.blender_to_xml(cf7_object, None, self.children_by_object)
-        cf7tree = ET.ElementTree(cf7root)
-        ET.indent(cf7tree, space="\t", level=0)
-        cf7tree_string = ET.tostring(cf7root, encoding='unicode', method='xml')
-        cf7tree_string = cf7tree_string.replace("</cf7_imaginary_root>", "").replace("<cf7_imaginary_root>","").rstrip("\n")
+        if use_native_fc_converter() and write_fc_file(cf7root, cf7_filepath.with_suffix(".fc")):
+            return
         with open(cf7_filepath, 'w') as f:
-            f.write(cf7tree_string)
+            f.write(cf7_to_text(cf7root))
         if IO_AnnocfgPreferences.get_path_to_fc_converter().exists():
             subprocess.call(f"\"{IO_AnnocfgPreferences.get_path_to_fc_converter()}\" -w \"{cf7_filepath}\" -y -o \"{cf7_filepath.with_suffix('.fc')}\"")
         return
@@ -218,12 +232,10 @@ class ExportAnnoCfg(ExportAnnoFc, ExportHelper):
 
     def export_cf7_file(self, cf7_object, cf7_filepath): 
         cf7root = Cf7File.blender_to_xml(cf7_object, None, self.children_by_object)
-        cf7tree = ET.ElementTree(cf7root)
-        ET.indent(cf7tree, space="\t", level=0)
-        cf7tree_string = ET.tostring(cf7root, encoding='unicode', method='xml')
-        cf7tree_string = cf7tree_string.replace("</cf7_imaginary_root>", "").replace("<cf7_imaginary_root>","").rstrip("\n")
+        if use_native_fc_converter() and write_fc_file(cf7root, cf7_filepath.with_suffix(".fc")):
+            return
         with open(cf7_filepath, 'w') as f:
-            f.write(cf7tree_string)
+            f.write(cf7_to_text(cf7root))
         if IO_AnnocfgPreferences.get_path_to_fc_converter().exists():
             subprocess.call(f"\"{IO_AnnocfgPreferences.get_path_to_fc_converter()}\" -w \"{cf7_filepath}\" -y -o \"{cf7_filepath.with_suffix('.fc')}\"")
         return
@@ -238,6 +250,8 @@ class ExportAnnoCfg(ExportAnnoFc, ExportHelper):
         tree.write(safe_filepath)
         if self.convert_safe_to_fc:
             safe = SimpleAnnoFeedbackEncoding(root)
+            if use_native_fc_converter() and write_fc_file(safe.as_cf7(self.feedback_loop_mode), safe_filepath.with_suffix(".fc")):
+                return
             safe.write_as_cf7(safe_filepath.with_suffix(".cf7"), self.feedback_loop_mode)
             if IO_AnnocfgPreferences.get_path_to_fc_converter().exists():
                 subprocess.call(f"\"{IO_AnnocfgPreferences.get_path_to_fc_converter()}\" -w \"{safe_filepath.with_suffix('.cf7')}\" -y -o \"{safe_filepath.with_suffix('.fc')}\"")
@@ -368,16 +382,21 @@ class ImportAnnoCfg(Operator, ImportHelper):
         if not fullpath.exists() and not fullpath.with_suffix(".fc").exists():
             self.report({'INFO'}, f"Missing file: {fullpath.with_suffix('.fc')}")
             return
-        if not fullpath.exists() and fullpath.with_suffix(".fc").exists() and IO_AnnocfgPreferences.get_path_to_fc_converter().exists():
-            subprocess.call(f"\"{IO_AnnocfgPreferences.get_path_to_fc_converter()}\" -r \"{fullpath.with_suffix('.fc')}\" -o \"{fullpath}\"")
-        if not fullpath.exists():
-            self.report({'INFO'}, f"Missing file: {fullpath}")
-            return
         root = None
-        with open(fullpath) as f:
-            xml = '<cf7_imaginary_root>' + f.read() + '</cf7_imaginary_root>'
-            root = ET.fromstring(xml)
-        tree = ET.ElementTree(root)
+        if not fullpath.exists() and use_native_fc_converter():
+            try:
+                root = read_fc_as_cf7(fullpath.with_suffix(".fc"))
+            except FileDBFormatError as ex:
+                print(f"Cannot convert {fullpath.with_suffix('.fc')} directly, using AnnoFCConverter: {ex}")
+        if root is None:
+            if not fullpath.exists() and fullpath.with_suffix(".fc").exists() and IO_AnnocfgPreferences.get_path_to_fc_converter().exists():
+                subprocess.call(f"\"{IO_AnnocfgPreferences.get_path_to_fc_converter()}\" -r \"{fullpath.with_suffix('.fc')}\" -o \"{fullpath}\"")
+            if not fullpath.exists():
+                self.report({'INFO'}, f"Missing file: {fullpath}")
+                return
+            with open(fullpath) as f:
+                xml = '<cf7_imaginary_root>' + f.read() + '</cf7_imaginary_root>'
+                root = ET.fromstring(xml)
         cf7_object = Cf7File.xml_to_blender(root, file_obj)
         cf7_object.name = "FCFILE"
 
@@ -404,6 +423,7 @@ class ImportAnnoCfg(Operator, ImportHelper):
         if root is None:
             return
         
+        ConversionPrefetcher().prefetch(root)
         file_obj = MainFile.xml_to_blender(root)
         file_obj.name = name
         
@@ -411,15 +431,15 @@ class ImportAnnoCfg(Operator, ImportHelper):
 
 
 class ImportAnnoIsland(Operator, ImportHelper):
-    """Parses decoded Anno 1800 island xml files (or at least their prop grid and heightmap) and loads them into blender."""
+    """Parses Anno 1800 island files (decoded .xml or the FileDB encoded rd3d.data, at least their prop grid and heightmap) and loads them into blender."""
     bl_idname = "import.anno_island_files" 
-    bl_label = "Import Anno Island Files (.xml)"
+    bl_label = "Import Anno Island Files (.xml, .data)"
 
     # ImportHelper mixin class uses this
     filename_ext = ".xml"
 
     filter_glob: StringProperty( #type:  ignore
-        default="*.xml",
+        default="*.xml;*.data",
         options={'HIDDEN'},
         maxlen=255,  # Max internal buffer length, longer would be clamped.
     )
@@ -430,6 +450,7 @@ class ImportAnnoIsland(Operator, ImportHelper):
             ("All", "All", "Import all props"),
             ("No Vegetation", "No Vegetation", ""),
             ("None", "None", "Imports no props at all."),
+            ("Instanced", "Instanced (Geometry Nodes)", "Imports all props as points of a single mesh and instances them with geometry nodes. Much faster for large islands."),
         ],
         name = "Props"
     )
@@ -449,7 +470,7 @@ class ImportAnnoIsland(Operator, ImportHelper):
         #     f.write('}')       
         # return {'CANCELLED'}
         
-        if not self.path.suffix == ".xml" or not self.path.exists():
+        if not self.path.suffix in [".xml", ".data"] or not self.path.exists():
             self.report({'ERROR_INVALID_INPUT'}, f"Invalid file or extension")
             return {'CANCELLED'}
         
@@ -465,8 +486,15 @@ class ImportAnnoIsland(Operator, ImportHelper):
         #     self.report({'INFO'}, "Import completed!")
         #     return {"FINISHED"}
         
-        tree = parseStrippedXML(self.path)
-        root = tree.getroot()
+        if self.path.suffix == ".data":
+            try:
+                root = read_filedb(self.path, island_interpreter)
+            except FileDBFormatError as ex:
+                self.report({'ERROR'}, f"Cannot read {self.path.name}, decode it with FileDBReader instead: {ex}")
+                return {'CANCELLED'}
+        else:
+            tree = parseStrippedXML(self.path)
+            root = tree.getroot()
         
         file_obj = IslandFile.xml_to_blender(root, self.prop_import)
         file_obj.name = "ISLAND_" + self.path.name
@@ -487,6 +515,17 @@ class ImportAnnoIslandGamedata(Operator, ImportHelper):
         options={'HIDDEN'},
         maxlen=255,  # Max internal buffer length, longer would be clamped.
     )
+    extract_maps: BoolProperty( #type: ignore
+        name = "Extract Maps",
+        description = "Saves the water, river, environment and area id grids as .png images",
+        default = False,
+    )
+    maps_output_dir: StringProperty( #type: ignore
+        name = "Maps Folder",
+        description = "Folder for the extracted maps. Leave empty to use a <name>_maps folder next to the imported file",
+        subtype = 'DIR_PATH',
+        default = "",
+    )
 
     def execute(self, context):
         self.path = Path(self.filepath)
@@ -497,7 +536,12 @@ class ImportAnnoIslandGamedata(Operator, ImportHelper):
         tree = parseStrippedXML(self.path)
         root = tree.getroot()
         
-        assetsXML = AssetsXML()
+        if self.extract_maps:
+            output_dir = Path(self.maps_output_dir) if self.maps_output_dir else Path(self.path.parent, self.path.stem + "_maps")
+            images = IslandGamedataFile.create_maps(root, output_dir)
+            print(f"Extracted {len(images)} maps to {output_dir}")
+        
+        assetsXML = AssetsXML.get_instance()
         
         file_obj = IslandGamedataFile.xml_to_blender(root, assetsXML)
         
@@ -699,6 +743,16 @@ class ExportAnnoModelOperator(Operator, ExportHelper):
         ],
         name = "Vertex Format"
     )
+    write_directly: BoolProperty( #type: ignore
+        name = "Write .rdm Directly (Experimental)",
+        description = "Writes the .rdm file without the .glb and rdm4 detour. Falls back to rdm4 if the mesh cannot be written this way",
+        default = False,
+    )
+    compare_with_rdm4: BoolProperty( #type: ignore
+        name = "Compare with rdm4",
+        description = "Also converts the model with rdm4, keeps that result and reports whether the directly written file is identical",
+        default = False,
+    )
 
     def execute(self, context):
         self.obj = context.active_object
@@ -729,6 +783,14 @@ class ExportAnnoModelOperator(Operator, ExportHelper):
         return {'FINISHED'}
     
     def export_rdm(self):
+        direct_path = None
+        if self.write_directly:
+            direct_path = self.path.with_name(self.path.stem + "_direct.rdm") if self.compare_with_rdm4 else self.path
+            if not self.export_rdm_directly(direct_path):
+                direct_path = None
+            elif not self.compare_with_rdm4:
+                return
+        
         self.export_glb(self.path.with_suffix(".glb"))
         
         rdm4_path = IO_AnnocfgPreferences.get_path_to_rdm4()
@@ -738,6 +800,143 @@ class ExportAnnoModelOperator(Operator, ExportHelper):
                 self.path.unlink()
             print(f"Subprocess: \"{rdm4_path}\" --gltf={self.vertex_format} --input \"{self.path.with_suffix('.glb')}\" -n --outdst \"{self.path.parent}\"")
             subprocess.call(f"\"{rdm4_path}\" --gltf={self.vertex_format} --input \"{self.path.with_suffix('.glb')}\" -n --outdst \"{self.path.parent}\"", shell = True)
+        if direct_path is not None:
+            self.compare_rdm_files(direct_path, self.path)
+            direct_path.unlink()
+    
+    def export_rdm_directly(self, output_path: Path) -> bool:
+        """Writes the evaluated mesh of the object to output_path in the selected vertex format.
+
+        Returns:
+            bool: False if the file could not be written this way.
+        """
+        start = time.perf_counter()
+        vertex_format = self.vertex_format.strip()
+        try:
+            corner_vertices, material_indices = self.get_corner_vertices(vertex_format)
+            vertices, indices = merge_corners(corner_vertices)
+            write_rdm(output_path, vertex_format, vertices, indices, material_indices)
+        except RdmFormatError as ex:
+            print(f"Writing {self.path} directly failed, using rdm4 instead: {ex}")
+            return False
+        print(f"Wrote {output_path} with {len(vertices)} vertices in {1000 * (time.perf_counter() - start):.1f} ms")
+        return True
+    
+    def get_corner_vertices(self, vertex_format: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Packs the attributes of every triangle corner of the evaluated mesh in the vertex format.
+        The mesh is expected in world space and mirrored (see export_wrapper), like for the .glb export.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Packed vertex of every triangle corner and material index of every triangle.
+        """
+        depsgraph = bpy.context.evaluated_depsgraph_get()
+        obj_eval = self.obj.evaluated_get(depsgraph)
+        mesh = obj_eval.to_mesh()
+        try:
+            mesh.calc_loop_triangles()
+            triangle_count = len(mesh.loop_triangles)
+            corners = np.empty(triangle_count * 3, dtype = np.int32)
+            mesh.loop_triangles.foreach_get("loops", corners)
+            material_indices = np.empty(triangle_count, dtype = np.int32)
+            mesh.loop_triangles.foreach_get("material_index", material_indices)
+            
+            loop_count = len(mesh.loops)
+            loop_vertices = np.empty(loop_count, dtype = np.int32)
+            mesh.loops.foreach_get("vertex_index", loop_vertices)
+            coordinates = np.empty(len(mesh.vertices) * 3, dtype = np.float32)
+            mesh.vertices.foreach_get("co", coordinates)
+            coordinates = coordinates.reshape(-1, 3)
+            normals = np.empty(loop_count * 3, dtype = np.float32)
+            mesh.corner_normals.foreach_get("vector", normals)
+            normals = normals.reshape(-1, 3)
+            
+            uvs = np.zeros((loop_count, 2), dtype = np.float32)
+            tangents = np.zeros((loop_count, 3), dtype = np.float32)
+            bitangents = np.zeros((loop_count, 3), dtype = np.float32)
+            if mesh.uv_layers.active is not None:
+                mesh.uv_layers.active.data.foreach_get("uv", uvs.ravel())
+                mesh.calc_tangents(uvmap = mesh.uv_layers.active.name)
+                mesh.loops.foreach_get("tangent", tangents.ravel())
+                mesh.loops.foreach_get("bitangent", bitangents.ravel())
+            uvs[:, 1] = 1.0 - uvs[:, 1]
+            
+            colors = []
+            for color_attribute in list(mesh.color_attributes)[:2]:
+                values = np.empty(len(color_attribute.data) * 4, dtype = np.float32)
+                color_attribute.data.foreach_get("color", values)
+                values = values.reshape(-1, 4)
+                colors.append(values[loop_vertices] if color_attribute.domain == 'POINT' else values)
+            bone_indices, bone_weights = None, None
+            if "_I4b" in vertex_format:
+                bone_indices, bone_weights = self.get_bone_weights(mesh)
+                bone_indices, bone_weights = bone_indices[loop_vertices], bone_weights[loop_vertices]
+        finally:
+            obj_eval.to_mesh_clear()
+        
+        # blender (z up) -> anno (y up)
+        to_anno = lambda vectors: np.stack([vectors[:, 0], vectors[:, 2], -vectors[:, 1]], axis = 1)
+        corner_vertices = pack_vertices(vertex_format,
+            positions = to_anno(coordinates[loop_vertices[corners]]),
+            normals = to_anno(normals[corners]),
+            tangents = to_anno(tangents[corners]),
+            bitangents = to_anno(bitangents[corners]),
+            uvs = uvs[corners],
+            colors = [layer[corners] for layer in colors],
+            bone_indices = bone_indices[corners] if bone_indices is not None else None,
+            bone_weights = bone_weights[corners] if bone_weights is not None else None,
+        )
+        return corner_vertices, material_indices
+    
+    def get_bone_weights(self, mesh) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the (up to) four strongest bones of every vertex and their normalized weights.
+        Bones are numbered in the order of the armature, or of the vertex groups if the object has no armature."""
+        group_to_bone = np.arange(max(1, len(self.obj.vertex_groups)), dtype = np.int32)
+        armature = next((m.object for m in self.obj.modifiers if m.type == 'ARMATURE' and m.object is not None), None)
+        if armature is not None:
+            bone_names = [bone.name for bone in armature.data.bones]
+            for group in self.obj.vertex_groups:
+                if group.name in bone_names:
+                    group_to_bone[group.index] = bone_names.index(group.name)
+        vertex_count = len(mesh.vertices)
+        bone_indices = np.zeros((vertex_count, 4), dtype = np.uint8)
+        bone_weights = np.zeros((vertex_count, 4), dtype = np.float32)
+        bone_weights[:, 0] = 1.0
+        # vertex groups have no foreach_get, flatten them once and do the rest with arrays
+        memberships = np.array([(vertex.index, g.group, g.weight) for vertex in mesh.vertices for g in vertex.groups], dtype = np.float64).reshape(-1, 3)
+        if len(memberships) == 0:
+            return bone_indices, bone_weights
+        memberships = memberships[np.argsort(memberships[:, 0], kind = "stable")]
+        vertices = memberships[:, 0].astype(np.int64)
+        counts = np.bincount(vertices, minlength = vertex_count)
+        slots = np.arange(len(vertices)) - np.repeat(np.cumsum(counts) - counts, counts)
+        width = max(4, int(counts.max()))
+        weights = np.zeros((vertex_count, width), dtype = np.float32)
+        groups = np.zeros((vertex_count, width), dtype = np.int64)
+        weights[vertices, slots] = memberships[:, 2]
+        groups[vertices, slots] = memberships[:, 1]
+        
+        # the four strongest groups of every vertex, strongest first
+        strongest = np.argpartition(-weights, 3, axis = 1)[:, :4]
+        strongest = np.take_along_axis(strongest, np.argsort(-np.take_along_axis(weights, strongest, axis = 1), axis = 1, kind = "stable"), axis = 1)
+        weights = np.take_along_axis(weights, strongest, axis = 1)
+        groups = np.take_along_axis(groups, strongest, axis = 1)
+        totals = weights.sum(axis = 1)
+        weighted = totals > 0
+        bone_weights[weighted] = weights[weighted] / totals[weighted, None]
+        bone_indices[weighted] = np.where(weights[weighted] > 0, group_to_bone[groups[weighted]], 0)
+        return bone_indices, bone_weights
+    
+    def compare_rdm_files(self, direct_path: Path, rdm4_path: Path):
+        if not rdm4_path.exists():
+            self.report({'WARNING'}, f"rdm4 did not write {rdm4_path}, nothing to compare.")
+            return
+        direct = direct_path.read_bytes()
+        converted = rdm4_path.read_bytes()
+        if direct == converted:
+            self.report({'INFO'}, f"The directly written .rdm is identical to the rdm4 result.")
+            return
+        first_difference = next((i for i, (a, b) in enumerate(zip(direct, converted)) if a != b), min(len(direct), len(converted)))
+        self.report({'WARNING'}, f"The directly written .rdm differs from the rdm4 result at byte {first_difference} ({len(direct)} vs {len(converted)} bytes).")
     
     def export_glb(self, filepath = None):
         if filepath is None:
@@ -927,37 +1126,15 @@ class ImportAllPropsOperator(Operator, ImportHelper):
             self.report({'ERROR_INVALID_INPUT'}, f"Invalid folder. Needs to be inside your rda folder.")
             return {"CANCELLED"}
         
-        i = 0
         y_loc = 0
-        for p in dirpath.rglob('*.prp'):
-            if "decal_detail" in p.name:
-                continue
+        for p in collect_asset_files("PROP", dirpath):
             print(p)
-            i+=1
-            data_path = to_data_path(p).as_posix()
-            node = ET.fromstring(f"""
-                <Config>
-                    <ConfigType>PROP</ConfigType>
-                    <FileName>{data_path}</FileName>
-                    <Name>PROP_{p.stem}</Name>
-                    <Flags>1</Flags>
-                </Config>                  
-            """)
-            try:
-                blender_obj = Prop.xml_to_blender(node)
-                if blender_obj.type == "EMPTY":
-                    bpy.ops.object.delete()
-                    continue
-            except:
+            blender_obj = import_prop_asset(p)
+            if blender_obj is None:
                 continue
             blender_obj.location.y = y_loc
             y_loc += 1
-            blender_obj.name = p.name
-            blender_obj.asset_mark()
-            for directory in PurePath(data_path).parts[:-1]:
-                if directory not in ["graphics", "data"]:
-                    blender_obj.asset_data.tags.new(directory)
-            bpy.ops.ed.lib_id_generate_preview({"id": blender_obj})
+            blender_obj.asset_generate_preview()
         return {"FINISHED"}
 
 
@@ -970,11 +1147,6 @@ class ImportAllCfgsOperator(Operator, ImportHelper):
     filename_ext = "."
     use_filter_folder = True
     
-    def add_to_collection_recursively(self, obj, collection):
-        collection.objects.link(obj)
-        for child in obj.children:
-            self.add_to_collection_recursively(child, collection)
-    
     def execute(self, context):
         self.report({'INFO'}, f"Importing all cfgs from {self.filepath}...")
         dirpath = Path(self.filepath)
@@ -987,37 +1159,117 @@ class ImportAllCfgsOperator(Operator, ImportHelper):
             self.report({'ERROR_INVALID_INPUT'}, f"Invalid folder. Needs to be inside your rda folder.")
             return {"CANCELLED"}
         
-        i = 0
-        for p in dirpath.rglob('*.cfg'):
+        for i, p in enumerate(collect_asset_files("CFG", dirpath)):
             print(i, p)
-            i+=1
-            data_path = to_data_path(p).as_posix()
-            node = ET.fromstring(f"""
-                <Config>
-                    <ConfigType>FILE</ConfigType>
-                    <FileName>{data_path}</FileName>
-                    <AdaptTerrainHeight>1</AdaptTerrainHeight>
-                </Config>                  
-            """)
-            try:
-                blender_obj = SubFile.xml_to_blender(node)
-            except:
-                continue
-             
-            collection = bpy.context.blend_data.collections.new(name=p.name)
-            bpy.context.collection.children.link(collection)
-            self.add_to_collection_recursively(blender_obj, collection)
-            
-            collection.asset_mark()
-            collection.asset_data.tags.new("cfg")
-            collection.asset_data.description = data_path
-            for directory in PurePath(data_path).parts[:-1]:
-                if directory not in ["graphics", "data"]:
-                    collection.asset_data.tags.new(directory)
-            collection.asset_generate_preview()
+            collection = import_cfg_asset(p, context.collection)
+            if collection is not None:
+                collection.asset_generate_preview()
         return {"FINISHED"}
 
 
+class BuildAnnoAssetLibraryOperator(Operator, ImportHelper):
+    """Import all cfgs or props (located in the rda folder) into this file as assets, using several background blender processes.
+    The progress is stored in the build folder, so running it again after a crash or cancel (Esc) continues where it stopped."""
+
+    bl_idname = "anno_library.build"
+    bl_label = "Build Anno Asset Library"
+    
+    filename_ext = "."
+    use_filter_folder = True
+    
+    asset_type : EnumProperty( # type: ignore
+        name = "Assets",
+        items = [
+            ("CFG", "Cfgs", "Import all .cfg files as collections"),
+            ("PROP", "Props", "Import all .prp files as objects"),
+        ],
+        default = "CFG",
+    )
+    worker_count : IntProperty( # type: ignore
+        name = "Workers",
+        description = "Number of background blender processes. Each one needs as much memory as a normal import",
+        default = 4,
+        min = 1,
+        max = 32,
+    )
+    build_dir : StringProperty( # type: ignore
+        name = "Build Folder",
+        description = "Folder for the progress and the intermediate .blend files. Leave empty to use a folder next to this .blend file",
+        subtype = 'DIR_PATH',
+        default = "",
+    )
+    
+    poll_interval = 5.0
+    _build = None
+    _timer = None
+    
+    def execute(self, context):
+        dirpath = Path(self.filepath)
+        rda_path = IO_AnnocfgPreferences.get_path_to_rda_folder()
+        if not dirpath.is_dir() or not dirpath.is_relative_to(rda_path):
+            self.report({'ERROR_INVALID_INPUT'}, f"Invalid folder. Needs to be inside your rda folder.")
+            return {"CANCELLED"}
+        build_dir = Path(self.build_dir)
+        if self.build_dir == "":
+            if bpy.data.filepath == "":
+                self.report({'ERROR_INVALID_INPUT'}, f"Save this .blend file first or select a build folder.")
+                return {"CANCELLED"}
+            blend_path = Path(bpy.data.filepath)
+            build_dir = Path(blend_path.parent, blend_path.stem + "_library_build")
+        
+        self.report({'INFO'}, f"Building asset library from {dirpath} in {build_dir}...")
+        self._build = AssetLibraryBuild(self.asset_type, dirpath, build_dir)
+        if not self._build.start(self.worker_count):
+            return self.finish()
+        # wait for the workers without blocking the ui
+        self._timer = context.window_manager.event_timer_add(self.poll_interval, window = context.window)
+        context.window_manager.modal_handler_add(self)
+        return {"RUNNING_MODAL"}
+    
+    def modal(self, context, event):
+        if event.type == 'ESC':
+            self.cancel(context)
+            self.report({'WARNING'}, f"Cancelled. Run it again to continue.")
+            return {"CANCELLED"}
+        if event.type != 'TIMER' or event.timer != self._timer:
+            return {"PASS_THROUGH"}
+        if self._build.poll_workers():
+            return {"RUNNING_MODAL"}
+        context.window_manager.event_timer_remove(self._timer)
+        self._timer = None
+        return self.finish()
+    
+    def cancel(self, context):
+        if self._timer is not None:
+            context.window_manager.event_timer_remove(self._timer)
+            self._timer = None
+        self._build.terminate_workers()
+    
+    def finish(self):
+        count = self._build.finish()
+        if count is None:
+            self.report({'ERROR'}, f"Some workers failed, see the logs in {self._build.build_dir}. Run it again to continue.")
+            return {"CANCELLED"}
+        self.report({'INFO'}, f"Added {count} assets.")
+        return {"FINISHED"}
+
+
+
+
+class PruneCfgCacheOperator(Operator):
+    """Reports size and hit rate of the cfg cache and deletes the least recently used .blend files until it fits into its size budget."""
+
+    bl_idname = "anno_cfg_cache.prune"
+    bl_label = "Prune Cfg Cache"
+
+    def execute(self, context):
+        cfg_cache = CfgLibraryCache.get_instance()
+        if cfg_cache is None:
+            self.report({'ERROR'}, f"Invalid cfg cache path {IO_AnnocfgPreferences.get_cfg_cache_path()}")
+            return {"CANCELLED"}
+        removed = cfg_cache.prune()
+        self.report({'INFO'}, f"{cfg_cache.report()}. Removed {removed} files.")
+        return {"FINISHED"}
 
 
 classes = (
@@ -1030,10 +1282,12 @@ classes = (
     OBJECT_OT_add_anno_object,
     ImportAllPropsOperator,
     ImportAllCfgsOperator,
+    BuildAnnoAssetLibraryOperator,
     ImportAnnoIsland,
     ImportAnnoIslandGamedata,
     ExportAnnoIsland,
     ExportAnnoIslandGamedata,
+    PruneCfgCacheOperator,
     # ExportAnimatedAnnoModelOperator,
 )
 
@@ -1071,6 +1325,9 @@ def menu_func_import_all_props(self, context):
 def menu_func_import_all_cfgs(self, context):
     self.layout.operator(ImportAllCfgsOperator.bl_idname, text="Import Anno Cfgs Assets")
 
+def menu_func_build_asset_library(self, context):
+    self.layout.operator(BuildAnnoAssetLibraryOperator.bl_idname, text="Build Anno Asset Library")
+
 def menu_func_import_island(self, context):
     self.layout.operator(ImportAnnoIsland.bl_idname, text="Anno Island (.xml)")
 def menu_func_import_island_gamedata(self, context):
@@ -1106,6 +1363,7 @@ def register():
         bpy.types.TOPBAR_MT_file_import.append(func)
     bpy.types.TOPBAR_MT_file.append(menu_func_import_all_props)
     bpy.types.TOPBAR_MT_file.append(menu_func_import_all_cfgs)
+    bpy.types.TOPBAR_MT_file.append(menu_func_build_asset_library)
     for func in export_funcs:
         bpy.types.TOPBAR_MT_file_export.append(func)
 
@@ -1119,6 +1377,7 @@ def unregister():
         bpy.types.TOPBAR_MT_file_import.remove(func)
     bpy.types.TOPBAR_MT_file.remove(menu_func_import_all_props)
     bpy.types.TOPBAR_MT_file.remove(menu_func_import_all_cfgs)
+    bpy.types.TOPBAR_MT_file.remove(menu_func_build_asset_library)
     for func in export_funcs:
         bpy.types.TOPBAR_MT_file_export.remove(func)
         
@@ -0,0 +1,195 @@
+from __future__ import annotations
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from .prefs import IO_AnnocfgPreferences
+from .utils import data_path_to_absolute_path, get_text
+from .anno_objects import AnnoObject, Prop, parseStrippedXML, run_rdm4
+from .shaders.shader_components import use_native_dds_decoder
+from .texconv_queue import TexconvQueue
+from .prop_cache import PropMetadata, PropMetadataCache
+from .dds import convert_dds_to_png_directly
+from .conversion_cache import ConversionCache, find_converted_file, get_output_dir, register_converted_file
+
+
+class ConversionPrefetcher:
+    """Runs the external conversions an import will need (.rdm -> .glb, .dds -> .png, .prp -> .xml)
+    on a bounded worker pool, before any blender object is created.
+
+    Usage:
+        ConversionPrefetcher().prefetch(root)
+        MainFile.xml_to_blender(root)
+
+    The walk only reads the xml tree. All paths, output folders and tool locations are resolved on the main thread
+    and results are registered in the conversion cache there, the workers only wait for the external processes.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None):
+        if max_workers is None:
+            max_workers = IO_AnnocfgPreferences.get_conversion_worker_count()
+        self.max_workers = max(1, max_workers)
+        self.rdm4_path = IO_AnnocfgPreferences.get_path_to_rdm4()
+        self.filedb_reader_path = IO_AnnocfgPreferences.get_path_to_filedb_reader()
+        #models are read directly, rdm4 only runs for the ones that fail
+        self.native_rdm_import = IO_AnnocfgPreferences.native_rdm_import()
+        self.native_dds_import = use_native_dds_decoder()
+        self.prop_metadata = PropMetadataCache.get_instance()
+        self.native_filedb_import = IO_AnnocfgPreferences.native_filedb_import()
+
+        self.models: Set[Path] = set()
+        self.textures: Set[Path] = set()
+        self.props: Dict[Path, str] = {}
+        self.visited_files: Set[Path] = set()
+        self.submitted: Set[Path] = set()
+
+    def prefetch(self, root: ET.Element):
+        """Collects all conversions required by the main file root (including subfiles and props) and runs them.
+
+        Args:
+            root (ET.Element): Root node of a .cfg file.
+        """
+        self.collect(root)
+        self.run()
+
+    def collect(self, node: ET.Element):
+        for model_node in node.findall("Models/*") + node.findall("Clothes/*"):
+            self.add_model(get_text(model_node, "FileName"))
+            self.add_materials(model_node.find("Materials"))
+        for decal_node in node.findall("Decals/*"):
+            self.add_materials(decal_node.find("Materials"))
+        for prop_node in node.findall("PropContainers/*/Props/*"):
+            self.add_prop(get_text(prop_node, "FileName"))
+        for file_node in node.findall("Files/*"):
+            self.add_subfile(get_text(file_node, "FileName"))
+
+    def add_model(self, data_path: Optional[str]):
+        if not data_path or self.native_rdm_import:
+            return
+        fullpath = data_path_to_absolute_path(data_path).with_suffix(".rdm")
+        if fullpath.exists() and find_converted_file(fullpath, ".glb") is None:
+            self.models.add(fullpath)
+
+    def add_texture(self, data_path: Path):
+        fullpath = data_path_to_absolute_path(data_path)
+        if fullpath.exists() and find_converted_file(fullpath, ".png") is None:
+            self.textures.add(fullpath)
+
+    def add_materials(self, materials_node: Optional[ET.Element], shader = None):
+        if materials_node is None:
+            return
+        for material_node in list(materials_node):
+            material_shader = shader
+            if material_shader is None:
+                shader_id = get_text(material_node, "ShaderID")
+                material_shader = AnnoObject.model_shaders_by_id.get(shader_id, AnnoObject.default_shader)
+            for texture_path in material_shader.get_required_textures(material_node):
+                self.add_texture(texture_path)
+
+    def add_prop(self, data_path: str):
+        if not data_path or data_path in Prop.prop_data_by_filename:
+            return
+        fullpath = data_path_to_absolute_path(data_path)
+        if not fullpath.exists() or fullpath.suffix != ".prp":
+            return
+        metadata = self.prop_metadata.lookup(fullpath)
+        if metadata is None and self.native_filedb_import:
+            #decoding a .prp in process is faster than scheduling FileDBReader
+            metadata = Prop.read_prop_metadata(fullpath)
+        if metadata is not None:
+            self.add_prop_metadata(metadata)
+            return
+        self.props[fullpath] = data_path
+
+    def add_subfile(self, data_path: str):
+        if not data_path:
+            return
+        fullpath = data_path_to_absolute_path(data_path)
+        if fullpath in self.visited_files or not fullpath.exists():
+            return
+        self.visited_files.add(fullpath)
+        try:
+            root = parseStrippedXML(fullpath).getroot()
+        except Exception as ex:
+            print(f"Prefetch: Failed to parse subfile {data_path}: {ex}")
+            return
+        if root is not None:
+            self.collect(root)
+
+    def add_prop_metadata(self, metadata: PropMetadata):
+        self.add_model(metadata.mesh_file_name)
+        shader = Prop.shader_classes.get(metadata.prop_type, Prop.default_shader)
+        self.add_materials(metadata.get_materials_node(), shader)
+
+    def collect_from_prop_xml(self, prop_file: Path, xml_path: Path):
+        """Stores the metadata of a decoded .prp file and collects its mesh and material textures. Runs on the main thread."""
+        if not xml_path.exists():
+            return
+        try:
+            prop_node = parseStrippedXML(xml_path).getroot().find("Prop")
+        except Exception as ex:
+            print(f"Prefetch: Failed to parse {xml_path}: {ex}")
+            return
+        if prop_node is None:
+            return
+        metadata = PropMetadata.from_prop_node(prop_node)
+        self.prop_metadata.store(prop_file, metadata)
+        self.add_prop_metadata(metadata)
+
+    def submit_pending(self, executor: ThreadPoolExecutor) -> Dict[Future, Tuple[str, Path, Optional[Path]]]:
+        futures = {}
+        if self.rdm4_path.exists():
+            for fullpath in self.models - self.submitted:
+                output_dir = get_output_dir(fullpath, ".glb")
+                future = executor.submit(run_rdm4, self.rdm4_path, fullpath, output_dir)
+                futures[future] = ("model", fullpath, Path(output_dir, fullpath.stem + ".glb"))
+        if self.native_dds_import:
+            for fullpath in self.textures - self.submitted:
+                output_dir = get_output_dir(fullpath, ".png")
+                #formats the decoder does not support are converted with texconv when the texture is loaded
+                future = executor.submit(convert_dds_to_png_directly, fullpath, output_dir)
+                futures[future] = ("texture", fullpath, Path(output_dir, fullpath.stem + ".png"))
+        else:
+            self.queue_textures()
+        for fullpath in set(self.props.keys()) - self.submitted:
+            futures[executor.submit(Prop.convert_prp_to_xml, fullpath, self.filedb_reader_path)] = ("prop", fullpath, None)
+        self.submitted.update(path for _, path, _ in futures.values())
+        return futures
+
+    def queue_textures(self):
+        """Hands the textures to the TexconvQueue. The import does not wait for them here,
+        every material waits for its own textures when it loads them."""
+        queue = TexconvQueue.get_instance()
+        if queue is None:
+            return
+        textures = self.textures - self.submitted
+        for fullpath in textures:
+            queue.request(fullpath)
+        self.submitted.update(textures)
+        queue.flush()
+
+    def run(self):
+        job_count = len(self.models) + len(self.textures) + len(self.props)
+        if job_count == 0:
+            return
+        print(f"Prefetch: Converting {len(self.models)} models, {len(self.textures)} textures and {len(self.props)} props with {self.max_workers} workers.")
+        with ThreadPoolExecutor(max_workers = self.max_workers) as executor:
+            pending = self.submit_pending(executor)
+            while pending:
+                done, _ = wait(pending.keys(), return_when = FIRST_COMPLETED)
+                for future in done:
+                    kind, fullpath, produced_file = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as ex:
+                        print(f"Prefetch: Conversion of {fullpath} failed: {ex}")
+                        continue
+                    if kind == "prop":
+                        # Props reference their mesh and textures only inside the decoded .prp
+                        self.collect_from_prop_xml(fullpath, result)
+                    else:
+                        register_converted_file(fullpath, produced_file)
+                pending.update(self.submit_pending(executor))
+        ConversionCache.flush()
+        PropMetadataCache.flush()
@@ -17,7 +17,7 @@
 # ##### END GPL LICENSE BLOCK #####
 import bpy
 from bpy.types import AddonPreferences, Scene
-from bpy.props import StringProperty, EnumProperty, BoolProperty, FloatProperty
+from bpy.props import StringProperty, EnumProperty, BoolProperty, FloatProperty, IntProperty
 
 from pathlib import Path
 
@@ -54,6 +54,25 @@ class IO_AnnocfgPreferences(AddonPreferences):
         subtype='FILE_PATH',
         default = "C:\\tools\\FileDBReader.exe",
     )
+    conversion_workers_int : IntProperty( # type: ignore
+        name = "Conversion Workers",
+        description = "Number of rdm4/texconv/FileDBReader processes that may run at the same time while preparing an import",
+        default = 4,
+        min = 1,
+        max = 32,
+    )
+    conversion_cache_path : StringProperty( # type: ignore
+        name = "Path to conversion cache",
+        description = "Folder for converted .glb and .png files. Leave empty to store them next to the source files in the rda folder",
+        subtype='DIR_PATH',
+        default = "",
+    )
+    conversion_cache_budget_mb_int : IntProperty( # type: ignore
+        name = "Conversion Cache Size (MB)",
+        description = "When the conversion cache grows beyond this size, the least recently used files are deleted",
+        default = 20480,
+        min = 64,
+    )
     texture_quality : EnumProperty( #type: ignore
         name='Texture Quality',
         description='Determines which texture files will be used (_0.dds, _1.dds, etc). 0 is the highest setting. Only applies to newly imported models.',
@@ -73,17 +92,57 @@ class IO_AnnocfgPreferences(AddonPreferences):
         description = "The anno engine mirrors object along the X axis. When enabled, the addon will also mirror meshes along the X axis s.t. text is displayed correctly. However, this means that all .glb files imported directly (using the .glb import instead of the .rmd import) will have the wrong orientation, to avoid this uncheck this box. Keep in mind that when you change this setting, all your exising .blend files will not export properly.",
         default = True
     )
+    share_model_meshes_bool : BoolProperty( # type: ignore
+        name = "Share Meshes of Repeated Models",
+        description = "Imports every .rdm file only once per session. Further models with the same file get a new object that uses the same mesh data, with their own materials. Editing such a mesh changes all objects using it",
+        default = False
+    )
+    instance_repeated_subfiles_bool : BoolProperty( # type: ignore
+        name = "Instance Repeated Subfiles",
+        description = "Imports every subfile only once per session into a hidden template collection. All references to it become collection instances, use 'Make Collection Instance Real' to edit one of them. Load All Animations and exports only see real objects",
+        default = False
+    )
+    mesh_cache_bool : BoolProperty( # type: ignore
+        name = "Cache Imported Meshes",
+        description = "Stores the mesh of every model imported with the glTF importer as .npz file next to its .glb. Later imports build the mesh from that file, which is much faster than importing the .glb again",
+        default = True
+    )
+    native_rdm_import_bool : BoolProperty( # type: ignore
+        name = "Read .rdm Files Directly (Experimental)",
+        description = "Builds meshes directly from the .rdm files instead of converting them to .glb with rdm4 first. Files with other vertex formats are still converted with rdm4",
+        default = False
+    )
+    native_dds_import_bool : BoolProperty( # type: ignore
+        name = "Decode .dds Files Directly",
+        description = "Decodes .dds textures inside blender instead of converting them with texconv. Always used if texconv is not available. Unsupported formats are still converted with texconv",
+        default = False
+    )
+    native_filedb_import_bool : BoolProperty( # type: ignore
+        name = "Read .prp Files Directly (Experimental)",
+        description = "Decodes .prp files inside blender instead of with FileDBReader, without writing .xml files. Files that cannot be read this way are still decoded with FileDBReader",
+        default = False
+    )
+    native_fc_conversion_bool : BoolProperty( # type: ignore
+        name = "Convert .fc Files Directly",
+        description = "Reads and writes .fc feedback files inside blender instead of converting them from and to .cf7 with AnnoFCConverter. Always used if AnnoFCConverter is not available. Files that cannot be converted this way still use AnnoFCConverter",
+        default = False
+    )
     sequences_as_blender_objects : BoolProperty( # type: ignore
         name = "Sequences as Blender Objects",
         description = "Turns sequences into blender objects and resolves ModelID (and ParticleID) references to their respective blender object. Allows easier handling of animated files and prevents errors coming from a reordering of the models when exporting. ",
         default = True
     )
-    cfg_cache_probability_float : FloatProperty( # type: ignore
-        name = "Cfg Cache Probability",
-        description = "Caches .cfg files in a specific library folder to allow faster retrieval. Set to 0 to disable and to 1 to cache everything. Use a value in between to only cache frequently used .cfgs (in expectation)",
-        default = 0.0,
-        min = 0.0,
-        max = 1.0,
+    cfg_cache_min_uses_int : IntProperty( # type: ignore
+        name = "Cfg Cache After Uses",
+        description = "Caches a .cfg file in the cfg cache folder to allow faster retrieval once it was used this many times (counted across sessions). Set to 0 to disable, to 1 to cache everything and to 2 or more to only cache frequently used .cfgs",
+        default = 0,
+        min = 0,
+    )
+    cfg_cache_budget_mb_int : IntProperty( # type: ignore
+        name = "Cfg Cache Size (MB)",
+        description = "When the cfg cache grows beyond this size, the least recently used .blend files are deleted",
+        default = 4096,
+        min = 16,
     )
     cfg_cache_loading_enabled_bool : BoolProperty( # type: ignore
         name = "Cfg Cache Loading Enabled",
@@ -104,13 +163,25 @@ class IO_AnnocfgPreferences(AddonPreferences):
         layout.prop(self, "path_to_texconv")
         layout.prop(self, "path_to_fc_converter")
         layout.prop(self, "path_to_filedb_reader")
+        layout.prop(self, "conversion_workers_int")
+        layout.prop(self, "conversion_cache_path")
+        layout.prop(self, "conversion_cache_budget_mb_int")
         layout.prop(self, "texture_quality")
         layout.prop(self, "mirror_models_bool")
+        layout.prop(self, "share_model_meshes_bool")
+        layout.prop(self, "instance_repeated_subfiles_bool")
+        layout.prop(self, "mesh_cache_bool")
+        layout.prop(self, "native_rdm_import_bool")
+        layout.prop(self, "native_dds_import_bool")
+        layout.prop(self, "native_filedb_import_bool")
+        layout.prop(self, "native_fc_conversion_bool")
         layout.prop(self, "enable_splines")
         layout.prop(self, "sequences_as_blender_objects")
         layout.prop(self, "cfg_cache_loading_enabled_bool")
-        layout.prop(self, "cfg_cache_probability_float")
+        layout.prop(self, "cfg_cache_min_uses_int")
+        layout.prop(self, "cfg_cache_budget_mb_int")
         layout.prop(self, "cfg_cache_path")
+        layout.operator("anno_cfg_cache.prune")
 
     @classmethod
     def get_cfg_cache_path(cls):
@@ -131,6 +202,18 @@ class IO_AnnocfgPreferences(AddonPreferences):
     def get_path_to_filedb_reader(cls):
         return Path(bpy.context.preferences.addons[__package__].preferences.path_to_filedb_reader)
     @classmethod
+    def get_conversion_worker_count(cls):
+        return bpy.context.preferences.addons[__package__].preferences.conversion_workers_int
+    @classmethod
+    def conversion_cache_enabled(cls):
+        return bpy.context.preferences.addons[__package__].preferences.conversion_cache_path != ""
+    @classmethod
+    def get_conversion_cache_path(cls):
+        return Path(bpy.path.abspath(bpy.context.preferences.addons[__package__].preferences.conversion_cache_path))
+    @classmethod
+    def get_conversion_cache_budget_mb(cls):
+        return bpy.context.preferences.addons[__package__].preferences.conversion_cache_budget_mb_int
+    @classmethod
     def get_texture_quality(cls):
         return bpy.context.preferences.addons[__package__].preferences.texture_quality
     @classmethod
@@ -140,11 +223,35 @@ class IO_AnnocfgPreferences(AddonPreferences):
     def mirror_models(cls):
         return bpy.context.preferences.addons[__package__].preferences.mirror_models_bool
     @classmethod
+    def share_model_meshes(cls):
+        return bpy.context.preferences.addons[__package__].preferences.share_model_meshes_bool
+    @classmethod
+    def instance_repeated_subfiles(cls):
+        return bpy.context.preferences.addons[__package__].preferences.instance_repeated_subfiles_bool
+    @classmethod
+    def mesh_cache_enabled(cls):
+        return bpy.context.preferences.addons[__package__].preferences.mesh_cache_bool
+    @classmethod
+    def native_rdm_import(cls):
+        return bpy.context.preferences.addons[__package__].preferences.native_rdm_import_bool
+    @classmethod
+    def native_dds_import(cls):
+        return bpy.context.preferences.addons[__package__].preferences.native_dds_import_bool
+    @classmethod
+    def native_filedb_import(cls):
+        return bpy.context.preferences.addons[__package__].preferences.native_filedb_import_bool
+    @classmethod
+    def native_fc_conversion(cls):
+        return bpy.context.preferences.addons[__package__].preferences.native_fc_conversion_bool
+    @classmethod
     def turn_sequences_into_blender_objects(cls):
         return bpy.context.preferences.addons[__package__].preferences.sequences_as_blender_objects
     @classmethod
-    def cfg_cache_probability(cls):
-        return bpy.context.preferences.addons[__package__].preferences.cfg_cache_probability_float
+    def get_cfg_cache_min_uses(cls):
+        return bpy.context.preferences.addons[__package__].preferences.cfg_cache_min_uses_int
+    @classmethod
+    def get_cfg_cache_budget_mb(cls):
+        return bpy.context.preferences.addons[__package__].preferences.cfg_cache_budget_mb_int
     @classmethod
     def cfg_cache_loading_enabled(cls):
         return bpy.context.preferences.addons[__package__].preferences.cfg_cache_loading_enabled_bool
@@ -0,0 +1,122 @@
+from __future__ import annotations
+import atexit
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import Dict, Optional, Set
+
+from .prefs import IO_AnnocfgPreferences
+from .cfg_cache import file_stamp
+from .utils import file_lock, read_json, write_json
+
+
+class PropMetadata:
+    """The parts of a decoded .prp file the import needs.
+
+    Attributes:
+        prop_type (Optional[str]): Type of the prop, f.e. "SimplePBR", selects the shader.
+        mesh_file_name (Optional[str]): Data path of the .rdm file.
+        materials_xml (str): The Materials node as xml text, empty if the prop has none.
+    """
+    def __init__(self, prop_type: Optional[str], mesh_file_name: Optional[str], materials_xml: str):
+        self.prop_type = prop_type
+        self.mesh_file_name = mesh_file_name
+        self.materials_xml = materials_xml
+
+    @classmethod
+    def from_prop_node(cls, prop_node: ET.Element) -> PropMetadata:
+        materials = prop_node.find("Materials")
+        materials_xml = ET.tostring(materials, encoding = "unicode") if materials is not None else ""
+        return PropMetadata(prop_node.findtext("Type"), prop_node.findtext("MeshFileName"), materials_xml)
+
+    def get_materials_node(self) -> Optional[ET.Element]:
+        """Returns a new copy of the Materials node, the caller may modify it."""
+        if not self.materials_xml:
+            return None
+        return ET.fromstring(self.materials_xml)
+
+    def to_json(self) -> Dict:
+        return {"type": self.prop_type, "mesh": self.mesh_file_name, "materials": self.materials_xml}
+
+    @classmethod
+    def from_json(cls, data: Dict) -> PropMetadata:
+        return PropMetadata(data["type"], data["mesh"], data["materials"])
+
+
+class PropMetadataCache:
+    """Persistent store of PropMetadata by .prp file, so that unchanged props are never decoded with FileDBReader again.
+
+    The store is a single json file (prop_metadata.json) in the conversion cache folder or, if no conversion cache is set,
+    in the rda folder, next to the .xml files FileDBReader writes there. Entries are keyed by the absolute path
+    of the .prp file and hold its size and modification time, a changed .prp is decoded again.
+    Processes that share the store merge their new entries into it when they save.
+    """
+    file_name = "prop_metadata.json"
+    save_interval = 64 #changes before the file is written again
+
+    instance: Optional[PropMetadataCache] = None
+
+    def __init__(self, store_path: Path):
+        self.store_path = store_path
+        self.entries: Dict[str, Dict] = {}
+        self.unsaved_changes = 0
+        self.changed_files: Set[str] = set()
+        self.load()
+
+    @classmethod
+    def get_instance(cls) -> PropMetadataCache:
+        if IO_AnnocfgPreferences.conversion_cache_enabled():
+            root = IO_AnnocfgPreferences.get_conversion_cache_path()
+        else:
+            root = IO_AnnocfgPreferences.get_path_to_rda_folder()
+        store_path = Path(root, cls.file_name)
+        if cls.instance is None or cls.instance.store_path != store_path:
+            if cls.instance is not None:
+                cls.instance.save()
+            cls.instance = PropMetadataCache(store_path)
+        return cls.instance
+
+    @classmethod
+    def flush(cls):
+        """Writes pending changes of the active store."""
+        if cls.instance is not None:
+            cls.instance.save()
+
+    def load(self):
+        """Reads the store on disk and applies the unsaved entries of this process to it."""
+        entries = read_json(self.store_path).get("entries", {})
+        for key in self.changed_files:
+            entries[key] = self.entries[key]
+        self.entries = entries
+
+    def save(self):
+        if self.unsaved_changes == 0:
+            return
+        try:
+            self.store_path.parent.mkdir(parents = True, exist_ok = True)
+            with file_lock(self.store_path):
+                self.load()
+                write_json(self.store_path, {"entries": self.entries})
+            self.unsaved_changes = 0
+            self.changed_files = set()
+        except OSError as ex:
+            print(f"Warning: Could not write prop metadata {self.store_path}: {ex}")
+
+    def lookup(self, prop_file: Path) -> Optional[PropMetadata]:
+        """Returns the stored metadata of the .prp file or None if there is none or the file changed."""
+        entry = self.entries.get(str(prop_file))
+        if entry is None or entry["stamp"] != file_stamp(prop_file):
+            return None
+        return PropMetadata.from_json(entry)
+
+    def store(self, prop_file: Path, metadata: PropMetadata):
+        stamp = file_stamp(prop_file)
+        if stamp is None:
+            return
+        self.entries[str(prop_file)] = {"stamp": stamp, **metadata.to_json()}
+        self.changed_files.add(str(prop_file))
+        self.unsaved_changes += 1
+        if self.unsaved_changes >= self.save_interval:
+            self.save()
+
+
+atexit.register(PropMetadataCache.flush)
@@ -0,0 +1,341 @@
+from __future__ import annotations
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+class RdmFormatError(Exception):
+    """Raised when a .rdm file does not match any of the layouts the reader understands. Use rdm4 instead."""
+
+
+# Vertex formats as named in the material VertexFormat (P = position, N = normal, G = tangent, B = bitangent,
+# T = uv, I = bone indices, W = bone weights, C = color; h = half float, f = float, b = unsigned byte).
+vertex_formats: Dict[str, np.dtype] = {
+    "P4h_N4b_G4b_B4b_T2h": np.dtype([("P", "<f2", 4), ("N", "u1", 4), ("G", "u1", 4), ("B", "u1", 4), ("T", "<f2", 2)]),
+    "P4h_N4b_G4b_B4b_T2h_I4b": np.dtype([("P", "<f2", 4), ("N", "u1", 4), ("G", "u1", 4), ("B", "u1", 4), ("T", "<f2", 2), ("I", "u1", 4)]),
+    "P4h_N4b_G4b_B4b_T2h_I4b_W4b": np.dtype([("P", "<f2", 4), ("N", "u1", 4), ("G", "u1", 4), ("B", "u1", 4), ("T", "<f2", 2), ("I", "u1", 4), ("W", "u1", 4)]),
+    "P4h_N4b_G4b_B4b_T2h_C4b_C4b": np.dtype([("P", "<f2", 4), ("N", "u1", 4), ("G", "u1", 4), ("B", "u1", 4), ("T", "<f2", 2), ("C", "u1", 4), ("C1", "u1", 4)]),
+    "P3f_N3f_G3f_B3f_T2f_C4b": np.dtype([("P", "<f4", 3), ("N", "<f4", 3), ("G", "<f4", 3), ("B", "<f4", 3), ("T", "<f4", 2), ("C", "u1", 4)]),
+    "P4h_T2h_C4b": np.dtype([("P", "<f2", 4), ("T", "<f2", 2), ("C", "u1", 4)]),
+}
+submesh_dtype = np.dtype([("start", "<u4"), ("count", "<u4"), ("material", "<u4"), ("unknown", "u1", 16)])
+max_materials = 64
+
+# A .rdm file starts with the magic and a pointer to the header block. Every other part of the file is a block:
+# element count and element size (both uint32), followed by the elements. Pointers refer to the first element of a block.
+# header -> meta -> mesh info -> vertex elements, vertices, indices and submeshes
+rdm_magic = b"RDM\x01\x14\x00\x00\x00\x00\x00\x00\x00\x04\x00\x00\x00"
+header_size = 20
+header_dtype = np.dtype([("meta", "<u4"), ("skin", "<u4"), ("unknown", "u1", 40)])
+meta_dtype = np.dtype([("name", "<u4"), ("unknown", "u1", 4), ("mesh", "<u4"), ("unknown2", "u1", 60)])
+mesh_info_dtype = np.dtype([("elements", "<u4"), ("vertices", "<u4"), ("indices", "<u4"), ("submeshes", "<u4"),
+    ("min", "<f4", 3), ("max", "<f4", 3), ("unknown", "u1", 52)])
+# one vertex element per letter group of the vertex format, index counts elements with the same usage (f.e. the second color)
+vertex_element_dtype = np.dtype([("usage", "<u4"), ("type", "<u4"), ("count", "<u4"), ("index", "<u4")])
+element_usages = {"P": 0, "N": 1, "G": 2, "B": 3, "T": 4, "I": 5, "W": 6, "C": 7}
+element_types = {"f": 0, "h": 1, "b": 5}
+
+class RdmMesh:
+    """Geometry of a .rdm file, in the coordinates of the file (y up).
+
+    Attributes:
+        vertex_format (str): Key of vertex_formats.
+        positions (np.ndarray): Shape (n, 3).
+        normals (Optional[np.ndarray]): Shape (n, 3), unit length.
+        uvs (Optional[np.ndarray]): Shape (n, 2), with the origin in the top left corner like the .dds textures.
+        colors (Optional[np.ndarray]): Shape (n, 4), bytes.
+        triangles (np.ndarray): Vertex indices, shape (m, 3).
+        material_indices (np.ndarray): Material of each triangle, shape (m,).
+    """
+    def __init__(self, vertex_format: str, vertices: np.ndarray, triangles: np.ndarray, material_indices: np.ndarray):
+        self.vertex_format = vertex_format
+        self.positions = vertices["P"][:, :3].astype(np.float32)
+        self.normals = None
+        if "N" in vertices.dtype.names:
+            normals = vertices["N"][:, :3].astype(np.float32)
+            if vertices.dtype["N"].base == np.uint8:
+                normals = normals / 255.0 * 2.0 - 1.0
+            lengths = np.linalg.norm(normals, axis = 1, keepdims = True)
+            self.normals = normals / np.maximum(lengths, 1e-6)
+        self.uvs = vertices["T"].astype(np.float32) if "T" in vertices.dtype.names else None
+        self.colors = vertices["C"] if "C" in vertices.dtype.names else None
+        self.triangles = triangles
+        self.material_indices = material_indices
+
+    @property
+    def material_count(self) -> int:
+        return int(self.material_indices.max()) + 1 if len(self.material_indices) > 0 else 1
+
+
+def get_vertex_elements(vertex_format: str) -> np.ndarray:
+    """Returns the vertex element table of a format, f.e. P4h_T2h_C4b -> (P, h, 4, 0), (T, h, 2, 0), (C, b, 4, 0)."""
+    tokens = vertex_format.split("_")
+    elements = np.zeros(len(tokens), dtype = vertex_element_dtype)
+    for i, token in enumerate(tokens):
+        elements[i] = (element_usages[token[0]], element_types[token[2]], int(token[1]), sum(t[0] == token[0] for t in tokens[:i]))
+    return elements
+
+def get_vertex_format(elements: np.ndarray) -> Optional[str]:
+    """Returns the name of the vertex format described by the vertex element table or None if it is not in vertex_formats."""
+    usages = {code: letter for letter, code in element_usages.items()}
+    types = {code: letter for letter, code in element_types.items()}
+    tokens = []
+    for element in elements:
+        if int(element["usage"]) not in usages or int(element["type"]) not in types:
+            return None
+        tokens.append(f"{usages[int(element['usage'])]}{int(element['count'])}{types[int(element['type'])]}")
+    vertex_format = "_".join(tokens)
+    if vertex_format not in vertex_formats or get_vertex_elements(vertex_format).tobytes() != elements.tobytes():
+        return None
+    return vertex_format
+
+
+class RdmBlock:
+    """Position of a block in a .rdm file: data offset, element count and element size. The 8 byte header precedes the offset."""
+    def __init__(self, offset: int, count: int, size: int):
+        self.offset = offset
+        self.count = count
+        self.size = size
+
+    @property
+    def start(self) -> int:
+        return self.offset - 8
+
+    @property
+    def end(self) -> int:
+        return self.offset + self.count * self.size
+
+
+class RdmLayout:
+    """The mesh blocks of a .rdm file, see find_layout()."""
+    def __init__(self, vertex_format: str, vertex_block: RdmBlock, index_block: RdmBlock, submesh_block: RdmBlock):
+        self.vertex_format = vertex_format
+        self.vertex_block = vertex_block
+        self.index_block = index_block
+        self.submesh_block = submesh_block
+
+    def get_vertices(self, data: np.ndarray) -> np.ndarray:
+        block = self.vertex_block
+        return np.frombuffer(data, dtype = vertex_formats[self.vertex_format], count = block.count, offset = block.offset)
+
+    def get_indices(self, data: np.ndarray) -> np.ndarray:
+        block = self.index_block
+        return np.frombuffer(data, "<u2" if block.size == 2 else "<u4", count = block.count, offset = block.offset)
+
+    def get_submeshes(self, data: np.ndarray) -> np.ndarray:
+        return np.frombuffer(data, submesh_dtype, count = self.submesh_block.count, offset = self.submesh_block.offset)
+
+
+def read_block(data: np.ndarray, pointer: int, sizes: Tuple[int, ...], fullpath: Path, name: str) -> RdmBlock:
+    """Returns the block the pointer refers to.
+
+    Args:
+        data (np.ndarray): The file as uint8 array.
+        pointer (int): Offset of the first element.
+        sizes (Tuple[int, ...]): Element sizes the block may have.
+        fullpath (Path): The file, for error messages.
+        name (str): The block, for error messages.
+
+    Raises:
+        RdmFormatError: If the pointer or the block header is invalid.
+
+    Returns:
+        RdmBlock: The block.
+    """
+    if pointer < header_size + 8 or pointer > len(data):
+        raise RdmFormatError(f"Invalid {name} pointer {pointer} in {fullpath}")
+    count, size = np.frombuffer(data, "<u4", count = 2, offset = pointer - 8).tolist()
+    if size not in sizes or count == 0 or pointer + count * size > len(data):
+        raise RdmFormatError(f"Unexpected {name} block ({count} x {size} bytes) in {fullpath}")
+    return RdmBlock(pointer, count, size)
+
+def read_struct(data: np.ndarray, pointer: int, dtype: np.dtype, fullpath: Path, name: str) -> np.void:
+    """Reads a block with a single element of the structured type."""
+    block = read_block(data, pointer, (dtype.itemsize,), fullpath, name)
+    if block.count != 1:
+        raise RdmFormatError(f"Unexpected {name} block ({block.count} elements) in {fullpath}")
+    return np.frombuffer(data, dtype, count = 1, offset = pointer)[0]
+
+def find_layout(data: np.ndarray, fullpath: Path) -> RdmLayout:
+    """Reads the positions of vertex, index and submesh block and the vertex format from the header and the mesh info of a .rdm file.
+
+    Args:
+        data (np.ndarray): The file as uint8 array.
+        fullpath (Path): The file, for error messages.
+
+    Raises:
+        RdmFormatError: If the file uses a vertex format that is not in vertex_formats or its structure is not the expected one.
+
+    Returns:
+        RdmLayout: The layout.
+    """
+    if len(data) < header_size + 8 or data[:len(rdm_magic)].tobytes() != rdm_magic:
+        raise RdmFormatError(f"{fullpath} is not a .rdm file")
+    header = read_struct(data, int(np.frombuffer(data, "<u4", count = 1, offset = len(rdm_magic))[0]), header_dtype, fullpath, "header")
+    meta = read_struct(data, int(header["meta"]), meta_dtype, fullpath, "meta")
+    mesh_info = read_struct(data, int(meta["mesh"]), mesh_info_dtype, fullpath, "mesh info")
+
+    element_block = read_block(data, int(mesh_info["elements"]), (vertex_element_dtype.itemsize,), fullpath, "vertex element")
+    elements = np.frombuffer(data, vertex_element_dtype, count = element_block.count, offset = element_block.offset)
+    vertex_format = get_vertex_format(elements)
+    if vertex_format is None:
+        raise RdmFormatError(f"Unsupported vertex format in {fullpath}")
+    vertex_block = read_block(data, int(mesh_info["vertices"]), (vertex_formats[vertex_format].itemsize,), fullpath, "vertex")
+    index_block = read_block(data, int(mesh_info["indices"]), (2, 4), fullpath, "index")
+    if index_block.count % 3 != 0:
+        raise RdmFormatError(f"Index count {index_block.count} of {fullpath} is not a multiple of 3")
+    submesh_block = read_block(data, int(mesh_info["submeshes"]), (submesh_dtype.itemsize,), fullpath, "submesh")
+    layout = RdmLayout(vertex_format, vertex_block, index_block, submesh_block)
+
+    if int(layout.get_indices(data).max()) >= vertex_block.count:
+        raise RdmFormatError(f"Vertex indices out of range in {fullpath}")
+    # submeshes cover the index buffer without gaps, each with its material
+    submeshes = layout.get_submeshes(data)
+    submeshes = submeshes[np.argsort(submeshes["start"], kind = "stable")]
+    starts = submeshes["start"].astype(np.int64)
+    ends = starts + submeshes["count"]
+    if starts[0] != 0 or ends[-1] != index_block.count or np.any(starts[1:] != ends[:-1]) \
+            or np.any(submeshes["count"] % 3 != 0) or np.any(submeshes["material"] >= max_materials):
+        raise RdmFormatError(f"Invalid submeshes in {fullpath}")
+    return layout
+
+def read_rdm(fullpath: Path) -> RdmMesh:
+    """Reads vertices, triangles and submeshes of a .rdm model.
+
+    Args:
+        fullpath (Path): The .rdm file.
+
+    Raises:
+        RdmFormatError: If the file uses a vertex format that is not in vertex_formats or its layout is not understood.
+
+    Returns:
+        RdmMesh: The mesh.
+    """
+    data = np.fromfile(fullpath, dtype = np.uint8)
+    layout = find_layout(data, fullpath)
+    vertices = layout.get_vertices(data)
+    if not np.all(np.isfinite(vertices["P"][:, :3])):
+        raise RdmFormatError(f"Invalid vertex positions in {fullpath}")
+    triangles = layout.get_indices(data).astype(np.int32).reshape(-1, 3)
+    submeshes = layout.get_submeshes(data)
+    submeshes = submeshes[np.argsort(submeshes["start"], kind = "stable")]
+    material_indices = np.repeat(submeshes["material"].astype(np.int32), submeshes["count"] // 3)
+    return RdmMesh(layout.vertex_format, vertices, triangles, material_indices)
+
+
+def pack_unit_vectors(vectors: np.ndarray) -> np.ndarray:
+    """Packs components in [-1, 1] into bytes, the inverse of b / 255 * 2 - 1."""
+    return np.clip(np.round((vectors * 0.5 + 0.5) * 255.0), 0, 255).astype(np.uint8)
+
+def pack_vertices(vertex_format: str, positions: np.ndarray, normals: np.ndarray, tangents: np.ndarray,
+        bitangents: np.ndarray, uvs: np.ndarray, colors: List[np.ndarray], bone_indices: Optional[np.ndarray], bone_weights: Optional[np.ndarray]) -> np.ndarray:
+    """Packs per vertex attributes (in the coordinates of the file) into the structured vertex type of the format.
+    The fourth component of positions, normals, tangents and bitangents is written as 1.
+
+    Args:
+        vertex_format (str): Key of vertex_formats.
+        positions, normals, tangents, bitangents (np.ndarray): Shape (n, 3).
+        uvs (np.ndarray): Shape (n, 2), with the origin in the top left corner.
+        colors (List[np.ndarray]): Color layers, each with shape (n, 4) in [0, 1].
+        bone_indices, bone_weights (Optional[np.ndarray]): Shape (n, 4), weights in [0, 1]. Only needed for formats with I4b and W4b.
+
+    Returns:
+        np.ndarray: The vertices.
+    """
+    dtype = vertex_formats[vertex_format]
+    vertices = np.zeros(len(positions), dtype = dtype)
+    vectors = {"P": positions, "N": normals, "G": tangents, "B": bitangents}
+    for name, values in vectors.items():
+        if name not in dtype.names:
+            continue
+        if dtype[name].base == np.uint8:
+            vertices[name][:, :3] = pack_unit_vectors(values)
+            if dtype[name].shape[0] == 4:
+                vertices[name][:, 3] = 255
+        else:
+            vertices[name][:, :3] = values
+            if dtype[name].shape[0] == 4:
+                vertices[name][:, 3] = 1.0
+    vertices["T"] = uvs
+    for name, layer in zip(["C", "C1"], colors):
+        if name in dtype.names:
+            vertices[name] = np.clip(np.round(layer * 255.0), 0, 255).astype(np.uint8)
+    if "I" in dtype.names:
+        vertices["I"] = bone_indices
+    if "W" in dtype.names:
+        weights = np.round(bone_weights * 255.0).astype(np.int32)
+        # the weights of a vertex have to add up to 255
+        weights[:, 0] += 255 - weights.sum(axis = 1)
+        vertices["W"] = np.clip(weights, 0, 255)
+    return vertices
+
+def merge_corners(corner_vertices: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Merges equal face corners into one vertex, keeping the order of their first use.
+
+    Args:
+        corner_vertices (np.ndarray): Packed vertex of every triangle corner.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The vertices and the vertex index of every corner.
+    """
+    raw = np.ascontiguousarray(corner_vertices).view(np.dtype((np.void, corner_vertices.dtype.itemsize)))
+    _, first, inverse = np.unique(raw, return_index = True, return_inverse = True)
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return corner_vertices[first[order]], rank[inverse.ravel()]
+
+def write_rdm(output_path: Path, vertex_format: str, vertices: np.ndarray, indices: np.ndarray, material_indices: np.ndarray):
+    """Writes the mesh as .rdm file in one pass: header, meta, mesh info, vertex elements, vertices, indices and submeshes.
+
+    Args:
+        output_path (Path): The new file. An existing file is replaced once the new one is complete.
+        vertex_format (str): Key of vertex_formats.
+        vertices (np.ndarray): Packed vertices, see pack_vertices().
+        indices (np.ndarray): Vertex indices, three per triangle.
+        material_indices (np.ndarray): Material of each triangle.
+
+    Raises:
+        RdmFormatError: If the mesh has no triangles.
+    """
+    if len(material_indices) == 0:
+        raise RdmFormatError(f"{output_path.name} has no triangles")
+    # submeshes need continuous index ranges
+    order = np.argsort(material_indices, kind = "stable")
+    triangles = indices.reshape(-1, 3)[order]
+    materials, counts = np.unique(material_indices[order], return_counts = True)
+    submeshes = np.zeros(len(materials), dtype = submesh_dtype)
+    submeshes["start"] = np.concatenate([[0], np.cumsum(counts[:-1] * 3)])
+    submeshes["count"] = counts * 3
+    submeshes["material"] = materials
+    index_data = triangles.astype("<u2" if len(vertices) <= 0xFFFF else "<u4").ravel()
+
+    header = np.zeros(1, dtype = header_dtype)
+    meta = np.zeros(1, dtype = meta_dtype)
+    name = np.frombuffer(output_path.stem.encode("utf-8"), dtype = np.uint8)
+    mesh_info = np.zeros(1, dtype = mesh_info_dtype)
+    positions = vertices["P"][:, :3].astype(np.float32)
+    mesh_info["min"] = positions.min(axis = 0)
+    mesh_info["max"] = positions.max(axis = 0)
+    blocks = [header, meta, name, mesh_info, get_vertex_elements(vertex_format), vertices, index_data, submeshes]
+
+    # every pointer refers to a later block, so all offsets are known before anything is written
+    offsets = []
+    position = header_size
+    for block in blocks:
+        offsets.append(position + 8)
+        position += 8 + block.nbytes
+    header["meta"] = offsets[1]
+    meta["name"] = offsets[2]
+    meta["mesh"] = offsets[3]
+    mesh_info["elements"], mesh_info["vertices"], mesh_info["indices"], mesh_info["submeshes"] = offsets[4:8]
+
+    tmp_path = output_path.with_suffix(".rdm.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(rdm_magic)
+        f.write(np.array([offsets[0]], dtype = "<u4").tobytes())
+        for block in blocks:
+            f.write(np.array([len(block), block.dtype.itemsize], dtype = "<u4").tobytes())
+            f.write(block.tobytes())
+    tmp_path.replace(output_path)
@@ -1,6 +1,6 @@
 import bpy
 import xml.etree.ElementTree as ET
-from .shader_components import AbstractShaderComponent, AbstractLink
+from .shader_components import AbstractShaderComponent, AbstractLink, request_textures
 from ..utils import xml_smart
 
 class AnnoBasicShader: 
@@ -66,11 +66,21 @@ class AnnoBasicShader:
         material.node_tree.nodes.remove(nodes["Principled BSDF"])
         links.new(nodes["Material Output"].inputs["Surface"], shader.outputs["Shader"])
 
+        request_textures(self.get_required_textures(material_node))
         for link in self.links:
             link.to_blender(shader, material_node, material)
 
         return material
 
+    def get_required_textures(self, material_node : ET.Element):
+        """Lists the .dds data paths that to_blender_material will load for this material node."""
+        textures = []
+        for link in self.links:
+            texture_path = link.get_required_texture(material_node)
+            if texture_path is not None:
+                textures.append(texture_path)
+        return textures
+
     def add_anno_shader(self, nodes):
         group = nodes.new(type='ShaderNodeGroup')
         group.label = self.shader_id
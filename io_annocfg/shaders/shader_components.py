@@ -3,9 +3,14 @@ import mathutils
 from ..utils import to_data_path, data_path_to_absolute_path
 import os
 from pathlib import Path
+from typing import List, Optional
 from ..prefs import IO_AnnocfgPreferences
+from ..conversion_cache import find_converted_file, get_output_dir, register_converted_file, is_in_conversion_cache
+from ..cfg_cache import DependencyRecorder
+from ..dds import DdsFormatError, convert_dds_to_png_directly, decode_dds
+from ..texconv_queue import TexconvQueue
 import bpy
-import subprocess
+import numpy as np
 import logging 
 
 log = logging.getLogger("ShaderComponents")
@@ -13,6 +18,136 @@ log = logging.getLogger("ShaderComponents")
 def texture_quality_suffix():
     return "_"+IO_AnnocfgPreferences.get_texture_quality()
 
+def texture_dds_path(texture_path: Path) -> Path:
+    """Maps the texture path of a material (f.e. "data/.../texture_diffuse.psd") to the .dds file of the selected quality.
+
+    Args:
+        texture_path (Path): Texture path as written in the material node.
+
+    Returns:
+        Path: f.e. "data/.../texture_diffuse_0.dds"
+    """
+    texture_path = Path(texture_path)
+    return Path(texture_path.parent, texture_path.stem + texture_quality_suffix()+".dds")
+
+def use_native_dds_decoder() -> bool:
+    return IO_AnnocfgPreferences.native_dds_import() or not IO_AnnocfgPreferences.get_path_to_texconv().exists()
+
+def convert_dds_to_png(fullpath: Path) -> Optional[Path]:
+    """Converts the .dds file to .png, with the built-in decoder (see use_native_dds_decoder) or texconv.
+
+    Args:
+        fullpath (Path): .dds file
+
+    Returns:
+        Optional[Path]: The .png file or None if the conversion failed.
+    """
+    if not fullpath.exists():
+        return None
+    output_dir = get_output_dir(fullpath, ".png")
+    if use_native_dds_decoder() and convert_dds_to_png_directly(fullpath, output_dir):
+        return register_converted_file(fullpath, Path(output_dir, fullpath.stem + ".png"))
+    queue = TexconvQueue.get_instance()
+    if queue is None:
+        return None
+    return queue.wait(fullpath)
+
+def request_textures(texture_paths: List[Path]):
+    """Starts the texconv conversion of all textures that are not converted yet, in batches.
+    Called before a material loads its textures, so that it only waits for the batches that contain them.
+
+    Args:
+        texture_paths (List[Path]): .dds data paths, f.e. "data/.../texture_diffuse_0.dds"
+    """
+    if use_native_dds_decoder():
+        return
+    queue = TexconvQueue.get_instance()
+    if queue is None:
+        return
+    for texture_path in texture_paths:
+        fullpath = data_path_to_absolute_path(texture_path)
+        if fullpath.exists() and find_converted_file(fullpath, ".png") is None:
+            queue.request(fullpath)
+    queue.flush()
+
+def decode_texture(fullpath: Path, png_file: Path):
+    """Decodes the .dds file into a new image and writes it through as .png (to the conversion cache, if enabled),
+    so that the image is stored like a converted one. If the .png cannot be written, the image is packed instead.
+
+    Args:
+        fullpath (Path): .dds file
+        png_file (Path): Data path of the .png file, f.e. "data/.../texture_diffuse_0.png"
+
+    Returns:
+        [type]: The image or None if the format is not supported.
+    """
+    try:
+        pixels = decode_dds(fullpath)
+    except (DdsFormatError, OSError, ValueError) as ex:
+        print(f"Decoding {fullpath} failed: {ex}")
+        return None
+    height, width = pixels.shape[:2]
+    image = bpy.data.images.new(png_file.name, width, height, alpha = True)
+    # blender stores the bottom row first
+    image.pixels.foreach_set((pixels[::-1].astype(np.float32) / 255.0).ravel())
+    png_fullpath = Path(get_output_dir(fullpath, ".png"), fullpath.stem + ".png")
+    image.filepath_raw = str(png_fullpath)
+    image.file_format = 'PNG'
+    try:
+        image.save()
+        register_converted_file(fullpath, png_fullpath)
+    except RuntimeError as ex:
+        print(f"Could not write {png_fullpath}, packing the texture instead: {ex}")
+        image.pack()
+    return image
+
+def image_to_data_path(image) -> Path:
+    """Returns the data path of the (.png) file of a loaded texture, f.e. "data/.../texture_diffuse_0.png".
+    Also works for images that were loaded from the conversion cache.
+    """
+    filepath_full = os.path.realpath(bpy.path.abspath(image.filepath, library=image.library))
+    anno_data_path = image.get("anno_data_path")
+    if anno_data_path is not None and is_in_conversion_cache(filepath_full):
+        return Path(anno_data_path)
+    return to_data_path(filepath_full)
+
+def load_texture(texture_path: Path):
+    """Tries to find the texture texture_path with ending "_0.png" (quality setting can be changed) in the list of loaded textures.
+    Otherwise loads it. If it is not existing but the corresponding .dds exists, converts it first.
+
+    Args:
+        texture_path (str): f.e. "data/.../texture_diffuse.psd"
+
+    Returns:
+        [type]: The texture or None.
+    """
+    if texture_path == Path(""):
+        return None
+    texture_path = texture_dds_path(texture_path)
+    png_file = texture_path.with_suffix(".png")
+    fullpath = data_path_to_absolute_path(texture_path)
+    DependencyRecorder.record(fullpath)
+    png_fullpath = find_converted_file(fullpath, ".png")
+    if png_fullpath is None and fullpath.exists() and use_native_dds_decoder():
+        image = decode_texture(fullpath, png_file)
+        if image is not None:
+            image["anno_data_path"] = png_file.as_posix()
+            return image
+    if png_fullpath is None:
+        png_fullpath = convert_dds_to_png(fullpath)
+        if png_fullpath is None:
+            print("Failed to convert texture", fullpath)
+            return None
+    image = bpy.data.images.get(str(png_file.name), None)
+    if image is not None:
+        image_path_full = os.path.normpath(bpy.path.abspath(image.filepath, library=image.library))
+        if str(image_path_full) == str(png_fullpath):
+            return image
+    image = bpy.data.images.load(str(png_fullpath))
+    # The .png may live in the conversion cache, remember where it belongs for the export.
+    image["anno_data_path"] = png_file.as_posix()
+    return image
+
 class AbstractLink: 
     def __init__(self, default_value = None, is_invalid = False):
         self.socket_type = ""
@@ -33,6 +168,10 @@ class AbstractLink:
     def to_blender(self, shader, material_node : ET.Element, blender_material):
         return 
 
+    def get_required_texture(self, material_node : ET.Element) -> Optional[Path]:
+        """Returns the .dds data path that to_blender would load for this material node, if any."""
+        return None
+
     def get_input(self, blender_material):
         group = [n for n in blender_material.node_tree.nodes if n.bl_idname == "ShaderNodeGroup"]
         return group[0].inputs.get(self.link_key)
@@ -73,8 +212,7 @@ class FlaglessTextureLink(AbstractLink):
             return
         
         texture_node = link[0].from_node
-        filepath_full = os.path.realpath(bpy.path.abspath(texture_node.image.filepath, library=texture_node.image.library))
-        texture_path = to_data_path(filepath_full)
+        texture_path = image_to_data_path(texture_node.image)
         #Rename "data/.../some_diff_0.png" to "data/.../some_diff.psd"
         extension = ".psd"
         texture_path = Path(texture_path.as_posix().replace(texture_quality_suffix()+".", ".")).with_suffix(extension)
@@ -107,34 +245,7 @@ class FlaglessTextureLink(AbstractLink):
             blender_material.node_tree.links.new(shader.inputs[self.alpha_link], texture_node.outputs["Alpha"])
 
     def get_texture(self, texture_path: Path):
-        """Tries to find the texture texture_path with ending "_0.png" (quality setting can be changed) in the list of loaded textures.
-        Otherwise loads it. If it is not existing but the corresponding .dds exists, converts it first.
-
-        Args:
-            texture_path (str): f.e. "data/.../texture_diffuse.psd"
-
-        Returns:
-            [type]: The texture or None.
-        """
-        if texture_path == Path(""):
-            return None
-        texture_path = Path(texture_path)
-        texture_path = Path(texture_path.parent, texture_path.stem + texture_quality_suffix()+".dds")
-        png_file = texture_path.with_suffix(".png")
-        fullpath = data_path_to_absolute_path(texture_path)
-        png_fullpath = data_path_to_absolute_path(png_file)
-        image = bpy.data.images.get(str(png_file.name), None)
-        if image is not None:
-            image_path_full = os.path.normpath(bpy.path.abspath(image.filepath, library=image.library))
-            if str(image_path_full) == str(png_fullpath):
-                return image
-        if not png_fullpath.exists():
-            success = self.convert_to_png(fullpath)
-            if not success:
-                print("Failed to convert texture", fullpath)
-                return None
-        image = bpy.data.images.load(str(png_fullpath))
-        return image
+        return load_texture(texture_path)
 
     def convert_to_png(self, fullpath: Path) -> bool:
         """Converts the .dds file to .png. Returns True if successful, False otherwise.
@@ -145,16 +256,13 @@ class FlaglessTextureLink(AbstractLink):
         Returns:
             bool: Successful
         """
-        if not IO_AnnocfgPreferences.get_path_to_texconv().exists():
-            return False
-        if not fullpath.exists():
-            return False
-        try:
-            proc_args = f"\"{IO_AnnocfgPreferences.get_path_to_texconv()}\" -ft PNG -sepalpha -y -o \"{fullpath.parent}\" \"{fullpath}\""
-            subprocess.call(proc_args)
-        except:
-            return False
-        return fullpath.with_suffix(".png").exists()
+        return convert_dds_to_png(fullpath) is not None
+
+    def get_required_texture(self, material_node : ET.Element) -> Optional[Path]:
+        texture_xmlnode = material_node.find(self.texture_key)
+        if texture_xmlnode is None or not texture_xmlnode.text:
+            return None
+        return texture_dds_path(Path(texture_xmlnode.text))
       
 
 class TextureLink(FlaglessTextureLink): 
@@ -183,6 +291,12 @@ class TextureLink(FlaglessTextureLink):
         if (flag.text == "1"):
             super().to_blender(shader, material_node, blender_material)
 
+    def get_required_texture(self, material_node : ET.Element) -> Optional[Path]:
+        flag = material_node.find(self.flag_key)
+        if flag is None or flag.text != "1":
+            return None
+        return super().get_required_texture(material_node)
+
 class FlagLink(AbstractLink): 
     def __init__(self, link_key, flag_key, is_invalid = False, default_value = None):
         super().__init__(default_value, is_invalid)
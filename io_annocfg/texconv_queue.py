@@ -0,0 +1,146 @@
+from __future__ import annotations
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .prefs import IO_AnnocfgPreferences
+from .conversion_cache import get_output_dir, register_converted_file
+
+
+def run_texconv_batch(texconv_path: Path, jobs: List[Tuple[Path, Path]]) -> List[bool]:
+    """Converts several .dds files to .png with a single texconv process. Does not access blender data,
+    so it can run on a worker thread.
+
+    texconv writes all results of one call into the same folder, so they are written to a temporary folder first
+    and then moved to their own output folders. The stems of the files in one batch must be unique.
+
+    Args:
+        texconv_path (Path): texconv.exe
+        jobs (List[Tuple[Path, Path]]): (.dds file, output folder) pairs.
+
+    Returns:
+        List[bool]: Whether the .png of each job was written.
+    """
+    staging_dir = Path(tempfile.mkdtemp(prefix = "anno_texconv_"))
+    try:
+        args = [str(texconv_path), "-ft", "PNG", "-sepalpha", "-y", "-o", str(staging_dir)] + [str(fullpath) for fullpath, _ in jobs]
+        try:
+            subprocess.call(args)
+        except OSError as ex:
+            print(f"Failed to run texconv: {ex}")
+            return [False] * len(jobs)
+        results = []
+        for fullpath, output_dir in jobs:
+            png_file = Path(staging_dir, fullpath.stem + ".png")
+            if png_file.exists():
+                shutil.move(str(png_file), str(Path(output_dir, png_file.name)))
+            results.append(Path(output_dir, png_file.name).exists())
+        return results
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors = True)
+
+
+class TexconvQueue:
+    """Collects .dds -> .png conversions and runs them as multi-file texconv batches on a pool of worker threads.
+
+    Requests are deduplicated and only queued, a flush() starts them in batches of up to batch_size files,
+    spread over conversion_workers_int concurrent texconv processes. Materials request all of their textures first
+    (see request_textures in shader_components) and then wait() for each texture they load, so they only wait
+    for the batches that contain their own textures.
+    Output folders are resolved and results are registered in the conversion cache on the main thread.
+
+    Usage:
+        queue = TexconvQueue.get_instance()
+        queue.request(dds_fullpath)
+        png_fullpath = queue.wait(dds_fullpath)
+    """
+    batch_size = 16
+
+    instance: Optional[TexconvQueue] = None
+
+    def __init__(self, texconv_path: Path, max_workers: int):
+        self.texconv_path = texconv_path
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers = max_workers, thread_name_prefix = "texconv")
+        self.queued: Dict[Path, Path] = {} #.dds file -> output folder
+        self.futures: Dict[Path, Future] = {}
+
+    @classmethod
+    def get_instance(cls) -> Optional[TexconvQueue]:
+        """Returns the queue for the texconv path and worker count from the preferences or None if texconv does not exist."""
+        texconv_path = IO_AnnocfgPreferences.get_path_to_texconv()
+        if not texconv_path.exists():
+            return None
+        max_workers = max(1, IO_AnnocfgPreferences.get_conversion_worker_count())
+        if cls.instance is None or cls.instance.texconv_path != texconv_path or cls.instance.max_workers != max_workers:
+            if cls.instance is not None:
+                cls.instance.shutdown()
+            cls.instance = TexconvQueue(texconv_path, max_workers)
+        return cls.instance
+
+    def request(self, fullpath: Path):
+        """Queues the conversion of the .dds file, unless it is already queued or running."""
+        if fullpath in self.queued or fullpath in self.futures:
+            return
+        self.queued[fullpath] = get_output_dir(fullpath, ".png")
+
+    def flush(self):
+        """Starts all queued conversions."""
+        self.register_finished()
+        if not self.queued:
+            return
+        batches: List[List[Tuple[Path, Path]]] = []
+        for fullpath, output_dir in self.queued.items():
+            # texconv names its results after the input stem, so equal stems must go to different batches
+            batch = next((b for b in batches if len(b) < self.batch_size and all(p.stem != fullpath.stem for p, _ in b)), None)
+            if batch is None:
+                batch = []
+                batches.append(batch)
+            batch.append((fullpath, output_dir))
+        self.queued = {}
+        for batch in batches:
+            batch_future = self.executor.submit(run_texconv_batch, self.texconv_path, batch)
+            for i, (fullpath, output_dir) in enumerate(batch):
+                self.futures[fullpath] = self.chain(batch_future, i, Path(output_dir, fullpath.stem + ".png"))
+
+    @staticmethod
+    def chain(batch_future: Future, index: int, png_file: Path) -> Future:
+        """Returns a future for a single file of a batch, resolving to its .png file or None."""
+        future = Future()
+        def resolve(done: Future):
+            try:
+                future.set_result(png_file if done.result()[index] else None)
+            except Exception as ex:
+                future.set_exception(ex)
+        batch_future.add_done_callback(resolve)
+        return future
+
+    def wait(self, fullpath: Path) -> Optional[Path]:
+        """Waits until the .dds file is converted (requesting it if necessary) and registers the result in the conversion cache.
+
+        Returns:
+            Optional[Path]: The .png file or None if the conversion failed.
+        """
+        self.request(fullpath)
+        if fullpath in self.queued:
+            self.flush()
+        future = self.futures.pop(fullpath)
+        try:
+            png_file = future.result()
+        except Exception as ex:
+            print(f"Conversion of {fullpath} failed: {ex}")
+            return None
+        if png_file is None:
+            return None
+        return register_converted_file(fullpath, png_file)
+
+    def register_finished(self):
+        """Registers the results of finished conversions that were not waited for, f.e. the ones requested by the prefetcher."""
+        for fullpath in [p for p, future in self.futures.items() if future.done()]:
+            self.wait(fullpath)
+
+    def shutdown(self):
+        self.executor.shutdown(wait = True)
@@ -6,6 +6,7 @@ import xml.etree.ElementTree as ET
 from pathlib import Path
 from typing import Tuple, List, NewType, Any, Union, Dict, Optional, TypeVar, Type
 import bmesh
+import numpy as np
 from math import radians
 from .prefs import IO_AnnocfgPreferences
 from .utils import *
@@ -110,6 +111,33 @@ class Transform:
         
         self.anno_coords = False
 
+    @classmethod
+    def anno_to_blender_coords_arrays(cls, locations: np.ndarray, rotations: np.ndarray, scales: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Vectorized convert_to_blender_coords for many transforms at once.
+
+        Args:
+            locations (np.ndarray): Anno locations, shape (n, 3).
+            rotations (np.ndarray): Anno quaternions in wxyz order, shape (n, 4).
+            scales (np.ndarray): Anno scales, shape (n, 3).
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: Blender locations, quaternions (wxyz) and scales.
+        """
+        if IO_AnnocfgPreferences.mirror_models():
+            location_signs, rotation_signs = [-1, -1, 1], [1, 1, 1, -1]
+        else:
+            location_signs, rotation_signs = [1, -1, 1], [1, 1, 1, 1]
+        return locations[:, [0, 2, 1]] * location_signs, rotations[:, [0, 1, 3, 2]] * rotation_signs, scales[:, [0, 2, 1]]
+
+    @classmethod
+    def blender_to_anno_coords_arrays(cls, locations: np.ndarray, rotations: np.ndarray, scales: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Vectorized convert_to_anno_coords for many transforms at once. Inverse of anno_to_blender_coords_arrays."""
+        if IO_AnnocfgPreferences.mirror_models():
+            location_signs, rotation_signs = [-1, 1, -1], [1, 1, -1, 1]
+        else:
+            location_signs, rotation_signs = [1, 1, -1], [1, 1, 1, 1]
+        return locations[:, [0, 2, 1]] * location_signs, rotations[:, [0, 1, 3, 2]] * rotation_signs, scales[:, [0, 2, 1]]
+
     def convert_to_anno_coords(self):
         if self.anno_coords:
             return
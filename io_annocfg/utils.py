@@ -1,10 +1,15 @@
 from __future__ import annotations
 import bpy
+import json
+import os
+import time
+from contextlib import contextmanager
 from pathlib import Path
 from .prefs import IO_AnnocfgPreferences
 
 import xml.etree.ElementTree as ET
 import re
+import numpy as np
 from typing import Tuple, List, NewType, Any, Union, Dict, Optional, TypeVar, Type
 
 def data_path_to_absolute_path(path):
@@ -146,9 +151,115 @@ def xml_smart(parent : ET.Element, key, value):
         return 
     xml_default(parent, key, value)
 
-def strip_invalid_brackets(file_path):
+def parse_float_texts(texts: List[str], width: int) -> np.ndarray:
+    """Parses space separated float texts with decimal commas (f.e. "153,76723 0,1976307 31,871208") in one sweep.
+
+    Args:
+        texts (List[str]): The texts, each with width values.
+        width (int): Number of values per text.
+
+    Returns:
+        np.ndarray: Array of shape (len(texts), width).
+    """
+    tokens = " ".join(texts).replace(",", ".").split()
+    if len(tokens) != len(texts) * width:
+        raise ValueError(f"Expected {len(texts) * width} values, got {len(tokens)}")
+    return np.array(tokens, dtype = np.float64).reshape(len(texts), width)
+
+invalid_brackets_pattern = re.compile(r'(<\/?\w+)\s+\[\w+\](?=[^>]*>)')
+#unicode control characters and ';'
+stripped_characters = dict.fromkeys([*range(0x00, 0x20), *range(0x7f, 0xa0), ord(';')])
+max_unfinished_tag_length = 1 << 24 #only reached by malformed files, keeps the carried text bounded
+
+def sanitize_xml_text(xml_text: str) -> str:
+    """Removes type annotations like <Tag [String]>, unicode control characters and ';' from xml text.
+    Works on partial documents, as long as the text is not split inside a tag (see iter_sanitized_chunks).
+    """
+    stripped = invalid_brackets_pattern.sub(r'\1', xml_text)
+    return stripped.translate(stripped_characters)
+
+def iter_sanitized_chunks(file_path, chunk_size: int = 1 << 20):
+    """Reads the file in chunks and yields the sanitized text.
+    Incomplete tags at the end of a chunk are carried over to the next one, so the result is identical to sanitizing the whole text at once.
+
+    Args:
+        file_path (Path): The xml file.
+        chunk_size (int, optional): Characters read at once. Defaults to 1 << 20.
+    """
+    carry = ""
     with open(file_path, 'r', encoding='utf-8') as f:
-        xml_text = f.read()
-    stripped =  re.sub(r'(<\/?\w+)\s+\[\w+\](?=[^>]*>)', r'\1', xml_text)
-    stripped =  re.sub(r'[\x00-\x1f\x7f-\x9f]', '', stripped) #remove unicode control characters
-    return stripped.replace(';', '')
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            text = carry + chunk
+            # Everything from the first "<" after the last ">" could belong to an unfinished tag.
+            split = text.find("<", text.rfind(">") + 1)
+            if split == -1 or len(text) - split > max_unfinished_tag_length:
+                split = len(text)
+            carry = text[split:]
+            yield sanitize_xml_text(text[:split])
+    if carry:
+        yield sanitize_xml_text(carry)
+
+def strip_invalid_brackets(file_path):
+    return "".join(iter_sanitized_chunks(file_path))
+
+def parse_sanitized_xml(file_path) -> ET.ElementTree:
+    """Parses the xml file while sanitizing it, without holding the whole text in memory.
+
+    Args:
+        file_path (Path): The xml file.
+
+    Returns:
+        ET.ElementTree: The parsed tree.
+    """
+    parser = ET.XMLParser()
+    for chunk in iter_sanitized_chunks(file_path):
+        parser.feed(chunk)
+    return ET.ElementTree(parser.close())
+
+@contextmanager
+def file_lock(path: Path, stale_after: float = 60.0):
+    """Lets only one process at a time merge its changes into the json file at path.
+    Several processes can share a cache folder, f.e. the workers of an asset library build.
+
+    Args:
+        path (Path): The file to protect, the lock is a .lock file next to it.
+        stale_after (float, optional): Seconds after which a lock is considered left over from a crashed process.
+    """
+    lock_path = path.with_name(path.name + ".lock")
+    while True:
+        try:
+            os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            break
+        except FileExistsError:
+            try:
+                if time.time() - lock_path.stat().st_mtime > stale_after:
+                    lock_path.unlink(missing_ok = True)
+                    continue
+            except OSError:
+                continue
+            time.sleep(0.05)
+    try:
+        yield
+    finally:
+        lock_path.unlink(missing_ok = True)
+
+def read_json(path: Path) -> Dict:
+    """Returns the content of the json file or an empty dict if it does not exist or cannot be read."""
+    if not path.exists():
+        return {}
+    try:
+        with open(path, "r", encoding = "utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as ex:
+        print(f"Warning: Could not read {path}: {ex}")
+        return {}
+
+def write_json(path: Path, data: Dict):
+    """Replaces the json file atomically. The temporary file is named after the process, so that processes never write into each other's files."""
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "w", encoding = "utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
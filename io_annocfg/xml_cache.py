@@ -0,0 +1,96 @@
+from __future__ import annotations
+import pickle
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Tuple
+
+from .utils import parse_sanitized_xml
+from .conversion_cache import ConversionCache
+
+
+class ParsedXMLCache:
+    """Caches sanitized and parsed xml files (.cfg, .ifo, .cf7, decoded .prp, ...).
+
+    Parsed trees are kept pickled, both in a small in-session LRU and, if a conversion cache folder is set,
+    on disk next to the other conversion results. Callers usually modify the trees they get (get_text_and_delete etc.),
+    therefore every call returns a fresh copy that is unpickled from the cached bytes.
+    Entries are keyed by path, size and modification time of the xml file.
+    """
+    session_capacity = 128
+    max_cached_file_size = 16 * 1024 * 1024 #larger files (islands, gamedata) are parsed every time
+    suffix = ".etree"
+
+    session_trees: OrderedDict[Tuple[str, int, int], bytes] = OrderedDict()
+
+    @classmethod
+    def parse_uncached(cls, absolute_path) -> ET.ElementTree:
+        return parse_sanitized_xml(absolute_path)
+
+    @classmethod
+    def parse(cls, absolute_path) -> ET.ElementTree:
+        """Parses the xml file after removing invalid characters, using cached results when the file did not change.
+
+        Args:
+            absolute_path (Path): The xml file.
+
+        Returns:
+            ET.ElementTree: The parsed tree. The caller may modify it.
+        """
+        absolute_path = Path(absolute_path)
+        stat = absolute_path.stat()
+        if stat.st_size > cls.max_cached_file_size:
+            return cls.parse_uncached(absolute_path)
+        key = (str(absolute_path), stat.st_size, stat.st_mtime_ns)
+
+        data = cls.session_trees.get(key)
+        if data is not None:
+            cls.session_trees.move_to_end(key)
+            return ET.ElementTree(pickle.loads(data))
+
+        cache = ConversionCache.get_instance()
+        root = cls.load_from_disk(cache, absolute_path)
+        if root is not None:
+            data = pickle.dumps(root, protocol = pickle.HIGHEST_PROTOCOL)
+        else:
+            root = cls.parse_uncached(absolute_path).getroot()
+            data = pickle.dumps(root, protocol = pickle.HIGHEST_PROTOCOL)
+            cls.store_on_disk(cache, absolute_path, data)
+            root = pickle.loads(data)
+
+        cls.session_trees[key] = data
+        if len(cls.session_trees) > cls.session_capacity:
+            cls.session_trees.popitem(last = False)
+        return ET.ElementTree(root)
+
+    @classmethod
+    def load_from_disk(cls, cache: Optional[ConversionCache], absolute_path: Path) -> Optional[ET.Element]:
+        if cache is None:
+            return None
+        cached_file = cache.lookup(absolute_path, cls.suffix)
+        if cached_file is None:
+            return None
+        try:
+            with open(cached_file, "rb") as f:
+                return pickle.load(f)
+        except Exception as ex:
+            print(f"Warning: Discarding cached xml tree {cached_file}: {ex}")
+            return None
+
+    @classmethod
+    def store_on_disk(cls, cache: Optional[ConversionCache], absolute_path: Path, data: bytes):
+        if cache is None:
+            return
+        output_dir = cache.get_output_dir(absolute_path, cls.suffix)
+        cached_file = Path(output_dir, absolute_path.name + cls.suffix)
+        try:
+            with open(cached_file, "wb") as f:
+                f.write(data)
+        except OSError as ex:
+            print(f"Warning: Could not cache xml tree of {absolute_path}: {ex}")
+            return
+        cache.add(absolute_path, cached_file)
+
+    @classmethod
+    def clear_session(cls):
+        cls.session_trees.clear()